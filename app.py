@@ -1,110 +1,777 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import sqlite3
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, g, has_app_context,
+                   get_template_attribute, jsonify, send_from_directory, stream_template, stream_with_context,
+                   before_render_template, template_rendered)
+from markupsafe import Markup
+import io
 import json
-from datetime import datetime
+import mimetypes
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import click
 from werkzeug.utils import secure_filename
+from assets import DIST_DIR, build_assets, load_manifest, pick_encoding
+from bulk import FORMATS, MIMETYPES, detect_format, export_listings, import_listings
+from compression import CompressionMiddleware
+from db import ConnectionPool, read_pragmas, pragma_mismatches
+from fragments import FragmentCache
+from httpcache import FileFingerprints, compute_etag, is_hashed_upload, read_data_versions, tree_fingerprint
+from i18n import Catalog
+from images import ImagePipeline, parse_variants
+from migrations import migrate
+from pagination import Page, paginate
+from passwords import HasherBusy, PasswordHasher, needs_rehash
+from profiling import Profiler, ProfiledConnection, RequestProfile, current_profile, metric_lines
+from querycache import MemoryBackend, QueryCache, SQLiteBackend
+from search import build_match_query, fts_available, fts_table, TITLE_WEIGHT, DESCRIPTION_WEIGHT
+from sessions import MemorySessionStore, SQLiteSessionStore, ServerSessionInterface
+from stats import TTLCache, read_stats, reconcile
+from storage import BlobStore, collect_garbage, derivative_stem, register_blob, release_blobs
 
 app = Flask(__name__)
 app.secret_key = 'ecoswap-secret-key-2024'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
+app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024  # uploads are hashed and written in chunks of this size
+app.config['IMAGE_WIDTHS'] = (400, 800)  # derivative widths served via srcset
+app.config['IMAGE_QUALITY'] = 80
+app.config['IMAGE_WORKERS'] = 2
+app.config['DATABASE'] = 'ecoswap.db'
+app.config['DB_POOL_SIZE'] = 5
+app.config['DB_POOL_TIMEOUT'] = 10.0  # seconds to wait for a free connection
+app.config['DB_POOL_HEALTH_CHECK_INTERVAL'] = 30.0  # ping connections idle longer than this
+app.config['PAGE_SIZE'] = 24  # rows per page on listing and admin pages
+# Stream the marketplace and admin listings as they render, reading rows from
+# the database cursor on the way, in chunks of about STREAM_BUFFER_SIZE characters
+app.config['STREAM_PAGES'] = True
+app.config['STREAM_BUFFER_SIZE'] = 8192
+app.config['FULL_TEXT_SEARCH'] = True  # use FTS5 when available, else LIKE
+app.config['STATS_CACHE_TTL'] = 5.0  # seconds the admin dashboard counters are cached
+app.config['CARD_CACHE_BYTES'] = 4 * 1024 * 1024  # rendered marketplace cards kept in memory; 0 disables
+# Marketplace query results: None (off), 'memory' (per process) or 'sqlite'
+# (shared by every worker process through the QUERY_CACHE_PATH file)
+app.config['QUERY_CACHE_BACKEND'] = 'memory'
+app.config['QUERY_CACHE_PATH'] = 'ecoswap-cache.db'
+app.config['QUERY_CACHE_TTL'] = 30.0  # seconds
+app.config['QUERY_CACHE_PURGE_INTERVAL'] = 300.0  # seconds between deletions of expired results
+# Larger pages are streamed from the cursor instead: caching one holds it all in memory
+app.config['QUERY_CACHE_MAX_ROWS'] = 100
+# Server-side sessions: 'memory' (per process) or 'sqlite' (shared by every
+# worker process through the SESSION_PATH file); the cookie holds only an id
+app.config['SESSION_BACKEND'] = 'sqlite'
+app.config['SESSION_PATH'] = 'ecoswap-sessions.db'
+app.config['SESSION_SWEEP_INTERVAL'] = 60.0  # seconds between sweeps for expired sessions
+app.config['SESSION_SWEEP_BATCH'] = 500  # expired sessions removed per sweep
+app.config['BUILD_ASSETS'] = True  # minify, fingerprint and precompress static assets in wsgi.create_app()
+# Compression of dynamic responses; static assets are precompressed instead
+app.config['COMPRESS_MIN_SIZE'] = 500  # bytes; smaller bodies are not worth it
+app.config['COMPRESS_LEVEL'] = 6  # gzip, 1-9
+app.config['COMPRESS_BROTLI_QUALITY'] = 4  # 0-11
+app.config['STATIC_MAX_AGE'] = 365 * 24 * 3600  # seconds browsers keep fingerprinted static files
+app.config['DELETE_BATCH_SIZE'] = 200  # rows deleted per transaction by the bulk admin deletes
+app.config['IMPORT_BATCH_SIZE'] = 500  # rows inserted per transaction, and exported per chunk, by bulk import/export
+app.config['IMPORT_ERRORS_SHOWN'] = 10  # rejected rows listed after an import from the admin page
+# Werkzeug hash method and cost for passwords; stored hashes made under any
+# other policy are re-made under this one when their users next log in
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+app.config['PASSWORD_HASH_WORKERS'] = 2  # threads hashing passwords, i.e. cores logins may occupy
+app.config['PASSWORD_HASH_QUEUE'] = 64  # hashes waiting for a worker before logins are turned away
+app.config['UPLOAD_RELEASE_GRACE'] = 60  # seconds; images re-uploaded this recently are left to gc-uploads
+# Per-route wall time, SQL, template and translation counters at /admin/metrics;
+# statements slower than PROFILE_SLOW_QUERY_MS are logged with their query plan
+app.config['PROFILING'] = False
+app.config['PROFILE_SLOW_QUERY_MS'] = 100
+# Applied to every new connection. WAL lets marketplace reads proceed while
+# listings and requests are being written; busy_timeout (ms) makes writers
+# queue instead of failing with "database is locked". foreign_keys makes
+# deleting a user or listing cascade to its listings and requests.
+app.config['SQLITE_PRAGMAS'] = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # negative means KiB, i.e. 16MB
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'foreign_keys': True,
+}
 
 # Create uploads folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Load translations
-translations = {}
 locales_dir = os.path.join(os.path.dirname(__file__), 'locales')
-for lang in ['en', 'de']:
-    try:
-        with open(os.path.join(locales_dir, f'{lang}.json'), 'r', encoding='utf-8') as f:
-            translations[lang] = json.load(f)
-    except Exception as e:
-        print(f"Error loading {lang} translation: {e}")
-        translations[lang] = {}
+catalog = Catalog.load(locales_dir, ['en', 'de'])
+translations = catalog.tables
+
+def get_translator():
+    """Return the translator for the current session language, bound once per request."""
+    lang = catalog.resolve(session.get('lang', 'en'))
+    t = g.get('t')
+    if t is None or t.lang != lang:
+        t = catalog.translator(lang)
+        profile = current_profile()
+        g.t = t = profile.counting(t) if profile is not None else t
+    return t
 
 def get_t(key):
-    lang = session.get('lang', 'en')
-    current = translations.get(lang, {})
-    keys = key.split('.')
-    
-    for k in keys:
-        if isinstance(current, dict) and k in current:
-            current = current[k]
-        else:
-            return key
-            
-    return current if isinstance(current, str) else key
+    return get_translator()(key)
 
 @app.context_processor
 def inject_t():
-    return dict(t=get_t, current_lang=session.get('lang', 'en'))
+    t = get_translator()
+    return dict(t=t, current_lang=t.lang)
 
 @app.route('/set_language/<lang>')
 def set_language(lang):
     if lang in ['en', 'de']:
         session['lang'] = lang
     return redirect(request.referrer or url_for('index'))
+# Passwords
+password_hasher = PasswordHasher(workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_pending=app.config['PASSWORD_HASH_QUEUE'])
+
+def hash_password(password):
+    return password_hasher.hash(password, app.config['PASSWORD_HASH_METHOD'])
+
+def check_password(user, password):
+    """Verify ``password`` and bring the user's hash up to the current policy.
+
+    No connection is held while hashing, so slow hashes cannot drain the pool.
+    """
+    if not password_hasher.verify(user['password'], password):
+        return False
+    if needs_rehash(user['password'], app.config['PASSWORD_HASH_METHOD']):
+        try:
+            new_hash = hash_password(password)
+        except HasherBusy:
+            return True  # upgrade at a quieter login
+        conn = get_db()
+        # Conditional, so a concurrent password change is not overwritten
+        conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                     (new_hash, user['id'], user['password']))
+        conn.commit()
+        conn.close()
+    return True
+
 # Database initialization
 def init_db():
-    conn = sqlite3.connect('ecoswap.db')
+    conn = get_db()
     c = conn.cursor()
     
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        display_name TEXT NOT NULL,
-        location TEXT NOT NULL,
-        is_admin INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    
-    # Listings table
-    c.execute('''CREATE TABLE IF NOT EXISTS listings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        description TEXT NOT NULL,
-        category TEXT NOT NULL,
-        condition TEXT NOT NULL,
-        listing_type TEXT NOT NULL,
-        status TEXT DEFAULT 'Active',
-        image_path TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )''')
-    
-    # Requests table
-    c.execute('''CREATE TABLE IF NOT EXISTS requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        listing_id INTEGER NOT NULL,
-        requester_id INTEGER NOT NULL,
-        status TEXT DEFAULT 'Pending',
-        request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (listing_id) REFERENCES listings (id),
-        FOREIGN KEY (requester_id) REFERENCES users (id)
-    )''')
+    # Bring the schema up to date
+    applied = migrate(conn)
+    if applied:
+        print(f"Applied database migrations: {', '.join(map(str, applied))}")
     
     # Create default admin user if not exists
     c.execute("SELECT * FROM users WHERE email = 'admin@ecoswap.com'")
     if not c.fetchone():
-        admin_password = generate_password_hash('admin123')
+        admin_password = hash_password('admin123')
         c.execute("INSERT INTO users (email, password, display_name, location, is_admin) VALUES (?, ?, ?, ?, ?)",
                   ('admin@ecoswap.com', admin_password, 'Admin', 'System', 1))
     
     conn.commit()
     conn.close()
+    
+    settings = check_db_settings()
+    print('SQLite settings: ' + ', '.join(f'{k}={v}' for k, v in settings.items()))
+
+# Database helper functions
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the app's connection pool, (re)creating it when DATABASE or PROFILING changes."""
+    factory = ProfiledConnection if app.config['PROFILING'] else sqlite3.Connection
+    with _pool_lock:
+        pool = app.extensions.get('db_pool')
+        if pool is None or pool.database != app.config['DATABASE'] or pool.factory is not factory:
+            if pool is not None:
+                pool.close()
+            pool = ConnectionPool(app.config['DATABASE'],
+                                  size=app.config['DB_POOL_SIZE'],
+                                  timeout=app.config['DB_POOL_TIMEOUT'],
+                                  health_check_interval=app.config['DB_POOL_HEALTH_CHECK_INTERVAL'],
+                                  pragmas=app.config['SQLITE_PRAGMAS'],
+                                  factory=factory)
+            app.extensions['db_pool'] = pool
+        return pool
+
+def close_pool():
+    with _pool_lock:
+        pool = app.extensions.pop('db_pool', None)
+    if pool is not None:
+        pool.close()
+
+def shutdown(timeout=30.0):
+    """Finish queued background work, then drain the connection pool.
+
+    Waits up to ``timeout`` seconds for checked-out connections to come back.
+    The thread pools, the query cache and the connection pool start again on next use, so a
+    pre-fork server also calls this before forking: neither threads nor
+    open SQLite connections survive a fork intact.
+    """
+    global upload_cleanup
+    password_hasher.shutdown()
+    image_pipeline.shutdown()  # finished jobs still write their variants through the pool
+    cleanup, upload_cleanup = upload_cleanup, new_upload_cleanup()
+    cleanup.shutdown()
+    with _query_cache_lock:
+        _, query_cache = app.extensions.pop('query_cache', (None, None))
+    if query_cache is not None:
+        query_cache.close()
+    with _pool_lock:
+        pool = app.extensions.pop('db_pool', None)
+    if pool is not None and pool.drain(timeout):
+        app.logger.warning('Database connections still checked out after %.0f s; closing the pool anyway', timeout)
+
+_query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    """Return the marketplace query cache, or None when QUERY_CACHE_BACKEND is off."""
+    backend_name = app.config['QUERY_CACHE_BACKEND']
+    if not backend_name:
+        return None
+    with _query_cache_lock:
+        name, cache = app.extensions.get('query_cache', (None, None))
+        if name != backend_name:
+            if backend_name == 'sqlite':
+                backend = SQLiteBackend(app.config['QUERY_CACHE_PATH'])
+            elif backend_name == 'memory':
+                backend = MemoryBackend()
+            else:
+                raise ValueError(f'Unknown QUERY_CACHE_BACKEND: {backend_name!r}')
+            if cache is not None:
+                cache.close()
+            cache = QueryCache(backend, ttl=app.config['QUERY_CACHE_TTL'],
+                               purge_interval=app.config['QUERY_CACHE_PURGE_INTERVAL'])
+            app.extensions['query_cache'] = (backend_name, cache)
+        return cache
+
+_session_store_lock = threading.Lock()
+
+def get_session_store():
+    """Return the session store for SESSION_BACKEND."""
+    backend_name = app.config['SESSION_BACKEND']
+    with _session_store_lock:
+        name, store = app.extensions.get('session_store', (None, None))
+        if name != backend_name:
+            if backend_name == 'sqlite':
+                store = SQLiteSessionStore(app.config['SESSION_PATH'])
+            elif backend_name == 'memory':
+                store = MemorySessionStore()
+            else:
+                raise ValueError(f'Unknown SESSION_BACKEND: {backend_name!r}')
+            app.extensions['session_store'] = (backend_name, store)
+        return store
+
+app.session_interface = ServerSessionInterface(get_session_store,
+                                               sweep_interval=app.config['SESSION_SWEEP_INTERVAL'],
+                                               sweep_batch=app.config['SESSION_SWEEP_BATCH'])
+
+@app.cli.command('sweep-sessions')
+def sweep_sessions_command():
+    """Remove every expired session now."""
+    removed = app.session_interface.sweep_all(get_session_store())
+    click.echo(f"Removed {removed} expired session(s)")
 
-# Database helper function
 def get_db():
-    conn = sqlite3.connect('ecoswap.db')
-    conn.row_factory = sqlite3.Row
+    """Check out a pooled connection; close() returns it to the pool.
+
+    Inside an app context the connection is shared for the rest of the context
+    and handed back on teardown if the caller never closes it.
+    """
+    if not has_app_context():
+        return get_pool().connect()
+    conn = g.get('db')
+    if conn is None or conn.closed:
+        conn = g.db = get_pool().connect()
     return conn
 
+def current_user():
+    """Return the logged-in user's row, loaded at most once per request; None when logged out.
+
+    The session holds only the user id, so name and role changes apply to
+    existing sessions on their next request.
+    """
+    if 'user' not in g:
+        user = None
+        if 'user_id' in session:
+            conn = get_db()
+            user = conn.execute("SELECT id, email, display_name, location, is_admin FROM users WHERE id = ?",
+                                (session['user_id'],)).fetchone()
+            conn.close()
+            if user is None:
+                session.clear()  # the account has been deleted
+        g.user = user
+    return g.user
+
+def is_admin():
+    user = current_user()
+    return user is not None and bool(user['is_admin'])
+
+@app.context_processor
+def inject_user():
+    return {'current_user': current_user()}
+
+@app.teardown_appcontext
+def release_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+def check_db_settings():
+    """Report the pragma settings in effect and warn about any that did not take."""
+    conn = get_pool().connect()
+    try:
+        effective = read_pragmas(conn)
+    finally:
+        conn.close()
+    for name, (requested, actual) in pragma_mismatches(app.config['SQLITE_PRAGMAS'], effective).items():
+        print(f"Warning: SQLite pragma {name} requested {requested!r} but is {actual!r}")
+    return effective
+
+# Uploaded images
+UPLOAD_PREFIX = 'uploads/'  # image_path values are relative to static/
+
+def get_blob_store():
+    return BlobStore(app.config['UPLOAD_FOLDER'], chunk_size=app.config['UPLOAD_CHUNK_SIZE'])
+
+@app.cli.command('gc-uploads')
+@click.option('--grace', default=3600, show_default=True,
+              help='Only delete files untouched for this many seconds.')
+@click.option('--dry-run', is_flag=True, help='List files without deleting them.')
+def gc_uploads_command(grace, dry_run):
+    """Delete uploaded images no listing references any more."""
+    conn = get_db()
+    removed = collect_garbage(conn, get_blob_store(), UPLOAD_PREFIX, grace_seconds=grace, dry_run=dry_run)
+    conn.close()
+    for path in removed:
+        click.echo(path)
+    click.echo(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} file(s)")
+
+def store_image_variants(job_key, variants):
+    """Record finished derivatives, unless the listing's image changed meanwhile."""
+    listing_id, image_path = job_key
+    prefix = os.path.dirname(image_path)
+    variants = {fmt: [[width, f'{prefix}/{name}'] for width, name in sizes]
+                for fmt, sizes in variants.items()}
+    with app.app_context():
+        conn = get_db()
+        conn.execute("UPDATE listings SET image_variants = ? WHERE id = ? AND image_path = ?",
+                     (json.dumps(variants), listing_id, image_path))
+        conn.commit()
+        conn.close()
+        listings_changed(listing_id)
+
+image_pipeline = ImagePipeline(workers=app.config['IMAGE_WORKERS'], on_complete=store_image_variants)
+
+def queue_image_derivatives(listing_id, image_path):
+    source = os.path.join(app.config['UPLOAD_FOLDER'], image_path[len(UPLOAD_PREFIX):])
+    image_pipeline.submit((listing_id, image_path),
+                          source,
+                          os.path.dirname(source),
+                          derivative_stem(os.path.basename(source)),
+                          app.config['IMAGE_WIDTHS'],
+                          app.config['IMAGE_QUALITY'])
+
+app.add_template_filter(parse_variants, 'image_variants')
+
+# Marketplace listing cards, rendered once per listing version and language
+card_cache = FragmentCache(app.config['CARD_CACHE_BYTES'])
+
+@app.template_global('listing_card')
+def render_listing_card(listing):
+    """Render a marketplace card, from the cache when this version was seen before.
+
+    The owner's name and location are part of the key: profile edits do not
+    bump the listing's version.
+    """
+    t = get_translator()
+    own = listing['user_id'] == session.get('user_id')
+    key = (listing['id'], listing['version'], listing['display_name'], listing['location'], t.lang, own)
+    html = card_cache.get(key)
+    if html is None:
+        render = get_template_attribute('_listing_card.html', 'listing_card')
+        html = str(render(listing, t, own))
+        card_cache.set(key, html)
+    return Markup(html)
+
+def listings_changed(*listing_ids):
+    """Drop the cached cards of ``listing_ids`` after a write.
+
+    Cached marketplace results need no invalidation: their keys include the
+    data versions the write bumped.
+    """
+    card_cache.invalidate(*listing_ids)
+
+# Deleted listings' images are removed off the request path
+def new_upload_cleanup():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-cleanup')
+
+upload_cleanup = new_upload_cleanup()
+
+def release_uploads(image_paths):
+    """Delete images no listing references any more, in the background."""
+    image_paths = sorted({path for path in image_paths if path})
+    if not image_paths:
+        return None
+    
+    def run():
+        with app.app_context():
+            conn = get_db()
+            try:
+                return release_blobs(conn, get_blob_store(), UPLOAD_PREFIX, image_paths,
+                                     grace_seconds=app.config['UPLOAD_RELEASE_GRACE'])
+            finally:
+                conn.close()
+    
+    return upload_cleanup.submit(run)
+
+def delete_rows(conn, table, ids, condition='', params=()):
+    """Delete rows of ``table`` by id in batches of DELETE_BATCH_SIZE.
+    
+    Foreign keys cascade each delete to dependent listings and requests.
+    Every batch is its own IMMEDIATE transaction, so a large delete never
+    holds the write lock for long. Returns (rows deleted, image paths of the
+    listings that went with them).
+    """
+    ids = sorted({int(row_id) for row_id in ids})
+    owner_column = 'user_id' if table == 'users' else 'id'
+    batch_size = app.config['DELETE_BATCH_SIZE']
+    deleted = 0
+    image_paths = []
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        placeholders = ','.join('?' * len(batch))
+        where = f'id IN ({placeholders}){condition}'
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            image_paths.extend(row[0] for row in conn.execute(
+                f'''SELECT image_path FROM listings
+                    WHERE image_path IS NOT NULL
+                    AND {owner_column} IN (SELECT id FROM {table} WHERE {where})''', [*batch, *params]))
+            deleted += conn.execute(f'DELETE FROM {table} WHERE {where}', [*batch, *params]).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return deleted, image_paths
+
+def delete_listings(conn, listing_ids, owner_id=None):
+    """Delete listings (only ``owner_id``'s, if given) and queue their images for removal."""
+    if owner_id is None:
+        deleted, image_paths = delete_rows(conn, 'listings', listing_ids)
+    else:
+        deleted, image_paths = delete_rows(conn, 'listings', listing_ids, ' AND user_id = ?', [owner_id])
+    listings_changed(*(int(listing_id) for listing_id in listing_ids))
+    release_uploads(image_paths)
+    return deleted
+
+def delete_users(conn, user_ids):
+    """Delete non-admin users with everything they own and queue their images for removal."""
+    deleted, image_paths = delete_rows(conn, 'users', user_ids, ' AND is_admin = 0')
+    release_uploads(image_paths)
+    return deleted
+
+def form_ids(name):
+    return [value for value in request.form.getlist(name) if value.isdigit()]
+
+def import_listings_from(stream, fmt, owner_id, max_errors):
+    """Bulk-import listings with the configured batch size."""
+    conn = get_db()
+    try:
+        return import_listings(conn, stream, fmt, owner_id, batch_size=app.config['IMPORT_BATCH_SIZE'],
+                               max_errors=max_errors)
+    finally:
+        conn.close()
+
+def user_id_for_email(email):
+    conn = get_db()
+    row = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+    conn.close()
+    return row['id'] if row else None
+
+@app.cli.command('import-listings')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--owner', required=True, help='Email of the user owning rows without an owner_email column.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+def import_listings_command(path, owner, fmt):
+    """Import listings from a CSV or JSON Lines file ('-' for stdin)."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+    owner_id = user_id_for_email(owner)
+    if owner_id is None:
+        raise click.UsageError(f'No user with email {owner!r}.')
+    if path == '-':
+        stream = io.TextIOWrapper(click.get_binary_stream('stdin'), encoding='utf-8-sig', newline='')
+    else:
+        stream = open(path, encoding='utf-8-sig', newline='')
+    with stream:
+        result = import_listings_from(stream, fmt, owner_id, max_errors=None)
+    for line, message in result.errors:
+        click.echo(f"line {line}: {message}" if line else message, err=True)
+    click.echo(f"Imported {result.imported} listing(s), rejected {result.rejected} row(s)")
+
+@app.cli.command('export-listings')
+@click.argument('path', default='-', type=click.Path(dir_okay=False, writable=True, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+def export_listings_command(path, fmt):
+    """Export every listing as CSV or JSON Lines to a file (default: stdout)."""
+    fmt = fmt or detect_format(path) or 'csv'
+    conn = get_db()
+    try:
+        with click.open_file(path, 'w', encoding='utf-8') as out:
+            for chunk in export_listings(conn, fmt, app.config['IMPORT_BATCH_SIZE']):
+                out.write(chunk)
+    finally:
+        conn.close()
+
+# Admin dashboard counters
+stats_cache = TTLCache(app.config['STATS_CACHE_TTL'])
+
+def get_dashboard_stats():
+    """Trigger-maintained counters, cached for STATS_CACHE_TTL seconds."""
+    stats = stats_cache.get(app.config['DATABASE'])
+    if stats is None:
+        conn = get_db()
+        stats = read_stats(conn)
+        conn.close()
+        stats_cache.set(app.config['DATABASE'], stats)
+    return stats
+
+@app.cli.command('reconcile-stats')
+@click.option('--check', is_flag=True, help='Report drift without repairing it.')
+def reconcile_stats_command(check):
+    """Recount the dashboard counters and repair any drift."""
+    conn = get_db()
+    drift = reconcile(conn, repair=not check)
+    conn.close()
+    stats_cache.clear()
+    for name, (stored, actual) in drift.items():
+        click.echo(f"{name}: stored {stored}, actual {actual}")
+    if not drift:
+        click.echo('Counters are consistent')
+    elif not check:
+        click.echo(f"Repaired {len(drift)} counter(s)")
+
+# Profiling
+profiler = Profiler()
+
+def log_slow_query(route, sql, seconds, plan):
+    app.logger.warning('Slow query on %s (%.1f ms): %s\n  plan: %s', route, seconds * 1000,
+                       ' '.join(sql.split()), '; '.join(plan) or 'none')
+
+@app.before_request
+def start_profile():
+    if app.config['PROFILING']:
+        g.profile = RequestProfile(request.endpoint or 'unmatched', app.config['PROFILE_SLOW_QUERY_MS'] / 1000,
+                                   on_slow_query=log_slow_query).start()
+
+@app.teardown_request
+def finish_profile(exception):
+    # Streamed responses are torn down once the body has been sent
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.record(profile, profile.finish())
+
+@before_render_template.connect_via(app)
+def profile_template_started(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_started()
+
+@template_rendered.connect_via(app)
+def profile_template_finished(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_finished()
+
+# HTTP caching
+# Anything that changes page HTML without touching the database, together
+# with asset_manifest: pages link built assets, and a rebuild deletes the old ones
+page_fingerprint = tree_fingerprint(os.path.join(app.root_path, 'templates'),
+                                    os.path.join(app.root_path, 'locales'))
+
+def data_versions(*tables):
+    """The data versions of ``tables``, read once per request.
+
+    The page ETag and the query-cache key both come from this read, so a
+    body is never sent under the ETag of other data.
+    """
+    versions = g.setdefault('data_versions', {})
+    missing = [table for table in tables if table not in versions]
+    if missing:
+        versions.update(read_data_versions(get_db(), missing))
+    return {table: versions[table] for table in tables}
+
+def conditional(*tables, extra=None):
+    """Answer GETs with 304 Not Modified while the page's data is unchanged.
+    
+    The ETag combines the data versions of ``tables`` with the query string,
+    language, user, deployed templates and built assets, plus ``extra()`` if
+    given. It is checked before the view runs, so an unchanged page is never
+    rendered.
+    Pages with pending flash messages are always rendered.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = current_user() if request.method == 'GET' else None
+            if user is None or session.get('_flashes'):
+                return view(*args, **kwargs)
+            
+            versions = data_versions(*tables)
+            etag = compute_etag(request.full_path, [versions[table] for table in tables],
+                                session.get('lang', 'en'), user['id'], user['is_admin'],
+                                user['display_name'], app.config['PAGE_SIZE'], page_fingerprint,
+                                sorted(asset_manifest.items()), extra() if extra is not None else None)
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Per-user pages: browsers may store them but must revalidate
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapped
+    return decorator
+
+# Streaming
+def _buffered(stream, size, page):
+    buffer = []
+    length = 0
+    try:
+        for text in stream:
+            buffer.append(text)
+            length += len(text)
+            if length >= size:
+                yield ''.join(buffer)
+                buffer = []
+                length = 0
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        # Finish the page's statement before teardown hands the connection back
+        close = getattr(page, 'close', None)
+        if close is not None:
+            close()
+        stream.close()
+
+def render_page(template_name, page, **context):
+    """Render a paginated page, streamed when STREAM_PAGES is on.
+
+    Pages with flash messages are rendered whole: showing the messages
+    changes the session, which can no longer be saved once streaming has
+    started.
+    """
+    if not app.config['STREAM_PAGES'] or session.get('_flashes'):
+        return render_template(template_name, page=page, **context)
+    stream = stream_template(template_name, page=page, **context)
+    return app.response_class(_buffered(stream, app.config['STREAM_BUFFER_SIZE'], page), mimetype='text/html')
+
+static_fingerprints = FileFingerprints(app.static_folder)
+asset_manifest = {}
+
+def load_assets(build=True):
+    """(Re)build the static asset pipeline output and load its manifest."""
+    global asset_manifest
+    asset_manifest = build_assets(app.static_folder) if build else load_manifest(app.static_folder)
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the static assets."""
+    load_assets()
+    for source, built in asset_manifest.items():
+        click.echo(f'{source} -> {built}')
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Point static URLs at fingerprinted files so they can be cached for a year.
+
+    Built assets are linked by their hashed name; other files get
+    ``?v=<content hash>``.
+    """
+    if endpoint != 'static' or 'v' in values:
+        return
+    filename = values.get('filename', '')
+    built = asset_manifest.get(filename)
+    if built is not None:
+        values['filename'] = built
+        return
+    if is_hashed_upload(filename):
+        return  # already named by content hash
+    fingerprint = static_fingerprints.get(filename)
+    if fingerprint is not None:
+        values['v'] = fingerprint
+
+def serve_static(filename):
+    """Static view that serves built assets from their precompressed copies."""
+    if not filename.startswith(DIST_DIR + '/'):
+        return app.send_static_file(filename)
+    encoding, served = pick_encoding(app.static_folder, filename, request.accept_encodings)
+    if encoding is None:
+        response = app.send_static_file(filename)
+    else:
+        response = send_from_directory(app.static_folder, served, mimetype=mimetypes.guess_type(filename)[0])
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = serve_static
+
+@app.after_request
+def cache_static_files(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        filename = (request.view_args or {}).get('filename', '')
+        if request.args.get('v') or filename.startswith(DIST_DIR + '/') or is_hashed_upload(filename):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STATIC_MAX_AGE']
+            response.cache_control.immutable = True
+    return response
+
+# Every worker process imports this module: only read what wsgi.create_app()
+# or build-assets built, since a build deletes files other builds still write
+load_assets(build=False)
+
+compression = CompressionMiddleware(app.wsgi_app,
+                                   min_size=app.config['COMPRESS_MIN_SIZE'],
+                                   level=app.config['COMPRESS_LEVEL'],
+                                   brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'])
+app.wsgi_app = compression
+
+def apply_config():
+    """Bring everything built from app.config at import time up to date with it.
+
+    Call after changing the config, e.g. from environment variables in
+    wsgi.create_app(). Background work is finished first; the connection
+    pool, query cache and session store are rebuilt on next use.
+    """
+    global password_hasher
+    shutdown()
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    password_hasher = PasswordHasher(workers=app.config['PASSWORD_HASH_WORKERS'],
+                                     max_pending=app.config['PASSWORD_HASH_QUEUE'])
+    image_pipeline.workers = app.config['IMAGE_WORKERS']
+    app.session_interface.sweep_interval = app.config['SESSION_SWEEP_INTERVAL']
+    app.session_interface.sweep_batch = app.config['SESSION_SWEEP_BATCH']
+    with _session_store_lock:
+        app.extensions.pop('session_store', None)
+    card_cache.max_bytes = app.config['CARD_CACHE_BYTES']
+    card_cache.clear()
+    stats_cache.ttl = app.config['STATS_CACHE_TTL']
+    stats_cache.clear()
+    load_assets(build=app.config['BUILD_ASSETS'])
+    compression.min_size = app.config['COMPRESS_MIN_SIZE']
+    compression.level = app.config['COMPRESS_LEVEL']
+    compression.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+
 # Routes
 @app.route('/')
 def index():
@@ -123,17 +790,31 @@ def signup():
         
         # Check if email already exists
         c.execute("SELECT * FROM users WHERE email = ?", (email,))
-        if c.fetchone():
+        exists = c.fetchone() is not None
+        conn.close()
+        if exists:
             flash('Email already registered!', 'error')
-            conn.close()
             return redirect(url_for('signup'))
         
+        # Hash without holding a pooled connection
+        try:
+            hashed_password = hash_password(password)
+        except HasherBusy:
+            flash('The server is busy, please try again in a moment.', 'error')
+            return render_template('signup.html'), 503
+        
         # Create new user
-        hashed_password = generate_password_hash(password)
-        c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
-                  (email, hashed_password, display_name, location))
-        conn.commit()
-        conn.close()
+        conn = get_db()
+        try:
+            conn.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
+                         (email, hashed_password, display_name, location))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            # Registered by a concurrent signup since the check above
+            flash('Email already registered!', 'error')
+            return redirect(url_for('signup'))
+        finally:
+            conn.close()
         
         flash('Account created successfully! Please login.', 'success')
         return redirect(url_for('login'))
@@ -152,10 +833,15 @@ def login():
         user = c.fetchone()
         conn.close()
         
-        if user and check_password_hash(user['password'], password):
+        try:
+            valid = user is not None and check_password(user, password)
+        except HasherBusy:
+            flash('The server is busy, please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        
+        if valid:
+            session.regenerate()
             session['user_id'] = user['id']
-            session['display_name'] = user['display_name']
-            session['is_admin'] = user['is_admin']
             
             if user['is_admin']:
                 return redirect(url_for('admin_dashboard'))
@@ -169,32 +855,34 @@ def login():
 @app.route('/logout')
 def logout():
     session.clear()
+    session.regenerate()
     flash('Logged out successfully!', 'success')
     return redirect(url_for('index'))
 
-@app.route('/marketplace')
-def marketplace():
-    if 'user_id' not in session:
-        flash('Please login first!', 'error')
-        return redirect(url_for('login'))
-    
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Get search and filter parameters
-    search = request.args.get('search', '')
-    category = request.args.get('category', '')
-    listing_type = request.args.get('type', '')
-    
-    query = '''SELECT l.*, u.display_name, u.location 
-               FROM listings l 
-               JOIN users u ON l.user_id = u.id 
-               WHERE l.status = 'Active' '''
-    params = []
+def search_listings(conn, search, category, listing_type, lang, after=None, before=None, lazy=False):
+    """Run the marketplace query and return one page of active listings."""
+    match = build_match_query(search) if search else None
+    use_fts = match is not None and app.config['FULL_TEXT_SEARCH'] and fts_available(conn)
     
-    if search:
-        query += " AND (l.title LIKE ? OR l.description LIKE ?) "
-        params.extend([f'%{search}%', f'%{search}%'])
+    if use_fts:
+        fts = fts_table(lang)
+        rank = f'bm25({fts}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})'
+        query = f'''SELECT l.*, u.display_name, u.location, {rank} AS rank 
+                    FROM {fts} f
+                    JOIN listings l ON l.id = f.rowid
+                    JOIN users u ON l.user_id = u.id 
+                    WHERE {fts} MATCH ? AND l.status = 'Active' '''
+        params = [match]
+    else:
+        query = '''SELECT l.*, u.display_name, u.location 
+                   FROM listings l 
+                   JOIN users u ON l.user_id = u.id 
+                   WHERE l.status = 'Active' '''
+        params = []
+        
+        if search:
+            query += " AND (l.title LIKE ? OR l.description LIKE ?) "
+            params.extend([f'%{search}%', f'%{search}%'])
     
     if category:
         query += " AND l.category = ? "
@@ -204,32 +892,67 @@ def marketplace():
         query += " AND l.listing_type = ? "
         params.append(listing_type)
     
-    query += " ORDER BY l.created_at DESC"
+    if use_fts:
+        order = [(rank, 'rank', 'ASC'), ('l.id', 'id', 'DESC')]
+    else:
+        order = [('l.created_at', 'created_at', 'DESC'), ('l.id', 'id', 'DESC')]
     
-    c.execute(query, params)
-    listings = c.fetchall()
-    conn.close()
+    return paginate(conn, query, params, order, app.config['PAGE_SIZE'], after=after, before=before, lazy=lazy)
+
+@app.route('/marketplace')
+@conditional('listings', 'users')
+def marketplace():
+    if current_user() is None:
+        flash('Please login first!', 'error')
+        return redirect(url_for('login'))
+    
+    # Get search and filter parameters
+    search = request.args.get('search', '')
+    category = request.args.get('category', '')
+    listing_type = request.args.get('type', '')
+    lang = session.get('lang', 'en')
+    after = request.args.get('after')
+    before = request.args.get('before')
+    
+    def fetch():
+        conn = get_db()
+        page = search_listings(conn, search, category, listing_type, lang, after, before)
+        conn.close()
+        return page.as_dict()
     
-    return render_template('marketplace.html', listings=listings)
+    cache = get_query_cache()
+    if cache is None or app.config['PAGE_SIZE'] > app.config['QUERY_CACHE_MAX_ROWS']:
+        # Read while the page streams; get_db()'s connection is released on teardown
+        page = search_listings(get_db(), search, category, listing_type, lang, after, before,
+                               lazy=app.config['STREAM_PAGES'])
+    else:
+        # Versions from the database, not this process, so every worker sees every write;
+        # the language only matters to full-text search
+        key = cache.key('marketplace', data_versions('listings', 'users'),
+                        search, category, listing_type, lang if search else '', after, before,
+                        app.config['PAGE_SIZE'], app.config['FULL_TEXT_SEARCH'])
+        page = Page.from_dict(cache.get_or_compute(key, fetch))
+    
+    return render_page('marketplace.html', page, listings=page.items)
 
 @app.route('/my-listings')
+@conditional('listings')
 def my_listings():
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM listings WHERE user_id = ? ORDER BY created_at DESC", 
-              (session['user_id'],))
-    listings = c.fetchall()
+    page = paginate(conn, "SELECT * FROM listings WHERE user_id = ?", [session['user_id']],
+                    [('created_at', 'created_at', 'DESC'), ('id', 'id', 'DESC')], app.config['PAGE_SIZE'],
+                    after=request.args.get('after'), before=request.args.get('before'))
     conn.close()
     
-    return render_template('my_listings.html', listings=listings)
+    return render_template('my_listings.html', listings=page.items, page=page)
 
 @app.route('/create-listing', methods=['GET', 'POST'])
 def create_listing():
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
@@ -240,22 +963,35 @@ def create_listing():
         condition = request.form['condition']
         listing_type = request.form['listing_type']
         
+        blob = None
         image_path = None
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename:
-                filename = secure_filename(file.filename)
-                filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                image_path = f"uploads/{filename}"
+                ext = os.path.splitext(secure_filename(file.filename))[1]
+                blob = get_blob_store().save(file.stream, ext)
+                image_path = UPLOAD_PREFIX + blob.path
         
         conn = get_db()
         c = conn.cursor()
-        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type, image_path) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                  (session['user_id'], title, description, category, condition, listing_type, image_path))
+        image_variants = None
+        if blob:
+            register_blob(conn, image_path, blob)
+            # The same photo may already have derivatives from another listing
+            c.execute("SELECT image_variants FROM listings WHERE image_path = ? AND image_variants IS NOT NULL LIMIT 1",
+                      (image_path,))
+            row = c.fetchone()
+            image_variants = row['image_variants'] if row else None
+        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type, image_path, image_variants) 
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                  (session['user_id'], title, description, category, condition, listing_type, image_path, image_variants))
+        listing_id = c.lastrowid
         conn.commit()
         conn.close()
+        listings_changed(listing_id)
+        
+        if image_path and not image_variants:
+            queue_image_derivatives(listing_id, image_path)
         
         flash('Listing created successfully!', 'success')
         return redirect(url_for('my_listings'))
@@ -264,7 +1000,7 @@ def create_listing():
 
 @app.route('/edit-listing/<int:listing_id>', methods=['GET', 'POST'])
 def edit_listing(listing_id):
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
@@ -284,6 +1020,7 @@ def edit_listing(listing_id):
                   (title, description, category, condition, listing_type, listing_id, session['user_id']))
         conn.commit()
         conn.close()
+        listings_changed(listing_id)
         
         flash('Listing updated successfully!', 'success')
         return redirect(url_for('my_listings'))
@@ -300,208 +1037,422 @@ def edit_listing(listing_id):
 
 @app.route('/delete-listing/<int:listing_id>')
 def delete_listing(listing_id):
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    c.execute("DELETE FROM listings WHERE id=? AND user_id=?", (listing_id, session['user_id']))
-    conn.commit()
+    delete_listings(conn, [listing_id], owner_id=session['user_id'])
     conn.close()
     
     flash('Listing deleted successfully!', 'success')
     return redirect(url_for('my_listings'))
 
+# Outcomes of create_request()
+REQUEST_CREATED = 'created'
+REQUEST_DUPLICATE = 'duplicate'
+REQUEST_OWN_LISTING = 'own_listing'
+REQUEST_UNAVAILABLE = 'unavailable'
+REQUEST_NOT_FOUND = 'not_found'
+
+REQUEST_OUTCOME_MESSAGES = {
+    REQUEST_CREATED: ('Request sent successfully!', 'success'),
+    REQUEST_DUPLICATE: ('You already requested this item!', 'error'),
+    REQUEST_OWN_LISTING: ('You cannot request your own item!', 'error'),
+    REQUEST_UNAVAILABLE: ('This item is no longer available!', 'error'),
+    REQUEST_NOT_FOUND: ('Listing not found!', 'error'),
+}
+
+def create_request(conn, listing_id, requester_id):
+    """Request a listing in a single statement and return the outcome.
+
+    The ownership and availability checks live in the INSERT ... SELECT, and
+    the unique (listing_id, requester_id) index turns a duplicate into a
+    no-op, so concurrent double-clicks cannot create two requests. Only a
+    request that was not created costs a second query, to say why.
+    """
+    c = conn.execute('''INSERT INTO requests (listing_id, requester_id)
+                        SELECT id, ? FROM listings
+                        WHERE id = ? AND user_id != ? AND status = 'Active'
+                        ON CONFLICT (listing_id, requester_id) DO NOTHING''',
+                     (requester_id, listing_id, requester_id))
+    conn.commit()
+    if c.rowcount == 1:
+        return REQUEST_CREATED
+    
+    row = conn.execute('''SELECT l.user_id = ? AS own, l.status,
+                                 EXISTS (SELECT 1 FROM requests
+                                         WHERE listing_id = l.id AND requester_id = ?) AS requested
+                          FROM listings l WHERE l.id = ?''',
+                       (requester_id, requester_id, listing_id)).fetchone()
+    if row is None:
+        return REQUEST_NOT_FOUND
+    if row['requested']:
+        return REQUEST_DUPLICATE
+    if row['own']:
+        return REQUEST_OWN_LISTING
+    return REQUEST_UNAVAILABLE
+
 @app.route('/request-item/<int:listing_id>')
 def request_item(listing_id):
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    
-    # Check if user already requested this item
-    c.execute("SELECT * FROM requests WHERE listing_id=? AND requester_id=?", 
-              (listing_id, session['user_id']))
-    if c.fetchone():
-        flash('You already requested this item!', 'error')
-        conn.close()
-        return redirect(url_for('marketplace'))
-    
-    # Check if user is trying to request their own item
-    c.execute("SELECT * FROM listings WHERE id=? AND user_id=?", 
-              (listing_id, session['user_id']))
-    if c.fetchone():
-        flash('You cannot request your own item!', 'error')
-        conn.close()
-        return redirect(url_for('marketplace'))
-    
-    c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)",
-              (listing_id, session['user_id']))
-    conn.commit()
+    outcome = create_request(conn, listing_id, session['user_id'])
     conn.close()
     
-    flash('Request sent successfully!', 'success')
+    message, category = REQUEST_OUTCOME_MESSAGES[outcome]
+    flash(message, category)
     return redirect(url_for('marketplace'))
 
+REQUEST_TABS = ('sent', 'received')
+REQUEST_STATUSES = ('Pending', 'Accepted', 'Declined')
+
 @app.route('/my-requests')
+@conditional('requests', 'listings', 'users')
 def my_requests():
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
+    tab = request.args.get('tab', 'sent')
+    if tab not in REQUEST_TABS:
+        tab = 'sent'
+    
     conn = get_db()
-    c = conn.cursor()
     
-    # Requests I made
-    c.execute('''SELECT r.*, l.title, l.image_path, u.display_name as owner_name
-                 FROM requests r
-                 JOIN listings l ON r.listing_id = l.id
-                 JOIN users u ON l.user_id = u.id
-                 WHERE r.requester_id = ?
-                 ORDER BY r.request_date DESC''', (session['user_id'],))
-    my_requests = c.fetchall()
-    
-    # Requests on my listings
-    c.execute('''SELECT r.*, l.title, l.image_path, u.display_name as requester_name
-                 FROM requests r
-                 JOIN listings l ON r.listing_id = l.id
-                 JOIN users u ON r.requester_id = u.id
-                 WHERE l.user_id = ?
-                 ORDER BY r.request_date DESC''', (session['user_id'],))
-    received_requests = c.fetchall()
+    # Per-status counts for both tabs in one round-trip
+    counts = {name: dict.fromkeys(REQUEST_STATUSES, 0) for name in REQUEST_TABS}
+    for row in conn.execute('''SELECT 'sent' AS tab, status, COUNT(*) AS count
+                               FROM requests WHERE requester_id = ? GROUP BY status
+                               UNION ALL
+                               SELECT 'received', r.status, COUNT(*)
+                               FROM listings l JOIN requests r ON r.listing_id = l.id
+                               WHERE l.user_id = ? GROUP BY r.status''',
+                            (session['user_id'], session['user_id'])):
+        counts[row['tab']][row['status']] = row['count']
     
+    if tab == 'sent':
+        # Requests I made
+        query = '''SELECT r.*, l.title, l.image_path, l.image_variants, u.display_name as owner_name
+                   FROM requests r
+                   JOIN listings l ON r.listing_id = l.id
+                   JOIN users u ON l.user_id = u.id
+                   WHERE r.requester_id = ?'''
+    else:
+        # Requests on my listings
+        query = '''SELECT r.*, l.title, l.image_path, l.image_variants, u.display_name as requester_name
+                   FROM requests r
+                   JOIN listings l ON r.listing_id = l.id
+                   JOIN users u ON r.requester_id = u.id
+                   WHERE l.user_id = ?'''
+    page = paginate(conn, query, [session['user_id']],
+                    [('r.request_date', 'request_date', 'DESC'), ('r.id', 'id', 'DESC')], app.config['PAGE_SIZE'],
+                    after=request.args.get('after'), before=request.args.get('before'))
     conn.close()
     
-    return render_template('my_requests.html', my_requests=my_requests, received_requests=received_requests)
+    return render_template('my_requests.html', tab=tab, requests=page.items, page=page, counts=counts)
+
+REQUEST_ACTIONS = {'accept': 'Accepted', 'decline': 'Declined'}
+
+def respond_to_requests(conn, owner_id, request_ids, action):
+    """Accept or decline pending requests on ``owner_id``'s listings.
+    
+    Everything happens in one IMMEDIATE transaction. Accepting a request also
+    deactivates its listing and declines every other pending request on that
+    listing in the same UPDATE; when several requests for one listing are
+    accepted together the oldest wins.
+    
+    Returns ``(handled, auto_declined)``: the number of requests given the
+    requested status and the number of other requests declined along with
+    accepted ones.
+    """
+    request_ids = sorted({int(request_id) for request_id in request_ids})
+    if not request_ids:
+        return 0, 0
+    placeholders = ','.join('?' * len(request_ids))
+    
+    conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute(f'''SELECT r.id, r.listing_id FROM requests r
+                                JOIN listings l ON r.listing_id = l.id
+                                WHERE r.id IN ({placeholders}) AND l.user_id = ? AND r.status = 'Pending'
+                                ORDER BY r.request_date, r.id''',
+                            [*request_ids, owner_id]).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0, 0
+        
+        if action == 'decline':
+            conn.execute(f"UPDATE requests SET status = 'Declined' WHERE id IN ({','.join('?' * len(rows))})",
+                         [row['id'] for row in rows])
+            conn.commit()
+            return len(rows), 0
+        
+        winners = {}
+        for row in rows:
+            winners.setdefault(row['listing_id'], row['id'])
+        listing_marks = ','.join('?' * len(winners))
+        c = conn.execute(f'''UPDATE requests
+                             SET status = CASE WHEN id IN ({listing_marks}) THEN 'Accepted' ELSE 'Declined' END
+                             WHERE listing_id IN ({listing_marks}) AND status = 'Pending' ''',
+                         [*winners.values(), *winners])
+        changed = c.rowcount
+        conn.execute(f"UPDATE listings SET status = 'Inactive' WHERE id IN ({listing_marks})", list(winners))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    listings_changed(*winners)
+    
+    return len(winners), changed - len(winners)
 
 @app.route('/handle-request/<int:request_id>/<action>')
 def handle_request(request_id, action):
-    if 'user_id' not in session:
+    if current_user() is None:
         flash('Please login first!', 'error')
         return redirect(url_for('login'))
     
-    if action not in ['accept', 'decline']:
+    if action not in REQUEST_ACTIONS:
         flash('Invalid action!', 'error')
-        return redirect(url_for('my_requests'))
+        return redirect(url_for('my_requests', tab='received'))
     
     conn = get_db()
-    c = conn.cursor()
-    
-    # Verify the request belongs to user's listing
-    c.execute('''SELECT r.* FROM requests r
-                 JOIN listings l ON r.listing_id = l.id
-                 WHERE r.id = ? AND l.user_id = ?''', (request_id, session['user_id']))
-    request_data = c.fetchone()
+    handled, auto_declined = respond_to_requests(conn, session['user_id'], [request_id], action)
+    conn.close()
     
-    if not request_data:
+    if not handled:
         flash('Request not found!', 'error')
-        conn.close()
-        return redirect(url_for('my_requests'))
+        return redirect(url_for('my_requests', tab='received'))
+    
+    flash(f'Request {REQUEST_ACTIONS[action].lower()} successfully!', 'success')
+    if auto_declined:
+        flash(f'{auto_declined} other pending request(s) for this item were declined.', 'success')
+    return redirect(url_for('my_requests', tab='received'))
+
+@app.route('/handle-requests', methods=['POST'])
+def handle_requests():
+    if current_user() is None:
+        flash('Please login first!', 'error')
+        return redirect(url_for('login'))
     
-    status = 'Accepted' if action == 'accept' else 'Declined'
-    c.execute("UPDATE requests SET status = ? WHERE id = ?", (status, request_id))
+    action = request.form.get('action')
+    if action not in REQUEST_ACTIONS:
+        flash('Invalid action!', 'error')
+        return redirect(url_for('my_requests', tab='received'))
     
-    # If accepted, mark listing as inactive
-    if action == 'accept':
-        c.execute("UPDATE listings SET status = 'Inactive' WHERE id = ?", (request_data['listing_id'],))
+    request_ids = form_ids('request_ids')
+    if not request_ids:
+        flash('No requests selected!', 'error')
+        return redirect(url_for('my_requests', tab='received'))
     
-    conn.commit()
+    conn = get_db()
+    handled, auto_declined = respond_to_requests(conn, session['user_id'], request_ids, action)
     conn.close()
     
-    flash(f'Request {status.lower()} successfully!', 'success')
-    return redirect(url_for('my_requests'))
+    if not handled:
+        flash('No pending requests to update!', 'error')
+    else:
+        flash(f'{handled} request(s) {REQUEST_ACTIONS[action].lower()} successfully!', 'success')
+        if auto_declined:
+            flash(f'{auto_declined} other pending request(s) for the same items were declined.', 'success')
+    return redirect(url_for('my_requests', tab='received'))
 
 # Admin Routes
+def dashboard_etag_extra():
+    # Runs before the view's admin check: only admins get the stats read
+    return sorted(get_dashboard_stats().items()) if is_admin() else None
+
 @app.route('/admin')
+@conditional(extra=dashboard_etag_extra)
 def admin_dashboard():
-    if 'user_id' not in session or not session.get('is_admin'):
+    if not is_admin():
         flash('Admin access required!', 'error')
         return redirect(url_for('login'))
     
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Get statistics
-    c.execute("SELECT COUNT(*) as count FROM users WHERE is_admin = 0")
-    total_users = c.fetchone()['count']
+    stats = get_dashboard_stats()
     
-    c.execute("SELECT COUNT(*) as count FROM listings WHERE status = 'Active'")
-    active_listings = c.fetchone()['count']
-    
-    c.execute("SELECT COUNT(*) as count FROM requests")
-    total_requests = c.fetchone()['count']
+    return render_template('admin/dashboard.html', 
+                          total_users=stats['total_users'],
+                          active_listings=stats['active_listings'],
+                          total_requests=stats['total_requests'])
+
+@app.route('/admin/cache-stats')
+def admin_cache_stats():
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
     
-    conn.close()
+    query_cache = get_query_cache()
+    return jsonify(listing_cards=card_cache.stats(),
+                   marketplace_queries=query_cache.stats() if query_cache is not None else None)
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Request profiles, connection pool and cache counters in the Prometheus text format."""
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
     
-    return render_template('admin/dashboard.html', 
-                          total_users=total_users,
-                          active_listings=active_listings,
-                          total_requests=total_requests)
+    pool = get_pool().stats()
+    cards = card_cache.stats()
+    lookups = [({'cache': 'listing_cards', 'result': 'hit'}, cards['hits']),
+               ({'cache': 'listing_cards', 'result': 'miss'}, cards['misses'])]
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        queries = query_cache.stats()
+        lookups += [({'cache': 'marketplace_queries', 'result': result}, queries[key])
+                    for result, key in (('hit', 'hits'), ('miss', 'misses'), ('coalesced', 'coalesced'))]
+    lines = metric_lines('ecoswap_db_pool_connections', 'gauge', 'Pooled database connections.',
+                         [({'state': 'in_use'}, pool['in_use']), ({'state': 'idle'}, pool['idle'])])
+    lines += metric_lines('ecoswap_db_pool_waits_total', 'counter', 'Checkouts that waited for a connection.',
+                          [({}, pool['waits'])])
+    lines += metric_lines('ecoswap_db_pool_timeouts_total', 'counter', 'Checkouts that timed out.',
+                          [({}, pool['timeouts'])])
+    lines += metric_lines('ecoswap_cache_lookups_total', 'counter', 'Cache lookups by result.', lookups)
+    lines += metric_lines('ecoswap_card_cache_bytes', 'gauge', 'Bytes of rendered listing cards cached.',
+                          [({}, cards['bytes'])])
+    body = profiler.render() + '\n'.join(lines) + '\n'
+    return app.response_class(body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/admin/users')
+@conditional('users')
 def admin_users():
-    if 'user_id' not in session or not session.get('is_admin'):
+    if not is_admin():
         flash('Admin access required!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE is_admin = 0 ORDER BY created_at DESC")
-    users = c.fetchall()
+    page = paginate(conn, "SELECT * FROM users WHERE is_admin = 0", [],
+                    [('created_at', 'created_at', 'DESC'), ('id', 'id', 'DESC')], app.config['PAGE_SIZE'],
+                    after=request.args.get('after'), before=request.args.get('before'))
     conn.close()
     
-    return render_template('admin/users.html', users=users)
+    return render_template('admin/users.html', users=page.items, page=page)
 
 @app.route('/admin/listings')
+@conditional('listings', 'users')
 def admin_listings():
-    if 'user_id' not in session or not session.get('is_admin'):
+    if not is_admin():
         flash('Admin access required!', 'error')
         return redirect(url_for('login'))
     
+    # Left open for the streamed page; released on teardown
     conn = get_db()
-    c = conn.cursor()
-    c.execute('''SELECT l.*, u.display_name, u.email 
-                 FROM listings l 
-                 JOIN users u ON l.user_id = u.id 
-                 ORDER BY l.created_at DESC''')
-    listings = c.fetchall()
-    conn.close()
+    page = paginate(conn, '''SELECT l.*, u.display_name, u.email 
+                             FROM listings l 
+                             JOIN users u ON l.user_id = u.id''', [],
+                    [('l.created_at', 'created_at', 'DESC'), ('l.id', 'id', 'DESC')], app.config['PAGE_SIZE'],
+                    after=request.args.get('after'), before=request.args.get('before'),
+                    lazy=app.config['STREAM_PAGES'])
     
-    return render_template('admin/listings.html', listings=listings)
+    return render_page('admin/listings.html', page, listings=page.items)
 
 @app.route('/admin/delete-listing/<int:listing_id>')
 def admin_delete_listing(listing_id):
-    if 'user_id' not in session or not session.get('is_admin'):
+    if not is_admin():
         flash('Admin access required!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    c.execute("DELETE FROM listings WHERE id=?", (listing_id,))
-    conn.commit()
+    delete_listings(conn, [listing_id])
     conn.close()
     
     flash('Listing deleted successfully!', 'success')
     return redirect(url_for('admin_listings'))
 
+@app.route('/admin/delete-listings', methods=['POST'])
+def admin_delete_listings():
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    deleted = delete_listings(conn, form_ids('listing_ids'))
+    conn.close()
+    
+    flash(f'{deleted} listing(s) deleted successfully!', 'success')
+    return redirect(url_for('admin_listings'))
+
+@app.route('/admin/import-listings', methods=['POST'])
+def admin_import_listings():
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
+    
+    file = request.files.get('file')
+    fmt = detect_format(file.filename) if file else None
+    if fmt is None:
+        flash('Choose a .csv or .jsonl file to import!', 'error')
+        return redirect(url_for('admin_listings'))
+    
+    owner_email = request.form.get('owner_email', '').strip()
+    owner_id = user_id_for_email(owner_email) if owner_email else session['user_id']
+    if owner_id is None:
+        flash(f'No user with email {owner_email}!', 'error')
+        return redirect(url_for('admin_listings'))
+    
+    # Rows are parsed as they are read from the upload
+    stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+    shown = app.config['IMPORT_ERRORS_SHOWN']
+    result = import_listings_from(stream, fmt, owner_id, max_errors=shown)
+    
+    flash(f'{result.imported} listing(s) imported, {result.rejected} row(s) rejected.',
+          'success' if result.imported or not result.rejected else 'error')
+    for line, message in result.errors:
+        flash(f'Line {line}: {message}' if line else message, 'error')
+    if result.rejected > len(result.errors):
+        flash(f'...and {result.rejected - len(result.errors)} more rejected row(s).', 'error')
+    return redirect(url_for('admin_listings'))
+
+@app.route('/admin/export-listings')
+def admin_export_listings():
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    
+    # Rows are read while the body streams; get_db()'s connection is released on teardown
+    body = export_listings(get_db(), fmt, app.config['IMPORT_BATCH_SIZE'])
+    response = app.response_class(stream_with_context(body), mimetype=MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=listings.{fmt}'
+    return response
+
 @app.route('/admin/delete-user/<int:user_id>')
 def admin_delete_user(user_id):
-    if 'user_id' not in session or not session.get('is_admin'):
+    if not is_admin():
         flash('Admin access required!', 'error')
         return redirect(url_for('login'))
     
     conn = get_db()
-    c = conn.cursor()
-    c.execute("DELETE FROM users WHERE id=? AND is_admin=0", (user_id,))
-    conn.commit()
+    delete_users(conn, [user_id])
     conn.close()
     
     flash('User deleted successfully!', 'success')
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/delete-users', methods=['POST'])
+def admin_delete_users():
+    if not is_admin():
+        flash('Admin access required!', 'error')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    deleted = delete_users(conn, form_ids('user_ids'))
+    conn.close()
+    
+    flash(f'{deleted} user(s) deleted successfully!', 'success')
+    return redirect(url_for('admin_users'))
+
 if __name__ == '__main__':
+    # Development server only, on this machine; FLASK_DEBUG=1 turns on the debugger.
+    # Serve production traffic with wsgi.py.
     init_db()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    load_assets(build=app.config['BUILD_ASSETS'])
+    app.run(host='127.0.0.1', port=5000)
@@ -0,0 +1,118 @@
+"""
+Static asset pipeline
+
+Once per deploy (in ``wsgi.create_app()`` or with ``flask --app app
+build-assets``) each source asset is minified and written under
+``static/dist/`` with its content hash in the file name, next to
+precompressed ``.gz`` and ``.br`` copies. A manifest maps
+source names to built names so ``url_for('static', filename='css/style.css')``
+can link the fingerprinted file, which browsers may then keep for a year.
+Requests pick a precompressed copy by Accept-Encoding, so nothing is
+compressed per request.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it only .gz copies are written
+    brotli = None
+
+ASSETS = ('css/style.css',)
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+TMP_SUFFIX = '.tmp'
+
+# Encodings in order of preference, with the suffix of their precompressed copy
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace from a stylesheet.
+
+    Deliberately conservative: whitespace before ``:`` is kept because it is
+    significant in selectors (``a :hover`` is not ``a:hover``).
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+MINIFIERS = {'.css': minify_css}
+
+
+def _write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_assets(static_dir, assets=ASSETS, dist_dir=DIST_DIR):
+    """Build every asset and write the manifest; returns {source: built name}.
+
+    Built files are named by content, so rebuilding unchanged sources
+    rewrites nothing, and files from older builds are removed.
+    """
+    out_root = os.path.join(static_dir, dist_dir)
+    manifest = {}
+    for name in assets:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        minify = MINIFIERS.get(ext)
+        if minify is not None:
+            data = minify(data.decode('utf-8')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        built = f'{dist_dir}/{stem}.{digest}{ext}'
+        path = os.path.join(static_dir, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(path + '.br', brotli.compress(data, quality=11))
+            _write(path, data)
+        manifest[name] = built
+
+    keep = set()
+    for built in manifest.values():
+        keep.update(os.path.join(static_dir, built + suffix) for suffix in ('', '.gz', '.br'))
+    for directory, _, names in os.walk(out_root):
+        for file_name in names:
+            path = os.path.join(directory, file_name)
+            # .tmp files may be another build's writes in progress
+            if file_name != MANIFEST and not file_name.endswith(TMP_SUFFIX) and path not in keep:
+                os.unlink(path)
+
+    _write(os.path.join(out_root, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_dir, dist_dir=DIST_DIR):
+    try:
+        with open(os.path.join(static_dir, dist_dir, MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def pick_encoding(static_dir, filename, accept_encoding):
+    """Return (encoding, precompressed filename) for the best available copy, or (None, filename).
+
+    ``accept_encoding`` is a werkzeug ``Accept`` object (``request.accept_encodings``).
+    """
+    for encoding, suffix in ENCODINGS:
+        if accept_encoding[encoding] and os.path.exists(os.path.join(static_dir, filename + suffix)):
+            return encoding, filename + suffix
+    return None, filename
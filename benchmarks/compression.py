@@ -0,0 +1,65 @@
+"""
+Benchmark for response compression: bytes saved and CPU cost per page for
+gzip and brotli at the levels CompressionMiddleware uses.
+
+Usage: python benchmarks/compression.py [--listings 24] [--iterations 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+from compression import CompressionMiddleware, brotli  # noqa: E402
+from pagination import Page  # noqa: E402
+
+
+def render_pages(count):
+    listings = [{'id': i, 'user_id': 0, 'title': f'Item {i}', 'description': f'A well kept item number {i}',
+                 'category': 'Home & Garden', 'condition': 'Like New', 'listing_type': 'Exchange',
+                 'image_path': None, 'display_name': 'Someone', 'location': 'Somewhere', 'version': 1,
+                 'created_at': '2024-01-01 00:00:00', 'status': 'Active', 'email': 'someone@example.com',
+                 'owner_name': 'Someone'}
+                for i in range(count)]
+    app = app_module.app
+    pages = {}
+    with app.test_request_context('/marketplace'):
+        app_module.g.t = app_module.catalog.translator('en')
+        pages['marketplace'] = app_module.render_template('marketplace.html', listings=listings,
+                                                          page=Page(listings))
+        pages['login'] = app_module.render_template('login.html')
+    return {name: html.encode('utf-8') for name, html in pages.items()}
+
+
+def cost(compressor_factory, body, iterations):
+    """Return (compressed size, CPU seconds per page)."""
+    start = time.process_time()
+    for _ in range(iterations):
+        compressor = compressor_factory()
+        data = compressor.compress(body) + compressor.finish()
+    return len(data), (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', type=int, default=24)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    config = app_module.app.config
+    middleware = CompressionMiddleware(None, level=config['COMPRESS_LEVEL'],
+                                       brotli_quality=config['COMPRESS_BROTLI_QUALITY'])
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+    for name, body in render_pages(args.listings).items():
+        print(f'{name}: {len(body)} bytes')
+        for encoding in encodings:
+            size, seconds = cost(lambda: middleware._compressor(encoding), body, args.iterations)
+            print(f'  {encoding:4} {size:7d} bytes  {100 * (1 - size / len(body)):5.1f}% saved  '
+                  f'{seconds * 1e3:6.3f} ms CPU/page')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Synthetic marketplace dataset generator: bulk-loads users, listings (every
+category and both types) and requests into a new database with executemany,
+one transaction per batch.
+
+Requests are skewed like real traffic: a few popular listings and busy
+users account for most of them. Every user's password is PASSWORD, hashed
+once with the cheap PASSWORD_METHOD so load tests measure the app rather
+than password hashing. The first user is an admin (admin@example.com).
+
+Usage: python benchmarks/dataset.py DATABASE [--users 10000] [--listings 100000] [--requests 1000000] [--seed 1]
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+from db import apply_pragmas  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+PASSWORD = 'benchmark'
+PASSWORD_METHOD = 'pbkdf2:sha256:1000'
+ADMIN_EMAIL = 'admin@example.com'
+
+CATEGORIES = ('Furniture', 'Electronics', 'Books', 'Clothing', 'Sports', 'Home & Garden', 'Other')
+CONDITIONS = ('New', 'Like New', 'Good', 'Fair')
+LISTING_TYPES = ('Exchange', 'Donate')
+ITEMS = {
+    'Furniture': ('chair', 'desk', 'bookshelf', 'sofa', 'wardrobe', 'coffee table', 'bed frame', 'lamp'),
+    'Electronics': ('laptop', 'monitor', 'headphones', 'camera', 'keyboard', 'phone', 'speaker', 'radio'),
+    'Books': ('novel', 'cookbook', 'textbook', 'atlas', 'comic collection', 'dictionary', 'poetry book'),
+    'Clothing': ('winter jacket', 'raincoat', 'sweater', 'jeans', 'dress', 'boots', 'scarf', 'hiking shoes'),
+    'Sports': ('bicycle', 'tennis racket', 'yoga mat', 'skateboard', 'dumbbells', 'tent', 'football'),
+    'Home & Garden': ('plant pot', 'watering can', 'toolbox', 'curtains', 'rug', 'kettle', 'garden hose'),
+    'Other': ('board game', 'guitar', 'puzzle', 'suitcase', 'picture frame', 'sewing machine', 'easel'),
+}
+ADJECTIVES = ('vintage', 'sturdy', 'compact', 'handmade', 'wooden', 'modern', 'classic', 'lightweight',
+              'spacious', 'colourful', 'barely used', 'well loved')
+PHRASES = ('Works perfectly.', 'Small scratch on one side.', 'Pick up only.', 'Comes with the original box.',
+           'Moving out and need it gone.', 'Great for students.', 'Smoke-free home.', 'A few signs of wear.',
+           'Happy to swap for something useful.', 'Cleaned and ready to go.')
+FIRST_NAMES = ('Anna', 'Ben', 'Clara', 'David', 'Elif', 'Felix', 'Greta', 'Hamid', 'Ines', 'Jonas', 'Kim',
+               'Lena', 'Marek', 'Nora', 'Omar', 'Paula', 'Rui', 'Sofia', 'Tom', 'Yuki')
+LAST_NAMES = ('Becker', 'Costa', 'Dubois', 'Fischer', 'Garcia', 'Hansen', 'Ivanova', 'Jung', 'Kowalski',
+              'Lopez', 'Meyer', 'Novak', 'Okafor', 'Schmidt', 'Tanaka', 'Weber')
+CITIES = ('Berlin', 'Hamburg', 'Munich', 'Cologne', 'Leipzig', 'Dresden', 'Bremen', 'Freiburg', 'Vienna', 'Zurich')
+
+# Bulk-load settings: no fsync, the file is thrown away if the load fails
+LOAD_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -64000, 'foreign_keys': True}
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _skewed_weights(count, exponent=0.8):
+    """Cumulative Zipf-like weights: item 0 is the most popular."""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _insert(conn, sql, rows, batch_size):
+    for batch in _batches(rows, batch_size):
+        with conn:
+            conn.executemany(sql, batch)
+
+
+def generate(conn, users=10000, listings=100000, requests=1000000, seed=1, batch_size=10000):
+    """Load the dataset into a migrated, empty database."""
+    rng = random.Random(seed)
+    now = datetime(2025, 6, 1)
+    password = generate_password_hash(PASSWORD, PASSWORD_METHOD)
+
+    def user_rows():
+        yield ADMIN_EMAIL, password, 'Admin', CITIES[0], 1, _timestamp(now - timedelta(days=400))
+        for i in range(1, users):
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            joined = now - timedelta(days=400 * rng.random())
+            yield f'user{i}@example.com', password, name, rng.choice(CITIES), 0, _timestamp(joined)
+    _insert(conn, '''INSERT INTO users (email, password, display_name, location, is_admin, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?)''', user_rows(), batch_size)
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+
+    # Listings in date order, so ids and created_at grow together as in production
+    offsets = sorted(365 * 24 * 3600 * rng.random() for _ in range(listings))
+    created = [now - timedelta(days=365) + timedelta(seconds=offset) for offset in offsets]
+    owners = [rng.choice(user_ids[1:] or user_ids) for _ in range(listings)]
+
+    def listing_rows():
+        for owner, moment in zip(owners, created):
+            category = rng.choice(CATEGORIES)
+            title = f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(ITEMS[category])}'
+            description = ' '.join(rng.sample(PHRASES, 3))
+            status = 'Active' if rng.random() < 0.85 else 'Inactive'
+            yield (owner, title, description, category, rng.choice(CONDITIONS), rng.choice(LISTING_TYPES), status,
+                   _timestamp(moment))
+    _insert(conn, '''INSERT INTO listings (user_id, title, description, category, condition, listing_type, status,
+                                           created_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', listing_rows(), batch_size)
+    listing_ids = [row[0] for row in conn.execute('SELECT id FROM listings ORDER BY id')]
+
+    # Popular listings are the recent ones; busy requesters are spread over the user base
+    by_popularity = listing_ids[::-1]
+    listing_weights = _skewed_weights(len(by_popularity))
+    requesters = user_ids[1:] or user_ids
+    rng.shuffle(requesters)
+    requester_weights = _skewed_weights(len(requesters), exponent=0.6)
+    owner_of = dict(zip(listing_ids, owners))
+    created_at = dict(zip(listing_ids, created))
+    limit = min(requests, len(listing_ids) * (len(requesters) - 1))
+
+    def request_rows():
+        seen = set()
+        while len(seen) < limit:
+            picks = zip(rng.choices(by_popularity, cum_weights=listing_weights, k=batch_size),
+                        rng.choices(requesters, cum_weights=requester_weights, k=batch_size))
+            for listing_id, requester_id in picks:
+                if requester_id == owner_of[listing_id] or (listing_id, requester_id) in seen:
+                    continue
+                seen.add((listing_id, requester_id))
+                roll = rng.random()
+                status = 'Pending' if roll < 0.7 else 'Declined' if roll < 0.9 else 'Accepted'
+                age = (now - created_at[listing_id]).total_seconds()
+                requested = created_at[listing_id] + timedelta(seconds=age * rng.random())
+                yield listing_id, requester_id, status, _timestamp(requested)
+                if len(seen) == limit:
+                    return
+    _insert(conn, '''INSERT INTO requests (listing_id, requester_id, status, request_date)
+                     VALUES (?, ?, ?, ?)''', request_rows(), batch_size)
+
+    return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('users', 'listings', 'requests')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+    start = time.perf_counter()
+    conn = sqlite3.connect(args.database)
+    apply_pragmas(conn, LOAD_PRAGMAS)
+    migrate(conn)
+    counts = generate(conn, args.users, args.listings, args.requests, args.seed)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    print(', '.join(f'{count} {table}' for table, count in counts.items()) +
+          f' in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Load test the main pages against a database made by benchmarks/dataset.py:
+latency percentiles (p50/p95/p99) and throughput per route, through the
+Flask test client or a real threaded WSGI server over HTTP.
+
+With --baseline, results are compared against a stored run and the script
+exits with status 1 when any route's p95 rose, or its throughput fell, by
+more than --tolerance; --save-baseline records the current run instead.
+Baselines are per machine, so keep them next to the CI job that uses them.
+
+Usage: python benchmarks/load.py DATABASE [--server test|wsgi] [--concurrency 4] [--requests 200] [--cold] [--baseline FILE [--save-baseline]]
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+import app as app_module  # noqa: E402
+from dataset import ADMIN_EMAIL, PASSWORD, PASSWORD_METHOD  # noqa: E402
+
+# route name -> (path, who requests it)
+ROUTES = {
+    'marketplace': ('/marketplace', 'user'),
+    'filter': ('/marketplace?category=Electronics&type=Donate', 'user'),
+    'search': ('/marketplace?search=bicycle', 'user'),
+    'requests-sent': ('/my-requests?tab=sent', 'user'),
+    'requests-received': ('/my-requests?tab=received', 'user'),
+    'admin-listings': ('/admin/listings', 'admin'),
+    'admin-dashboard': ('/admin', 'admin'),
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class TestClientSession:
+    """One logged-in user on the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self, email):
+        response = self.client.post('/login', data={'email': email, 'password': PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f'login as {email} failed ({response.status_code})')
+
+    def get(self, path):
+        response = self.client.get(path)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPSession:
+    """One logged-in user talking HTTP to a server on ``port``."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookie = None
+
+    def _request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            return response
+        finally:
+            conn.close()
+
+    def login(self, email):
+        response = self._request('POST', '/login', urlencode({'email': email, 'password': PASSWORD}),
+                                 {'Content-Type': 'application/x-www-form-urlencoded'})
+        cookie = response.getheader('Set-Cookie')
+        if response.status != 302 or not cookie:
+            raise RuntimeError(f'login as {email} failed ({response.status})')
+        self.cookie = cookie.split(';', 1)[0]
+
+    def get(self, path):
+        return self._request('GET', path).status
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def busiest_user(path):
+    """Email of the user with the most sent requests, so the request pages have the most to show."""
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute('''SELECT u.email FROM requests r JOIN users u ON u.id = r.requester_id
+                              GROUP BY r.requester_id ORDER BY COUNT(*) DESC LIMIT 1''').fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise SystemExit(f'{path} has no requests; create it with benchmarks/dataset.py')
+    return row[0]
+
+
+def run_route(sessions, path, requests, warmup):
+    """Spread ``requests`` GETs over one thread per session; returns (sorted latencies, wall seconds)."""
+    for session in sessions:
+        for _ in range(warmup):
+            session.get(path)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    share, extra = divmod(requests, len(sessions))
+
+    def worker(session, count):
+        own = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                status = session.get(path)
+                own.append(time.perf_counter() - start)
+                if status != 200:
+                    raise RuntimeError(f'GET {path} answered {status}')
+        except Exception as e:
+            errors.append(e)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=worker, args=(session, share + (i < extra)))
+               for i, session in enumerate(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return sorted(latencies), wall
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every route that regressed against ``baseline``."""
+    regressions = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{route}: throughput {before['throughput']:.1f} -> {result['throughput']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--server', choices=('test', 'wsgi'), default='test')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured requests per route and client')
+    parser.add_argument('--route', choices=sorted(ROUTES), action='append')
+    parser.add_argument('--cold', action='store_true', help='turn off the query and card caches')
+    parser.add_argument('--baseline', metavar='FILE')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        parser.error(f'{args.database} does not exist; create it with benchmarks/dataset.py')
+    if args.save_baseline and not args.baseline:
+        parser.error('--save-baseline needs --baseline FILE')
+
+    app = app_module.app
+    # The dataset's hashes are cheap on purpose: keep them, so logins never rehash
+    app.config.update(DATABASE=args.database, PASSWORD_HASH_METHOD=PASSWORD_METHOD, SESSION_BACKEND='memory')
+    if args.cold:
+        app.config['QUERY_CACHE_BACKEND'] = None
+        app_module.card_cache.max_bytes = 0
+
+    server = None
+    if args.server == 'wsgi':
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def new_session(email):
+        session = HTTPSession(server.port) if server else TestClientSession(app)
+        session.login(email)
+        return session
+
+    mode = f"{args.server}{'-cold' if args.cold else ''}-c{args.concurrency}"
+    try:
+        user = busiest_user(args.database)
+        sessions = {'user': [new_session(user) for _ in range(args.concurrency)],
+                    'admin': [new_session(ADMIN_EMAIL) for _ in range(args.concurrency)]}
+        print(f'{mode}: {args.requests} requests per route as {user}')
+        print(f"{'route':20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        results = {}
+        for route in args.route or ROUTES:
+            path, role = ROUTES[route]
+            latencies, wall = run_route(sessions[role], path, args.requests, args.warmup)
+            results[route] = {'p50_ms': percentile(latencies, 50) * 1e3,
+                              'p95_ms': percentile(latencies, 95) * 1e3,
+                              'p99_ms': percentile(latencies, 99) * 1e3,
+                              'throughput': len(latencies) / wall}
+            print(f"{route:20} {results[route]['p50_ms']:8.1f} {results[route]['p95_ms']:8.1f} "
+                  f"{results[route]['p99_ms']:8.1f} {results[route]['throughput']:8.1f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        app_module.close_pool()
+
+    if not args.baseline:
+        return
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    if args.save_baseline:
+        stored[mode] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline for {mode} to {args.baseline}')
+        return
+    if mode not in stored:
+        sys.exit(f'No baseline for {mode} in {args.baseline}; record one with --save-baseline')
+    regressions = compare(results, stored[mode], args.tolerance)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions beyond {args.tolerance:.0%} against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
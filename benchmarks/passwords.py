@@ -0,0 +1,67 @@
+"""
+Benchmark password verification, i.e. the CPU cost of a login, under
+different hashing policies: logins per second per core, and through the
+app's bounded hashing pool with several workers.
+
+Usage: python benchmarks/passwords.py [--seconds 2] [--workers 2] [--policy scrypt:32768:8:1 ...]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+
+POLICIES = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000']
+
+
+def per_core(stored, seconds):
+    """Verifications per CPU second on one thread."""
+    count = 0
+    start = time.process_time()
+    while time.process_time() - start < seconds:
+        check_password_hash(stored, 'correct horse')
+        count += 1
+    return count / (time.process_time() - start)
+
+
+def through_pool(stored, seconds, workers):
+    """Verifications per wall-clock second with many callers sharing a hasher of ``workers`` threads."""
+    hasher = PasswordHasher(workers=workers, max_pending=1000)
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+
+    def caller():
+        done = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(stored, 'correct horse')
+            done += 1
+        return done
+
+    with ThreadPoolExecutor(max_workers=workers * 4) as callers:
+        total = sum(callers.map(lambda _: caller(), range(workers * 4)))
+    hasher.shutdown()
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--policy', action='append')
+    args = parser.parse_args()
+
+    for policy in args.policy or POLICIES:
+        stored = generate_password_hash('correct horse', policy)
+        single = per_core(stored, args.seconds)
+        pooled = through_pool(stored, args.seconds, args.workers)
+        print(f'{policy:22} {1e3 / single:7.1f} ms/login  {single:7.1f} logins/s/core  '
+              f'{pooled:7.1f} logins/s with {args.workers} workers')
+
+
+if __name__ == '__main__':
+    main()
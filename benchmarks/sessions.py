@@ -0,0 +1,73 @@
+"""
+Benchmark loading and saving the session on a request that does not
+change it: the old signed cookie (user id, name and admin flag, verified
+with an HMAC on every request) against the server-side stores, whose
+cookie holds only an id.
+
+Usage: python benchmarks/sessions.py [--iterations 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+import app as app_module  # noqa: E402
+from sessions import MemorySessionStore, SQLiteSessionStore, ServerSessionInterface  # noqa: E402
+
+OLD_SESSION = {'user_id': 42, 'display_name': 'Benchmark User', 'is_admin': 0, 'lang': 'de'}
+
+
+def cookie_for(interface):
+    """Log a session in through ``interface`` and return its cookie value."""
+    app = app_module.app
+    with app.test_request_context('/'):
+        session = interface.open_session(app, app_module.request)
+        session.update(OLD_SESSION if isinstance(interface, SecureCookieSessionInterface)
+                       else {'user_id': 42, 'lang': 'de'})
+        response = app.response_class()
+        interface.save_session(app, session, response)
+    return response.headers['Set-Cookie'].split(';', 1)[0].split('=', 1)[1]
+
+
+def per_request(interface, iterations):
+    app = app_module.app
+    cookie = cookie_for(interface)
+    with app.test_request_context('/', headers={'Cookie': f'session={cookie}'}):
+        request = app_module.request
+
+        def cycle():
+            session = interface.open_session(app, request)
+            session.get('user_id')
+            interface.save_session(app, session, app.response_class())
+        return timeit.timeit(cycle, number=iterations) / iterations, len(cookie)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    memory, sqlite = MemorySessionStore(), SQLiteSessionStore(path)
+    interfaces = {
+        'signed cookie': SecureCookieSessionInterface(),
+        'server, memory': ServerSessionInterface(lambda: memory, sweep_interval=3600),
+        'server, sqlite': ServerSessionInterface(lambda: sqlite, sweep_interval=3600),
+    }
+    try:
+        for name, interface in interfaces.items():
+            seconds, cookie_size = per_request(interface, args.iterations)
+            print(f'{name:15} {seconds * 1e6:7.1f} us/request  cookie {cookie_size} bytes')
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
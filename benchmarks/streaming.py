@@ -0,0 +1,97 @@
+"""
+Benchmark buffered against streamed rendering of a long listing page:
+time to first byte, total time and peak memory allocated while serving it
+(tracemalloc).
+
+Each mode runs in a fresh process, so nothing allocated by one is counted
+against the other.
+
+Usage: python benchmarks/streaming.py [--rows 20000] [--page admin] [--page marketplace]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+
+PAGES = {'admin': '/admin/listings', 'marketplace': '/marketplace'}
+
+
+def create_database(path, rows):
+    app = app_module.app
+    app.config['DATABASE'] = path
+    app_module.init_db()
+    conn = app_module.get_db()
+    conn.execute("""INSERT INTO users (email, password, display_name, location, is_admin)
+                    VALUES ('bench@example.com', 'x', 'Bench', 'City', 1)""")
+    conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (1, ?, ?, 'Books', 'Good', 'Exchange')""",
+                     [(f'Item {i}', 'Seed listing ' * 10) for i in range(rows)])
+    conn.commit()
+    conn.close()
+    app_module.close_pool()
+
+
+def measure(path, url, rows, stream):
+    """Request one page of every row; returns (ttfb, total seconds, peak bytes allocated)."""
+    app = app_module.app
+    app.config.update(DATABASE=path, PAGE_SIZE=50, STREAM_PAGES=stream, QUERY_CACHE_BACKEND=None)
+    app_module.card_cache.max_bytes = 0  # measure rendering, not the card cache filling up
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(user_id=1, display_name='Bench', is_admin=1)
+    client.get(url).close()  # warm up templates and the pool on a short page
+    app.config['PAGE_SIZE'] = rows
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    ttfb = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    total = time.perf_counter() - start
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ttfb, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--page', choices=sorted(PAGES), action='append')
+    parser.add_argument('--measure', nargs=3, metavar=('DATABASE', 'PAGE', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        path, page, mode = args.measure
+        ttfb, total, peak = measure(path, PAGES[page], args.rows, mode == 'streamed')
+        print(f'{page:12} {mode:9} TTFB {ttfb * 1e3:8.1f} ms  total {total * 1e3:8.1f} ms  '
+              f'peak memory {peak / 2 ** 20:6.1f} MiB')
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        create_database(path, args.rows)
+        print(f'{args.rows} listings on one page')
+        for page in args.page or ['admin']:
+            for mode in ('buffered', 'streamed'):
+                subprocess.run([sys.executable, __file__, '--rows', str(args.rows), '--measure', path, page, mode],
+                               check=True)
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for template translation lookups: the old nested-dict walk
+against the flattened per-language table, per lookup and per rendered page.
+
+Usage: python benchmarks/translations.py [--listings 24] [--iterations 200000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+from pagination import Page  # noqa: E402
+
+KEYS = ['common.appName', 'marketplace.searchPlaceholder', 'marketplace.categories.Home & Garden',
+        'status.Like New', 'no.such.key']
+
+
+def nested_lookup(tree, key):
+    """The pre-flattening get_t(): split the key and walk nested dicts."""
+    current = tree
+    for k in key.split('.'):
+        if isinstance(current, dict) and k in current:
+            current = current[k]
+        else:
+            return key
+    return current if isinstance(current, str) else key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', type=int, default=24)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    with open(os.path.join(app_module.locales_dir, 'de.json'), encoding='utf-8') as f:
+        tree = json.load(f)
+    t = app_module.catalog.translator('de')
+
+    nested = timeit.timeit(lambda: [nested_lookup(tree, k) for k in KEYS], number=args.iterations)
+    flat = timeit.timeit(lambda: [t(k) for k in KEYS], number=args.iterations)
+    lookups = args.iterations * len(KEYS)
+    print(f'nested walk: {nested / lookups * 1e9:7.1f} ns/lookup')
+    print(f'flat table:  {flat / lookups * 1e9:7.1f} ns/lookup ({nested / flat:.1f}x faster)')
+
+    listings = [{'id': i, 'user_id': 0, 'title': f'Item {i}', 'description': 'A description',
+                 'category': 'Home & Garden', 'condition': 'Like New', 'listing_type': 'Exchange',
+                 'image_path': None, 'display_name': 'Someone', 'location': 'Somewhere', 'version': 1}
+                for i in range(args.listings)]
+    calls = []
+
+    def counting(key):
+        calls.append(key)
+        return t(key)
+    counting.lang = 'de'
+
+    app = app_module.app
+    app_module.card_cache.max_bytes = 0  # count every card's lookups, not just the first render's
+    with app.test_request_context('/marketplace'):
+        app_module.g.t = counting
+        app_module.session['lang'] = 'de'
+        app_module.render_template('marketplace.html', listings=listings, page=Page(listings))
+    per_page = len(calls)
+    print(f'marketplace page with {args.listings} listings: {per_page} lookups, '
+          f'{per_page * nested / lookups * 1e6:.1f} us nested vs {per_page * flat / lookups * 1e6:.1f} us flat')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark marketplace reads running alongside listing/request writes,
+with the rollback journal and with WAL.
+
+Usage: python benchmarks/wal_concurrency.py [--seconds 5] [--readers 4] [--writers 2]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+
+PROFILES = {
+    'rollback journal': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'WAL': None,  # the app's default profile
+}
+
+MARKETPLACE_QUERY = '''SELECT l.*, u.display_name, u.location
+                       FROM listings l JOIN users u ON l.user_id = u.id
+                       WHERE l.status = 'Active' ORDER BY l.created_at DESC LIMIT 50'''
+
+
+def run_profile(name, pragmas, seconds, readers, writers):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = app_module.app
+    app.config['DATABASE'] = path
+    app.config['DB_POOL_SIZE'] = readers + writers
+    if pragmas is not None:
+        app.config['SQLITE_PRAGMAS'] = pragmas
+    app_module.init_db()
+
+    conn = app_module.get_db()
+    conn.execute("INSERT INTO users (email, password, display_name, location) VALUES ('bench@example.com', 'x', 'Bench', 'City')")
+    user_id = conn.execute("SELECT id FROM users WHERE email = 'bench@example.com'").fetchone()[0]
+    conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (?, ?, ?, 'Books', 'Good', 'Exchange')""",
+                     [(user_id, f'Item {i}', 'Seed listing ' * 10) for i in range(2000)])
+    conn.commit()
+    conn.close()
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader():
+        done = 0
+        while time.monotonic() < stop:
+            conn = app_module.get_db()
+            try:
+                conn.execute(MARKETPLACE_QUERY).fetchall()
+                done += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    counts['locked'] += 1
+            finally:
+                conn.close()
+        with lock:
+            counts['reads'] += done
+
+    def writer():
+        done = 0
+        while time.monotonic() < stop:
+            conn = app_module.get_db()
+            try:
+                c = conn.cursor()
+                c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                             VALUES (?, 'New', 'Written during benchmark', 'Books', 'Good', 'Donate')""", (user_id,))
+                c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)", (c.lastrowid, user_id))
+                conn.commit()
+                done += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    counts['locked'] += 1
+            finally:
+                conn.close()
+        with lock:
+            counts['writes'] += done
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    journal_mode = app_module.check_db_settings()['journal_mode']
+    app_module.close_pool()
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+
+    print(f"{name:>18} ({journal_mode}): {counts['reads'] / seconds:8.0f} reads/s  "
+          f"{counts['writes'] / seconds:7.0f} writes/s  {counts['locked']} locked errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    args = parser.parse_args()
+
+    default_pragmas = dict(app_module.app.config['SQLITE_PRAGMAS'])
+    for name, pragmas in PROFILES.items():
+        app_module.app.config['SQLITE_PRAGMAS'] = default_pragmas
+        run_profile(name, pragmas and {**default_pragmas, **pragmas}, args.seconds, args.readers, args.writers)
+
+
+if __name__ == '__main__':
+    main()
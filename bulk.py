@@ -0,0 +1,204 @@
+"""
+Bulk listing import and export
+
+Imports read CSV or JSON Lines from a text stream one row at a time,
+validate each row against the listing vocabularies and insert the valid
+ones with ``executemany`` in IMMEDIATE transactions of ``batch_size`` rows,
+so a catalogue of thousands of items costs a handful of commits instead of
+one per item. Invalid rows are reported by line number and skipped; they
+never abort the rest of the import.
+
+Exports read the listings from a cursor ``batch_size`` rows at a time and
+yield one chunk of text per batch, so a full catalogue dump never holds
+more than a batch in memory. An export can be imported again: columns the
+import does not know (id, image_path, created_at) are ignored.
+"""
+import csv
+import io
+import json
+import os
+
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+CATEGORIES = ('Furniture', 'Electronics', 'Books', 'Clothing', 'Sports', 'Home & Garden', 'Other')
+CONDITIONS = ('New', 'Like New', 'Good', 'Fair')
+LISTING_TYPES = ('Exchange', 'Donate')
+STATUSES = ('Active', 'Inactive')
+
+REQUIRED_FIELDS = ('title', 'description', 'category', 'condition', 'listing_type')
+# field -> allowed values, matched case-insensitively
+VOCABULARIES = {'category': CATEGORIES, 'condition': CONDITIONS, 'listing_type': LISTING_TYPES,
+                'status': STATUSES}
+_CANONICAL = {field: {value.lower(): value for value in values} for field, values in VOCABULARIES.items()}
+
+EXPORT_FIELDS = ('id', 'owner_email', 'title', 'description', 'category', 'condition', 'listing_type', 'status',
+                 'image_path', 'created_at')
+
+
+def detect_format(filename):
+    """The format implied by ``filename``'s extension, or None."""
+    return EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+
+
+def parse_rows(stream, fmt):
+    """Yield ``(line, row)`` pairs from a text stream.
+
+    ``row`` is a dict, or a ValueError for a line that could not be parsed.
+    Undecodable input ends the stream with one last error.
+    """
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    yield reader.line_num, ValueError(f'malformed CSV: {e}')
+                    continue
+                if None in row:
+                    yield reader.line_num, ValueError('more values than columns')
+                else:
+                    yield reader.line_num, row
+        elif fmt == 'jsonl':
+            for line, text in enumerate(stream, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError as e:
+                    yield line, ValueError(f'invalid JSON: {e}')
+                    continue
+                if isinstance(row, dict):
+                    yield line, row
+                else:
+                    yield line, ValueError('expected a JSON object')
+        else:
+            raise ValueError(f'Unknown format: {fmt!r}')
+    except UnicodeDecodeError:
+        yield None, ValueError('the file is not valid UTF-8; stopped reading')
+
+
+def clean_row(row):
+    """Return the row's listing values, normalised, or raise ValueError saying what is wrong."""
+    values = {}
+    for field in (*REQUIRED_FIELDS, 'status', 'owner_email'):
+        value = row.get(field)
+        if value is None or value == '':
+            if field in REQUIRED_FIELDS:
+                raise ValueError(f'missing {field}')
+            continue
+        if not isinstance(value, str):
+            raise ValueError(f'{field} must be text')
+        value = value.strip()
+        if field in _CANONICAL:
+            canonical = _CANONICAL[field].get(value.lower())
+            if canonical is None:
+                raise ValueError(f"unknown {field} {value!r}; expected one of {', '.join(VOCABULARIES[field])}")
+            value = canonical
+        elif not value and field in REQUIRED_FIELDS:
+            raise ValueError(f'missing {field}')
+        values[field] = value
+    values.setdefault('status', 'Active')
+    return values
+
+
+class ImportResult:
+    """Outcome of an import: rows inserted and the first ``max_errors`` rejected rows."""
+
+    def __init__(self, max_errors=None):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []  # (line, message)
+        self.max_errors = max_errors
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+
+def import_listings(conn, stream, fmt, owner_id, batch_size=500, max_errors=100):
+    """Import listings from ``stream``; rows without an owner_email belong to ``owner_id``.
+
+    Each batch is its own IMMEDIATE transaction, so a large import never holds
+    the write lock for long and the rows of earlier batches stay imported if a
+    later one fails.
+    """
+    result = ImportResult(max_errors)
+    owners = {}  # owner_email -> user id, or None for unknown emails
+    batch = []
+
+    def flush():
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('''INSERT INTO listings (user_id, title, description, category, condition,
+                                                      listing_type, status)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        result.imported += len(batch)
+        batch.clear()
+
+    for line, row in parse_rows(stream, fmt):
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            values = clean_row(row)
+            user_id = owner_id
+            email = values.get('owner_email')
+            if email:
+                if email not in owners:
+                    found = conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
+                    owners[email] = found[0] if found else None
+                user_id = owners[email]
+                if user_id is None:
+                    raise ValueError(f'no user with email {email!r}')
+        except ValueError as e:
+            result.reject(line, str(e))
+            continue
+        batch.append((user_id, values['title'], values['description'], values['category'], values['condition'],
+                      values['listing_type'], values['status']))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def export_listings(conn, fmt, batch_size=500):
+    """Yield every listing as CSV or JSON Lines text, one chunk per batch of rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format: {fmt!r}')
+    cursor = conn.execute('''SELECT l.id, u.email, l.title, l.description, l.category, l.condition,
+                                    l.listing_type, l.status, l.image_path, l.created_at
+                             FROM listings l JOIN users u ON u.id = l.user_id
+                             ORDER BY l.id''')
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if fmt == 'csv':
+            writer.writerow(EXPORT_FIELDS)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if fmt == 'csv':
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        cursor.close()
@@ -0,0 +1,221 @@
+"""
+WSGI response compression
+
+``CompressionMiddleware`` gzip- or brotli-compresses text responses for
+clients that accept it. Buffered responses are compressed in one go;
+streamed responses (no Content-Length) are compressed chunk by chunk and
+flushed after every chunk, so the browser still receives each part of the
+page as soon as the application yields it. Responses that are small, not
+text, already encoded (e.g. precompressed static assets) or marked
+``no-transform`` pass through untouched.
+
+The compressed representation gets its own ETag (``"<etag>-gzip"``); the
+suffix is stripped from If-None-Match on the way in, so the application's
+conditional handling keeps working.
+"""
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+
+_ETAG_SUFFIX_RE = re.compile(r'-(?:gzip|br)"')
+
+
+def _accepts(accept_encoding, encoding):
+    """Whether an Accept-Encoding header allows ``encoding`` (q > 0)."""
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        return not match or float(match.group(1)) > 0
+    return False
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits 31: gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress text responses above ``min_size`` bytes.
+
+    ``level`` is the gzip level (1-9) and ``brotli_quality`` the brotli
+    quality (0-11); per-request compression favours speed over ratio, the
+    maximum settings are for precompressed static files (see assets.py).
+    """
+
+    def __init__(self, app, min_size=500, level=6, brotli_quality=4, use_brotli=True):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.use_brotli = use_brotli and brotli is not None
+
+    def choose_encoding(self, accept_encoding):
+        if self.use_brotli and _accepts(accept_encoding, 'br'):
+            return 'br'
+        if _accepts(accept_encoding, 'gzip'):
+            return 'gzip'
+        return None
+
+    def _compressor(self, encoding):
+        return _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.level)
+
+    def __call__(self, environ, start_response):
+        encoding = self.choose_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        state = {}
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            # A 304 confirms the client's (compressed) copy, so it keeps its tag
+            state['revalidating'] = f'-{encoding}"' in environ['HTTP_IF_NONE_MATCH']
+            environ['HTTP_IF_NONE_MATCH'] = _ETAG_SUFFIX_RE.sub('"', environ['HTTP_IF_NONE_MATCH'])
+
+        def capture(status, headers, exc_info=None):
+            if exc_info is not None and state.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['status'] = status
+            state['headers'] = headers
+            state['exc_info'] = exc_info
+            return state.setdefault('written', []).append
+
+        app_iter = self.app(environ, capture)
+        return self._respond(app_iter, state, encoding, start_response)
+
+    def _compressible(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        names = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in names or 'no-transform' in names.get('cache-control', ''):
+            return False
+        content_type = names.get('content-type', '').lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _respond(self, app_iter, state, encoding, start_response):
+        try:
+            chunks = iter(app_iter)
+            # Look ahead until the application has called start_response
+            pending = list(state.pop('written', []))
+            while 'status' not in state:
+                pending.append(next(chunks))
+            pending.extend(state.pop('written', []))
+            status, headers = state['status'], state['headers']
+
+            if not self._compressible(status, headers):
+                if status.startswith('304') and state.get('revalidating'):
+                    headers = [(name, f'{value[:-1]}-{encoding}"' if name.lower() == 'etag' else value)
+                               for name, value in headers]
+                state['started'] = True
+                start_response(status, headers, state['exc_info'])
+                yield from pending
+                yield from chunks
+                return
+
+            length = next((value for name, value in headers if name.lower() == 'content-length'), None)
+            if length is None:
+                # Streamed: buffer up to min_size to decide, then compress as we go
+                size = sum(len(chunk) for chunk in pending)
+                finished = False
+                while size < self.min_size:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        finished = True
+                        break
+                    pending.append(chunk)
+                    size += len(chunk)
+                if finished:
+                    body = b''.join(pending)
+                    headers = [(n, v) for n, v in headers if n.lower() != 'content-length']
+                    headers.append(('Content-Length', str(len(body))))
+                    state['started'] = True
+                    start_response(status, headers, state['exc_info'])
+                    yield body
+                    return
+            elif int(length) < self.min_size:
+                state['started'] = True
+                start_response(status, headers, state['exc_info'])
+                yield from pending
+                yield from chunks
+                return
+
+            compressor = self._compressor(encoding)
+            headers = self._compressed_headers(headers, encoding)
+            if length is not None:
+                # Buffered: compress the whole body and send a real length
+                body = compressor.compress(b''.join(pending + list(chunks))) + compressor.finish()
+                headers.append(('Content-Length', str(len(body))))
+                state['started'] = True
+                start_response(status, headers, state['exc_info'])
+                yield body
+                return
+
+            state['started'] = True
+            start_response(status, headers, state['exc_info'])
+            data = compressor.compress(b''.join(pending)) + compressor.flush()
+            if data:
+                yield data
+            for chunk in chunks:
+                if chunk:
+                    data = compressor.compress(chunk) + compressor.flush()
+                    if data:
+                        yield data
+            yield compressor.finish()
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+    def _compressed_headers(self, headers, encoding):
+        result = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'content-length':
+                continue
+            if lower == 'etag' and value.endswith('"'):
+                value = f'{value[:-1]}-{encoding}"'
+            if lower == 'vary':
+                vary = value
+                continue
+            result.append((name, value))
+        if vary is None:
+            vary = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            vary = f'{vary}, Accept-Encoding'
+        result.append(('Vary', vary))
+        result.append(('Content-Encoding', encoding))
+        return result
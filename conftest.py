@@ -3,7 +3,11 @@ import sqlite3
 import os
 import tempfile
 import shutil
-from app import app
+from app import app, load_assets
+from migrations import migrate
+
+# Built once, as wsgi.create_app() does before the workers start
+load_assets()
 
 # Global variable to store test database path
 _test_db_path = None
@@ -22,62 +26,30 @@ def setup_test_db(monkeypatch):
     app.config['TESTING'] = True
     app.config['UPLOAD_FOLDER'] = upload_dir
     app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SESSION_BACKEND'] = 'memory'
     
     # Initialize test database
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
     
-    # Create tables (same as in app.py)
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        display_name TEXT NOT NULL,
-        location TEXT NOT NULL,
-        is_admin INTEGER DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS listings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        description TEXT NOT NULL,
-        category TEXT NOT NULL,
-        condition TEXT NOT NULL,
-        listing_type TEXT NOT NULL,
-        status TEXT DEFAULT 'Active',
-        image_path TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS requests (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        listing_id INTEGER NOT NULL,
-        requester_id INTEGER NOT NULL,
-        status TEXT DEFAULT 'Pending',
-        request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (listing_id) REFERENCES listings (id),
-        FOREIGN KEY (requester_id) REFERENCES users (id)
-    )''')
+    # Create the schema with the same migrations as the app
+    migrate(conn)
     
     conn.commit()
     conn.close()
     
-    # Monkey patch get_db to use test database with timeout
-    def get_test_db():
-        conn = sqlite3.connect(db_path, timeout=10.0)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
-    # Replace get_db in app module
-    import app as app_module
-    monkeypatch.setattr(app_module, 'get_db', get_test_db)
+    # Point the connection pool at the test database
+    app.config['DATABASE'] = db_path
     
     yield
     
     # Cleanup
+    import app as app_module
+    app_module.close_pool()
+    app_module.card_cache.clear()
+    _, query_cache = app.extensions.pop('query_cache', (None, None))
+    if query_cache is not None:
+        query_cache.close()
+    app.extensions.pop('session_store', None)
     os.close(db_fd)
     try:
         os.unlink(db_path)
@@ -151,8 +123,6 @@ def logged_in_user(client, test_user):
     """Log in a test user and return the client with session."""
     with client.session_transaction() as sess:
         sess['user_id'] = test_user['id']
-        sess['display_name'] = test_user['display_name']
-        sess['is_admin'] = test_user['is_admin']
     return client
 
 @pytest.fixture
@@ -160,8 +130,6 @@ def logged_in_admin(client, test_admin):
     """Log in a test admin and return the client with session."""
     with client.session_transaction() as sess:
         sess['user_id'] = test_admin['id']
-        sess['display_name'] = test_admin['display_name']
-        sess['is_admin'] = test_admin['is_admin']
     return client
 
 @pytest.fixture
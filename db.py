@@ -0,0 +1,265 @@
+"""
+SQLite connection pooling and pragma configuration for the EcoSwap application
+"""
+import sqlite3
+import threading
+import time
+
+
+# Pragmas we know how to apply, in the order they must run. busy_timeout
+# goes first so that switching journal_mode can wait out other writers.
+PRAGMA_ORDER = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size',
+                'mmap_size', 'temp_store', 'foreign_keys')
+
+
+def apply_pragmas(conn, pragmas):
+    """Apply a pragma profile (name -> value) to a connection."""
+    unknown = set(pragmas) - set(PRAGMA_ORDER)
+    if unknown:
+        raise ValueError(f"Unsupported pragma(s): {', '.join(sorted(unknown))}")
+    for name in PRAGMA_ORDER:
+        if name not in pragmas:
+            continue
+        value = pragmas[name]
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, int) and not str(value).isidentifier():
+            raise ValueError(f'Invalid value for pragma {name}: {value!r}')
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+def read_pragmas(conn, names=PRAGMA_ORDER):
+    """Return the settings actually in effect on a connection."""
+    return {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in names}
+
+
+# SQLite reports some pragmas back as integers or lowercase names
+_PRAGMA_ALIASES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+}
+
+
+def pragma_mismatches(pragmas, effective):
+    """Compare a requested profile with ``read_pragmas`` output.
+
+    Returns ``{name: (requested, effective)}`` for every setting that did not
+    take, e.g. WAL on a filesystem that does not support shared memory.
+    """
+    mismatches = {}
+    for name, requested in pragmas.items():
+        actual = effective.get(name)
+        expected = requested
+        if isinstance(requested, str):
+            expected = _PRAGMA_ALIASES.get(name, {}).get(requested.upper(), requested.lower())
+            if isinstance(actual, str):
+                actual = actual.lower()
+        elif isinstance(requested, bool):
+            expected = int(requested)
+        if actual != expected:
+            mismatches[name] = (requested, effective.get(name))
+    return mismatches
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class PooledConnection:
+    """Proxy around a pooled sqlite3 connection.
+
+    Behaves like the underlying connection, except that ``close()`` hands the
+    connection back to its pool instead of closing it.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    @property
+    def raw(self):
+        """The underlying sqlite3 connection."""
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return self._conn
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.raw.__exit__(exc_type, exc, tb)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections.
+
+    Every new connection gets the ``pragmas`` profile applied before use.
+    Connections are created lazily up to ``size``. When every connection is
+    checked out, ``connect()`` waits up to ``timeout`` seconds for one to be
+    released. Connections idle for longer than ``health_check_interval``
+    seconds are pinged before being handed out and replaced if broken.
+    """
+
+    def __init__(self, database, size=5, timeout=10.0, health_check_interval=30.0,
+                 pragmas=None, on_connect=None, factory=sqlite3.Connection):
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(pragmas or {})
+        self.on_connect = on_connect
+        self.factory = factory  # sqlite3.Connection subclass, e.g. profiling.ProfiledConnection
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, released_at) pairs, most recent last
+        self._created = 0
+        self._closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn, self.pragmas)
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._created -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    def connect(self, timeout=None):
+        """Check out a connection wrapped in a ``PooledConnection``."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn, released_at = self._checkout(deadline)
+            if conn is None:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._created -= 1
+                        self._cond.notify()
+                    raise
+            elif (time.monotonic() - released_at >= self.health_check_interval
+                  and not self._is_healthy(conn)):
+                self._discard(conn)
+                continue
+            return PooledConnection(self, conn)
+
+    def _checkout(self, deadline):
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout('Connection pool is closed')
+                if self._idle:
+                    self.hits += 1
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    self.misses += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'No database connection available after waiting; pool size is {self.size}')
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+            self._created -= 1
+            self._cond.notify_all()
+        conn.close()
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+
+    def drain(self, timeout=None):
+        """Close the pool and wait up to ``timeout`` seconds for checked-out connections to come back.
+
+        Returns how many were still checked out when the wait ended.
+        """
+        self.close()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._created > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._created
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+            }
@@ -0,0 +1,106 @@
+"""
+Rendered-fragment cache for marketplace listing cards
+
+A card only changes when its listing does, so the rendered HTML is cached
+under ``(listing id, listing version, language, ...)``. ``listings.version``
+is bumped by a trigger on every update (see migration 9), which makes an
+edited listing miss the cache without any coordination; writers also call
+``invalidate`` so superseded entries free their memory straight away
+instead of waiting to be evicted.
+"""
+import threading
+from collections import OrderedDict
+
+
+def create_listing_versions(conn):
+    """Migration step: add ``listings.version`` and the trigger bumping it."""
+    conn.execute('ALTER TABLE listings ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    create_version_trigger(conn)
+
+
+def create_version_trigger(conn):
+    """(Re)create the trigger that bumps ``listings.version`` on every update."""
+    # Recursive triggers are off, so the inner UPDATE does not fire this again;
+    # an UPDATE that sets version itself is left alone
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS listings_version_bump AFTER UPDATE ON listings
+        WHEN new.version = old.version BEGIN
+        UPDATE listings SET version = old.version + 1 WHERE id = new.id;
+    END""")
+
+
+class FragmentCache:
+    """Thread-safe LRU cache of rendered HTML, capped by total size.
+
+    Keys are tuples whose first element is the listing id, so every variant
+    of a listing's card can be dropped with ``invalidate``. ``max_bytes`` of
+    0 disables the cache.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (html, size)
+        self._keys_by_id = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (html, size)
+            self._keys_by_id.setdefault(key[0], set()).add(key)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry[1]
+        keys = self._keys_by_id.get(key[0])
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_id[key[0]]
+
+    def invalidate(self, *ids):
+        """Drop every cached fragment for the given listing ids."""
+        with self._lock:
+            for item_id in ids:
+                for key in list(self._keys_by_id.get(item_id, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
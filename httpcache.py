@@ -0,0 +1,108 @@
+"""
+HTTP caching helpers: data versions for ETags, fingerprints for static files
+
+Every write to users, listings or requests bumps that table's row in
+``data_versions`` from a trigger (see migration 10), so the validator for a
+page is one primary-key lookup instead of a scan for the newest row. Pages
+hash the versions of the tables they show together with everything else
+that changes their HTML (query string, language, user) into an ETag.
+
+Static files are linked with a content fingerprint in the URL, which lets
+browsers keep them for a year: a changed file gets a new URL.
+"""
+import hashlib
+import os
+import re
+import threading
+
+VERSIONED_TABLES = ('users', 'listings', 'requests')
+
+# Content-addressed uploads, see storage.BlobStore and images.make_derivatives
+_HASHED_UPLOAD_RE = re.compile(r'^uploads/[0-9a-f]{2}/[0-9a-f]{64}(?:_\d+)?\.\w+$')
+
+
+def create_data_versions(conn):
+    """Migration step: create ``data_versions`` and the triggers bumping it."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    conn.executemany("INSERT OR IGNORE INTO data_versions (name) VALUES (?)",
+                     [(table,) for table in VERSIONED_TABLES])
+    create_data_version_triggers(conn)
+
+
+def create_data_version_triggers(conn):
+    """(Re)create the triggers that bump ``data_versions`` on every write."""
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS data_version_{table}_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+            END""")
+
+
+def read_data_versions(conn, names=VERSIONED_TABLES):
+    placeholders = ', '.join('?' for _ in names)
+    return {row[0]: row[1] for row in conn.execute(
+        f"SELECT name, version FROM data_versions WHERE name IN ({placeholders})", list(names))}
+
+
+def compute_etag(*parts):
+    """Hash the parts that determine a response body into an ETag value."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+
+def tree_fingerprint(*directories):
+    """Fingerprint the contents of directories, e.g. templates and locales.
+
+    Included in page ETags so a deploy that changes templates does not keep
+    answering 304 for pages rendered by the old ones. Deterministic, so every
+    worker process of one deploy agrees.
+    """
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, directory).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def is_hashed_upload(filename):
+    return bool(_HASHED_UPLOAD_RE.match(filename))
+
+
+class FileFingerprints:
+    """Content hashes of static files, recomputed only when a file's mtime changes."""
+
+    def __init__(self, root):
+        self.root = root
+        self._cache = {}  # filename -> (mtime, fingerprint)
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        path = os.path.join(self.root, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._cache.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        fingerprint = digest.hexdigest()[:12]
+        with self._lock:
+            self._cache[filename] = (mtime, fingerprint)
+        return fingerprint
@@ -0,0 +1,81 @@
+"""
+Translation catalog for the EcoSwap templates
+
+Locale files are nested JSON (``{"marketplace": {"searchButton": ...}}``).
+They are flattened once at load time into a single dict per language keyed by
+the dotted path (``"marketplace.searchButton"``), so a lookup is one dict
+access instead of splitting the key and walking nested dicts.
+"""
+import json
+import os
+import threading
+from collections import Counter
+
+
+def flatten(tree, prefix=''):
+    """Flatten nested translation dicts into {dotted.key: string}.
+
+    Only string leaves are kept; looking up an intermediate node (a dict)
+    therefore misses, just like a key that does not exist.
+    """
+    flat = {}
+    for key, value in tree.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '.'))
+        elif isinstance(value, str):
+            flat[path] = value
+    return flat
+
+
+class Catalog:
+    """Flattened translation tables for every supported language."""
+
+    def __init__(self, tables, default_lang='en'):
+        self.tables = tables
+        self.default_lang = default_lang
+        self.missing = Counter()  # (lang, key) -> number of misses
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, locales_dir, languages, default_lang='en'):
+        tables = {}
+        for lang in languages:
+            try:
+                with open(os.path.join(locales_dir, f'{lang}.json'), 'r', encoding='utf-8') as f:
+                    tables[lang] = flatten(json.load(f))
+            except Exception as e:
+                print(f"Error loading {lang} translation: {e}")
+                tables[lang] = {}
+        return cls(tables, default_lang)
+
+    @property
+    def languages(self):
+        return list(self.tables)
+
+    def _record_missing(self, lang, key):
+        with self._lock:
+            self.missing[(lang, key)] += 1
+
+    def resolve(self, lang):
+        """``lang`` if it has a table, else the default language."""
+        return lang if lang in self.tables else self.default_lang
+
+    def translator(self, lang):
+        """Return ``t(key)`` bound to one language.
+
+        Unknown keys are returned unchanged and counted in ``missing``.
+        """
+        lang = self.resolve(lang)
+        table = self.tables.get(lang, {})
+        record_missing = self._record_missing
+
+        def t(key):
+            value = table.get(key)
+            if value is None:
+                record_missing(lang, key)
+                return key
+            return value
+
+        t.lang = lang
+        return t
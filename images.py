@@ -0,0 +1,139 @@
+"""
+Background image derivative pipeline
+
+Uploaded listing photos are served to the marketplace as resized JPEG and
+WebP derivatives instead of the original upload. Derivatives are produced in
+a small worker pool so the upload request returns immediately; until they
+exist (or when Pillow is not installed) templates fall back to the original.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it originals are served as-is
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+def make_derivatives(source, dest_dir, stem, widths, quality=80):
+    """Write resized JPEG and WebP copies of ``source`` into ``dest_dir``.
+
+    The image is rotated according to its EXIF orientation and then saved
+    without any metadata, so GPS and camera tags never reach the browser.
+    Widths larger than the original are skipped (no upscaling), except that
+    at least one derivative at the original width is always produced.
+
+    Returns ``{'jpeg': [[width, filename], ...], 'webp': [...]}`` sorted by
+    width.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        flat = Image.new('RGB', image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel('A'))
+    else:
+        flat = image
+
+    targets = sorted({min(width, image.width) for width in widths})
+    variants = {'jpeg': [], 'webp': []}
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        resized_flat = flat.resize((width, height), Image.LANCZOS) if width != image.width else flat
+
+        jpeg_name = f'{stem}_{width}.jpg'
+        resized_flat.save(os.path.join(dest_dir, jpeg_name), 'JPEG', quality=quality, optimize=True,
+                          progressive=True)
+        variants['jpeg'].append([width, jpeg_name])
+
+        webp_name = f'{stem}_{width}.webp'
+        resized.save(os.path.join(dest_dir, webp_name), 'WEBP', quality=quality, method=4)
+        variants['webp'].append([width, webp_name])
+    return variants
+
+
+def parse_variants(value):
+    """Decode a listing's ``image_variants`` column; None when absent or invalid."""
+    if not value:
+        return None
+    try:
+        variants = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(variants, dict) or not variants.get('jpeg'):
+        return None
+    return variants
+
+
+class ImagePipeline:
+    """Runs ``make_derivatives`` jobs on a bounded thread pool.
+
+    ``on_complete(job_key, variants)`` is called from the worker thread once a
+    job succeeds. Failed jobs are logged and leave the listing on its original
+    image.
+    """
+
+    def __init__(self, workers=2, on_complete=None):
+        self.workers = workers
+        self.on_complete = on_complete
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def submit(self, job_key, source, dest_dir, stem, widths, quality=80):
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='image-pipeline')
+            future = self._executor.submit(self._run, job_key, source, dest_dir, stem, widths, quality)
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _run(self, job_key, source, dest_dir, stem, widths, quality):
+        try:
+            variants = make_derivatives(source, dest_dir, stem, widths, quality)
+            if self.on_complete is not None:
+                self.on_complete(job_key, variants)
+        except Exception:
+            logger.exception('Could not create image derivatives for %s', source)
+            with self._lock:
+                self.failed += 1
+            return None
+        with self._lock:
+            self.completed += 1
+        return variants
+
+    def join(self, timeout=None):
+        """Wait for every submitted job to finish."""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.exception(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
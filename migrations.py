@@ -0,0 +1,222 @@
+"""
+Versioned schema migrations for the EcoSwap database
+
+The schema version is stored in SQLite's ``PRAGMA user_version``. Each
+migration is a version number, a description and a list of steps; a step is
+either an SQL statement or a callable taking the connection. Migrations are
+append-only: never edit one that has shipped, add a new one instead.
+
+Foreign key enforcement is switched off while migrating, as SQLite requires
+for table rebuilds; a rebuild step checks ``PRAGMA foreign_key_check``
+itself before its migration commits.
+"""
+import sqlite3
+
+from fragments import create_listing_versions
+from httpcache import create_data_versions
+from search import create_fts_tables, create_fts_triggers, fts_available
+from stats import create_stats_table, create_stats_triggers
+from storage import create_blob_tables, create_blob_triggers
+
+def add_cascading_foreign_keys(conn):
+    """Migration step: rebuild listings and requests with ON DELETE CASCADE.
+
+    SQLite cannot alter a foreign key in place, so both tables are copied
+    into new ones. Rows orphaned by earlier deletes are dropped first; the
+    indexes and triggers that went with the old tables are recreated.
+    """
+    conn.execute('DELETE FROM listings WHERE user_id NOT IN (SELECT id FROM users)')
+    conn.execute('''DELETE FROM requests WHERE listing_id NOT IN (SELECT id FROM listings)
+                    OR requester_id NOT IN (SELECT id FROM users)''')
+
+    conn.execute('''CREATE TABLE listings_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        category TEXT NOT NULL,
+        condition TEXT NOT NULL,
+        listing_type TEXT NOT NULL,
+        status TEXT DEFAULT 'Active',
+        image_path TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        image_variants TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )''')
+    conn.execute('''INSERT INTO listings_new (id, user_id, title, description, category, condition,
+                                             listing_type, status, image_path, created_at, image_variants)
+                    SELECT id, user_id, title, description, category, condition,
+                           listing_type, status, image_path, created_at, image_variants
+                    FROM listings''')
+    conn.execute('''CREATE TABLE requests_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        listing_id INTEGER NOT NULL,
+        requester_id INTEGER NOT NULL,
+        status TEXT DEFAULT 'Pending',
+        request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (listing_id) REFERENCES listings (id) ON DELETE CASCADE,
+        FOREIGN KEY (requester_id) REFERENCES users (id) ON DELETE CASCADE
+    )''')
+    conn.execute('''INSERT INTO requests_new (id, listing_id, requester_id, status, request_date)
+                    SELECT id, listing_id, requester_id, status, request_date FROM requests''')
+
+    conn.execute('DROP TABLE requests')
+    conn.execute('DROP TABLE listings')
+    conn.execute('ALTER TABLE listings_new RENAME TO listings')
+    conn.execute('ALTER TABLE requests_new RENAME TO requests')
+
+    for statement in (
+        'CREATE INDEX idx_listings_status_created ON listings (status, created_at)',
+        'CREATE INDEX idx_listings_status_category_created ON listings (status, category, created_at)',
+        'CREATE INDEX idx_listings_status_type_created ON listings (status, listing_type, created_at)',
+        'CREATE INDEX idx_listings_user_created ON listings (user_id, created_at)',
+        'CREATE INDEX idx_listings_created ON listings (created_at)',
+        'CREATE UNIQUE INDEX idx_requests_listing_requester ON requests (listing_id, requester_id)',
+        'CREATE INDEX idx_requests_requester_date ON requests (requester_id, request_date)',
+    ):
+        conn.execute(statement)
+    if fts_available(conn):
+        create_fts_triggers(conn)
+    create_blob_triggers(conn)
+    create_stats_triggers(conn)
+
+    violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f'{len(violations)} foreign key violation(s) after rebuild')
+
+
+MIGRATIONS = [
+    (1, 'Base schema', [
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            display_name TEXT NOT NULL,
+            location TEXT NOT NULL,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            condition TEXT NOT NULL,
+            listing_type TEXT NOT NULL,
+            status TEXT DEFAULT 'Active',
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            listing_id INTEGER NOT NULL,
+            requester_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'Pending',
+            request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (listing_id) REFERENCES listings (id),
+            FOREIGN KEY (requester_id) REFERENCES users (id)
+        )''',
+    ]),
+    (2, 'Secondary indexes for marketplace, my-listings, my-requests and admin pages', [
+        # marketplace: status filter, optional category/type filter, newest first
+        'CREATE INDEX IF NOT EXISTS idx_listings_status_created ON listings (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_listings_status_category_created ON listings (status, category, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_listings_status_type_created ON listings (status, listing_type, created_at)',
+        # my-listings, and the owner side of my-requests
+        'CREATE INDEX IF NOT EXISTS idx_listings_user_created ON listings (user_id, created_at)',
+        # admin listings
+        'CREATE INDEX IF NOT EXISTS idx_listings_created ON listings (created_at)',
+        # duplicate check in request-item, and joining requests to a listing
+        'CREATE INDEX IF NOT EXISTS idx_requests_listing_requester ON requests (listing_id, requester_id)',
+        # sent requests in my-requests
+        'CREATE INDEX IF NOT EXISTS idx_requests_requester_date ON requests (requester_id, request_date)',
+        # admin users and the dashboard user count
+        'CREATE INDEX IF NOT EXISTS idx_users_admin_created ON users (is_admin, created_at)',
+    ]),
+    (3, 'Full-text search over listing titles and descriptions', [
+        create_fts_tables,
+    ]),
+    (4, 'Resized image derivatives for listings', [
+        # JSON written by the image pipeline, see images.make_derivatives
+        'ALTER TABLE listings ADD COLUMN image_variants TEXT',
+    ]),
+    (5, 'Reference-counted, content-addressed upload blobs', [
+        create_blob_tables,
+    ]),
+    (6, 'Trigger-maintained admin dashboard counters', [
+        create_stats_table,
+    ]),
+    (7, 'One request per user and listing', [
+        # Drop duplicates left by the old check-then-insert, keeping an
+        # accepted request if there is one, else the earliest
+        '''DELETE FROM requests WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY listing_id, requester_id
+                    ORDER BY status = 'Accepted' DESC, id
+                ) AS position
+                FROM requests
+            ) WHERE position > 1
+        )''',
+        'DROP INDEX IF EXISTS idx_requests_listing_requester',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_listing_requester ON requests (listing_id, requester_id)',
+    ]),
+    (8, 'Cascading deletes for listings and requests', [
+        add_cascading_foreign_keys,
+    ]),
+    (9, 'Listing versions for the marketplace card cache', [
+        create_listing_versions,
+    ]),
+    (10, 'Per-table data versions for HTTP ETags', [
+        create_data_versions,
+    ]),
+]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS, target=None):
+    """Apply pending migrations up to ``target`` (default: latest).
+
+    Each migration runs in its own IMMEDIATE transaction together with the
+    version bump, so a failed migration leaves the previous version intact and
+    concurrent runners apply each migration exactly once.
+
+    Returns the list of versions applied.
+    """
+    applied = []
+    conn.commit()
+    # Cannot be changed inside a transaction, so once for the whole run
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+            if target is not None and version > target:
+                break
+            if version <= current_version(conn):
+                continue
+            conn.commit()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have migrated while we waited for the lock
+                if version <= current_version(conn):
+                    conn.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+    return applied
@@ -0,0 +1,168 @@
+"""
+Keyset (cursor) pagination
+
+Pages are fetched with a range condition on the sort key instead of OFFSET,
+so the database seeks straight to the cursor position through an index and
+page 1000 costs the same as page 1. A sort key is a primary column plus a
+unique tie-breaker (normally ``id``); cursors are opaque, URL-safe tokens
+holding the key values of the first or last row on a page.
+"""
+import base64
+import json
+import re
+
+
+class Page:
+    """One page of rows plus the cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def as_dict(self):
+        """Plain, JSON-serialisable form, e.g. for caching."""
+        return {'items': [dict(row) for row in self.items],
+                'next_cursor': self.next_cursor, 'prev_cursor': self.prev_cursor}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['items'], data['next_cursor'], data['prev_cursor'])
+
+
+class LazyPage(Page):
+    """A forward page whose rows are read from the database cursor as it is iterated.
+
+    Rows are not kept, so memory stays flat however long the page is. The
+    first row is fetched up front for truthiness and ``prev_cursor``;
+    ``next_cursor`` is only known once the rows have been iterated, which
+    suits templates that render the pager after the rows. Iterable once.
+    """
+
+    def __init__(self, cursor, page_size, key, has_prev):
+        self._cursor = cursor
+        self._page_size = page_size
+        self._key = key
+        self._first = cursor.fetchone()
+        self._empty = self._first is None
+        prev_cursor = key(self._first) if has_prev and self._first is not None else None
+        super().__init__(self, prev_cursor=prev_cursor)
+        if self._empty:
+            self.close()
+
+    def __iter__(self):
+        row, self._first = self._first, None
+        last = None
+        count = 0
+        try:
+            while row is not None and count < self._page_size:
+                yield row
+                last = row
+                count += 1
+                row = self._cursor.fetchone()
+            # The query fetches one row past the page to tell if there is more
+            if row is not None:
+                self.next_cursor = self._key(last)
+        finally:
+            self.close()
+
+    def __len__(self):
+        raise TypeError('the length of a LazyPage is unknown until it has been iterated')
+
+    def __bool__(self):
+        return not self._empty
+
+    def as_dict(self):
+        raise TypeError('a LazyPage cannot be cached; use paginate() without lazy')
+
+    def close(self):
+        """Finish the statement, e.g. when rendering stops early."""
+        self._cursor.close()
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size=2):
+    """Decode a cursor, returning None for anything malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    if not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    return values
+
+
+def _flip(direction):
+    return 'ASC' if direction == 'DESC' else 'DESC'
+
+
+def paginate(conn, query, params, order, page_size, after=None, before=None, lazy=False):
+    """Fetch one page of ``query``.
+
+    ``query`` is a SELECT without ORDER BY or LIMIT.
+    ``order`` is two ``(sql_expression, result_column, 'ASC' | 'DESC')``
+    tuples: the sort column and a unique tie-breaker. ``after`` / ``before``
+    are cursors from a previous page's ``next_cursor`` / ``prev_cursor``.
+    With ``lazy`` a forward page is returned as a ``LazyPage`` reading from
+    the open cursor; ``conn`` must stay open until it has been iterated.
+    Backward pages are reversed in memory and so are always fetched whole.
+    """
+    (key_expr, key_col, key_dir), (tie_expr, tie_col, tie_dir) = order
+    cursor = decode_cursor(before) if before else decode_cursor(after)
+    backwards = bool(before) and cursor is not None
+
+    if backwards:
+        key_dir, tie_dir = _flip(key_dir), _flip(tie_dir)
+
+    params = list(params)
+    if cursor is not None:
+        key_op = '<' if key_dir == 'DESC' else '>'
+        tie_op = '<' if tie_dir == 'DESC' else '>'
+        # The first condition is a plain range the index can seek on; the
+        # second excludes rows at the cursor position already shown.
+        query += ' AND' if re.search(r'\bWHERE\b', query, re.IGNORECASE) else ' WHERE'
+        query += (f' {key_expr} {key_op}= ? '
+                  f'AND ({key_expr} {key_op} ? OR {tie_expr} {tie_op} ?)')
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    query += f' ORDER BY {key_expr} {key_dir}, {tie_expr} {tie_dir} LIMIT ?'
+    params.append(page_size + 1)
+
+    def key(row):
+        return encode_cursor([row[key_col], row[tie_col]])
+
+    if lazy and not backwards:
+        return LazyPage(conn.execute(query, params), page_size, key, cursor is not None)
+
+    rows = conn.execute(query, params).fetchall()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return Page(rows)
+    if backwards:
+        return Page(rows,
+                    next_cursor=key(rows[-1]),
+                    prev_cursor=key(rows[0]) if has_more else None)
+    return Page(rows,
+                next_cursor=key(rows[-1]) if has_more else None,
+                prev_cursor=key(rows[0]) if cursor is not None else None)
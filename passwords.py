@@ -0,0 +1,74 @@
+"""
+Password hashing policy
+
+The hash method and its cost come from configuration as a werkzeug method
+string, e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. Every stored
+hash records the method that made it, so after a policy change a user's
+hash is re-made under the new policy the next time they log in with the
+right password: upgraded after a cost increase, downgraded after a
+decrease, with no bulk migration.
+
+Hashing is deliberately slow and CPU-bound. It runs on a small pool of
+worker threads (hashlib releases the GIL while hashing), so a burst of
+logins occupies at most ``workers`` cores, and beyond a bounded queue
+logins are turned away instead of starving every other request.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full; the caller should ask the user to retry."""
+
+
+@functools.lru_cache(maxsize=None)
+def method_prefix(method):
+    """The prefix hashes made by ``method`` start with, with werkzeug's defaults filled in.
+
+    ``'pbkdf2'`` becomes ``'pbkdf2:sha256:600000'``. Found by hashing once,
+    so it always agrees with what werkzeug writes.
+    """
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(stored_hash, method):
+    """Whether ``stored_hash`` was made under a different policy than ``method``."""
+    return stored_hash.split('$', 1)[0] != method_prefix(method)
+
+
+class PasswordHasher:
+    """Hash and verify passwords on ``workers`` threads, with at most ``max_pending`` waiting."""
+
+    def __init__(self, workers=2, max_pending=64):
+        self.workers = workers
+        self._executor = None  # started on first use, and again after shutdown()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password, method):
+        return self._run(generate_password_hash, password, method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,227 @@
+"""
+Opt-in request profiling
+
+While a ``RequestProfile`` is active, SQL statements run on a
+``ProfiledConnection`` (the pool's connection class when profiling is on)
+are counted and timed, and statements slower than the threshold are logged
+with their EXPLAIN QUERY PLAN. app.py adds template render time and
+translation lookups to the same profile and hands it to a ``Profiler``,
+which keeps per-route aggregates and renders them in the Prometheus text
+exposition format.
+
+Statement time covers ``execute()``: preparing the statement and stepping
+to the first row, which for a sorted or aggregated query is nearly all of
+the work. Rows fetched afterwards (e.g. by a streamed page) count towards
+the template time instead.
+"""
+import contextvars
+import sqlite3
+import threading
+import time
+
+# Upper bounds of the request duration histogram, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_active = contextvars.ContextVar('request_profile', default=None)
+
+
+def current_profile():
+    """The profile of the request being handled on this thread, or None."""
+    return _active.get()
+
+
+class RequestProfile:
+    """Measurements of one request."""
+
+    def __init__(self, route, slow_query_seconds, on_slow_query=None):
+        self.route = route
+        self.slow_query_seconds = slow_query_seconds
+        self.on_slow_query = on_slow_query
+        self.started = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slow_queries = 0
+        self.template_seconds = 0.0
+        self.translations = 0
+        self._template_starts = []
+
+    def start(self):
+        """Make this the active profile of the current thread."""
+        _active.set(self)
+        return self
+
+    def finish(self):
+        """Deactivate the profile; returns the request's wall time in seconds."""
+        _active.set(None)
+        return time.perf_counter() - self.started
+
+    def template_started(self):
+        self._template_starts.append(time.perf_counter())
+
+    def template_finished(self):
+        if self._template_starts:
+            self.template_seconds += time.perf_counter() - self._template_starts.pop()
+
+    def record_query(self, conn, sql, parameters, seconds):
+        self.sql_statements += 1
+        self.sql_seconds += seconds
+        if seconds < self.slow_query_seconds:
+            return
+        self.slow_queries += 1
+        if self.on_slow_query is not None:
+            self.on_slow_query(self.route, sql, seconds, explain(conn, sql, parameters))
+
+    def counting(self, t):
+        """Wrap a translator so every lookup is counted."""
+        def counted(key):
+            self.translations += 1
+            return t(key)
+        counted.lang = t.lang
+        return counted
+
+
+def explain(conn, sql, parameters=()):
+    """Return the EXPLAIN QUERY PLAN details of ``sql``, or [] if it cannot be explained."""
+    words = sql.split(None, 1)
+    if not words or words[0].upper() not in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+        return []
+    try:
+        # A plain cursor, so explaining is not itself profiled
+        return [row[-1] for row in sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameters)]
+    except sqlite3.Error:
+        return []
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        profile = _active.get()
+        if profile is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profile.record_query(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        profile = _active.get()
+        if profile is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            profile.record_query(self.connection, sql, (), time.perf_counter() - start)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose statements are timed while a profile is active."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class _RouteStats:
+    __slots__ = ('requests', 'seconds', 'buckets', 'sql_statements', 'sql_seconds', 'slow_queries',
+                 'template_seconds', 'translations')
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slow_queries = 0
+        self.template_seconds = 0.0
+        self.translations = 0
+
+
+class Profiler:
+    """Per-route aggregates of finished request profiles."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, profile, seconds):
+        with self._lock:
+            stats = self._routes.get(profile.route)
+            if stats is None:
+                stats = self._routes[profile.route] = _RouteStats()
+            stats.requests += 1
+            stats.seconds += seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+                    break
+            stats.sql_statements += profile.sql_statements
+            stats.sql_seconds += profile.sql_seconds
+            stats.slow_queries += profile.slow_queries
+            stats.template_seconds += profile.template_seconds
+            stats.translations += profile.translations
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        """Return {route: dict of aggregates}."""
+        with self._lock:
+            return {route: {name: getattr(stats, name) for name in _RouteStats.__slots__ if name != 'buckets'}
+                    for route, stats in self._routes.items()}
+
+    def render(self, prefix='ecoswap'):
+        """The aggregates in the Prometheus text exposition format."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            histogram = []
+            for route, stats in routes:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    cumulative += count
+                    histogram.append(('_bucket', {'route': route, 'le': repr(bound)}, cumulative))
+                histogram.append(('_bucket', {'route': route, 'le': '+Inf'}, stats.requests))
+                histogram.append(('_sum', {'route': route}, stats.seconds))
+                histogram.append(('_count', {'route': route}, stats.requests))
+            counters = [
+                ('sql_statements_total', 'SQL statements executed.', 'sql_statements'),
+                ('sql_seconds_total', 'Time spent executing SQL statements.', 'sql_seconds'),
+                ('slow_queries_total', 'SQL statements slower than the slow query threshold.', 'slow_queries'),
+                ('template_render_seconds_total', 'Time spent rendering templates.', 'template_seconds'),
+                ('translation_lookups_total', 'Translation lookups.', 'translations'),
+            ]
+            lines = [f'# HELP {prefix}_request_duration_seconds Request wall time, including streaming the body.',
+                     f'# TYPE {prefix}_request_duration_seconds histogram']
+            lines += [f'{prefix}_request_duration_seconds{suffix}{format_labels(labels)} {format_value(value)}'
+                      for suffix, labels, value in histogram]
+            for name, help_text, attr in counters:
+                lines += metric_lines(f'{prefix}_{name}', 'counter', help_text,
+                                      [({'route': route}, getattr(stats, attr)) for route, stats in routes])
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(int(value))
+
+
+def metric_lines(name, kind, help_text, samples):
+    """Lines for one metric; ``samples`` are ``(labels, value)`` pairs."""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    lines += [f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in samples]
+    return lines
@@ -0,0 +1,297 @@
+"""
+Query-result cache for the marketplace
+
+Results are cached for a short TTL under a key built from the query's
+parameters plus the *data versions* of the tables it reads (see
+httpcache.read_data_versions). Every write bumps those versions in the
+database itself, from a trigger, so each worker process computes new keys
+after any write, however it was made; superseded results simply expire.
+
+The storage is a pluggable backend: ``MemoryBackend`` for a single process,
+or ``SQLiteBackend`` (a file shared by every worker process on the host) as a
+stand-in for memcached/Redis. ``QueryCache.get_or_compute`` also protects
+the database from stampedes: concurrent misses on one key wait for a single
+computation, within a process by a lock and across processes by a short
+lease stored in the backend.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Interface for cache storage. Values must be JSON-serialisable."""
+
+    def get(self, key):
+        """Return the value stored under ``key``, or None if absent or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def add(self, key, value, ttl):
+        """Store ``value`` only if ``key`` is absent; True if it was stored."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Delete every expired entry; returns how many were deleted."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections or files; a backend used again after close() reopens them."""
+
+
+class MemoryBackend(CacheBackend):
+    """In-process dict with per-entry expiry, evicting the oldest beyond ``max_entries``."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return None if entry is None else entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def purge_expired(self):
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+            for key in expired:
+                del self._entries[key]
+            return len(expired)
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache table in its own SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path, busy_timeout=5000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._conns = []  # every thread's connection, for close()
+        self._conns_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute('''CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires REAL
+        ) WITHOUT ROWID''')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Used by one thread only, but close() runs on whichever thread shuts down
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            with self._conns_lock:
+                self._conns.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute('SELECT value FROM cache WHERE key = ? AND expires > ?',
+                                   (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), time.time() + ttl))
+        conn.commit()
+
+    def add(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+        stored = conn.execute('INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                              (key, json.dumps(value), now + ttl)).rowcount == 1
+        conn.commit()
+        return stored
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute('DELETE FROM cache')
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        removed = conn.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),)).rowcount
+        conn.commit()
+        return removed
+
+    def close(self):
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+
+class QueryCache:
+    """TTL cache of query results keyed by the data versions they were read at."""
+
+    def __init__(self, backend, ttl=30.0, lease_ttl=5.0, poll_interval=0.02, purge_interval=300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.lease_ttl = lease_ttl  # longest another process's computation is waited for
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval  # seconds between deletions of expired entries
+        self._next_purge = time.monotonic() + purge_interval
+        self._purge_lock = threading.Lock()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # misses served by another caller's computation
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def key(self, namespace, versions, *parts):
+        """Key for a result of ``parts`` read at ``versions``, e.g. ``read_data_versions()``."""
+        return f'{namespace}:' + json.dumps([versions, *parts], separators=(',', ':'), sort_keys=True)
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = [threading.Lock(), 0]
+            lock[1] += 1
+            return lock
+
+    def _release_lock(self, key, lock):
+        with self._locks_lock:
+            lock[1] -= 1
+            if not lock[1]:
+                del self._locks[key]
+
+    def _maybe_purge(self):
+        # Superseded results are never read again, so they have to be deleted to free the space
+        if time.monotonic() < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self.backend.purge_expired()
+            self._next_purge = time.monotonic() + self.purge_interval
+        finally:
+            self._purge_lock.release()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing it at most once across concurrent misses."""
+        self._maybe_purge()
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        lock = self._lock_for(key)
+        try:
+            with lock[0]:
+                value = self.backend.get(key)
+                if value is not None:
+                    self._count('coalesced')
+                    return value
+                lease = f'lease:{key}'
+                owns_lease = self.backend.add(lease, 1, self.lease_ttl)
+                if not owns_lease:
+                    value, owns_lease = self._wait_for(key, lease)
+                    if value is not None:
+                        self._count('coalesced')
+                        return value
+                self._count('misses')
+                try:
+                    value = compute()
+                    self.backend.set(key, value, self.ttl)
+                finally:
+                    if owns_lease:
+                        self.backend.delete(lease)
+                return value
+        finally:
+            self._release_lock(key, lock)
+
+    def _wait_for(self, key, lease):
+        """Poll while another process holds the lease.
+
+        Returns ``(value, owns_lease)``: the value once it appears, or None
+        with the lease taken over if the other process finished without
+        storing anything or let the lease expire.
+        """
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.backend.get(key)
+            if value is not None:
+                return value, False
+            if self.backend.add(lease, 1, self.lease_ttl):
+                return None, True
+        return None, False
+
+    def clear(self):
+        self.backend.clear()
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,95 @@
+"""
+Full-text search over listings
+
+Listings are indexed into one FTS5 table per UI language (see migration 3):
+English uses the porter stemmer so "chairs" finds "chair"; German folds
+diacritics so "Bucher" finds "Bücher". Queries are prefix-matched and ranked
+with bm25, title matches weighing more than description matches.
+"""
+import re
+
+# UI language -> FTS5 table. Table names are interpolated into SQL, so they
+# must only ever come from this mapping.
+FTS_TABLES = {
+    'en': 'listings_fts_en',
+    'de': 'listings_fts_de',
+}
+
+FTS_TOKENIZERS = {
+    'en': 'porter unicode61 remove_diacritics 2',
+    'de': 'unicode61 remove_diacritics 2',
+}
+
+# bm25 column weights: title, description
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_table(lang):
+    return FTS_TABLES.get(lang, FTS_TABLES['en'])
+
+
+def fts_available(conn):
+    """Whether the FTS tables exist, i.e. SQLite was built with FTS5."""
+    placeholders = ', '.join('?' for _ in FTS_TABLES)
+    row = conn.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                       list(FTS_TABLES.values())).fetchone()
+    return row[0] == len(FTS_TABLES)
+
+
+def build_match_query(search):
+    """Turn free text from the search box into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term and all terms must match, so user
+    input can never be parsed as FTS5 syntax. Returns None when the text has
+    no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(search)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def create_fts_tables(conn):
+    """Migration step: create and populate the FTS tables and their triggers.
+
+    Does nothing when FTS5 is not compiled in; search then falls back to LIKE.
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except Exception:
+        return
+
+    for lang, table in FTS_TABLES.items():
+        conn.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            title, description,
+            content='listings', content_rowid='id',
+            tokenize='{FTS_TOKENIZERS[lang]}', prefix='2 3'
+        )""")
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+    create_fts_triggers(conn)
+
+
+def create_fts_triggers(conn):
+    """(Re)create the triggers keeping the FTS tables in sync with listings."""
+    inserts = '\n'.join(
+        f"INSERT INTO {table}(rowid, title, description) VALUES (new.id, new.title, new.description);"
+        for table in FTS_TABLES.values())
+    deletes = '\n'.join(
+        f"INSERT INTO {table}({table}, rowid, title, description) "
+        f"VALUES ('delete', old.id, old.title, old.description);"
+        for table in FTS_TABLES.values())
+
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_fts_insert AFTER INSERT ON listings BEGIN
+        {inserts}
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_fts_delete AFTER DELETE ON listings BEGIN
+        {deletes}
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_fts_update AFTER UPDATE OF title, description ON listings BEGIN
+        {deletes}
+        {inserts}
+    END""")
@@ -0,0 +1,245 @@
+"""
+Server-side sessions
+
+The session cookie holds only a random session id; the session data lives
+in a pluggable store: ``MemorySessionStore`` (an LRU for a single process)
+or ``SQLiteSessionStore`` (a file shared by every worker process on the
+host). An unguessable 256-bit id needs no signature, so requests skip the
+HMAC verification a signed cookie costs, and the store is keyed by a hash
+of the id so its contents never reveal a usable cookie.
+
+Entries expire a session lifetime after they were last written; sessions
+still in use past half their lifetime are written again to extend them.
+Expired entries are swept in batches, at most one batch per request once
+every ``sweep_interval`` seconds (sooner while batches come back full), so
+no single request pays for a large backlog.
+"""
+import hashlib
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+
+_SID_RE = re.compile(r'^[A-Za-z0-9_-]{43}$')  # secrets.token_urlsafe(32)
+
+
+def _store_key(sid):
+    return hashlib.sha256(sid.encode('ascii')).hexdigest()
+
+
+class SessionStore:
+    """Interface for session storage. Data is the serialised session, a string."""
+
+    def get(self, key):
+        """Return ``(data, expires)`` for a live session, or None."""
+        raise NotImplementedError
+
+    def set(self, key, data, expires):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def sweep(self, batch_size):
+        """Remove up to ``batch_size`` expired sessions; returns how many were removed."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process sessions, evicting the least recently used beyond ``max_entries``."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (data, expires)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, data, expires):
+        with self._lock:
+            self._entries[key] = (data, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self, batch_size):
+        now = time.time()
+        with self._lock:
+            expired = []
+            for key, (_, expires) in self._entries.items():
+                if expires <= now:
+                    expired.append(key)
+                    if len(expired) == batch_size:
+                        break
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions table in its own SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path, busy_timeout=5000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+            key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID''')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        return self._conn().execute('SELECT data, expires FROM sessions WHERE key = ? AND expires > ?',
+                                    (key, time.time())).fetchone()
+
+    def set(self, key, data, expires):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO sessions (key, data, expires) VALUES (?, ?, ?)', (key, data, expires))
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute('DELETE FROM sessions WHERE key = ?', (key,))
+        conn.commit()
+
+    def sweep(self, batch_size):
+        conn = self._conn()
+        removed = conn.execute('''DELETE FROM sessions WHERE key IN (
+                                      SELECT key FROM sessions WHERE expires <= ? LIMIT ?)''',
+                               (time.time(), batch_size)).rowcount
+        conn.commit()
+        return removed
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict with the id and expiry of its stored copy."""
+
+    def __init__(self, initial=None, sid=None, expires=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires = expires
+        self.rotate = False
+
+    def regenerate(self):
+        """Move the session to a fresh id when saved, e.g. on login against session fixation."""
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing session data in the store returned by ``get_store()``."""
+
+    serializer = session_json_serializer
+
+    def __init__(self, get_store, sweep_interval=60.0, sweep_batch=500):
+        self.get_store = get_store
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        store = self.get_store()
+        self._maybe_sweep(store)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            entry = store.get(_store_key(sid))
+            if entry is not None:
+                data, expires = entry
+                try:
+                    return ServerSession(self.serializer.loads(data), sid=sid, expires=expires)
+                except ValueError:
+                    pass
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        store = self.get_store()
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid is not None and session.modified:
+                store.delete(_store_key(session.sid))
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        extend = session.expires is not None and session.expires - now < lifetime / 2
+        if not (session.modified or extend):
+            return
+
+        new_sid = session.sid is None or session.rotate
+        if new_sid:
+            if session.sid is not None:
+                store.delete(_store_key(session.sid))
+            session.sid = secrets.token_urlsafe(32)
+            session.rotate = False
+        session.expires = now + lifetime
+        store.set(_store_key(session.sid), self.serializer.dumps(dict(session)), session.expires)
+
+        if new_sid or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+    def _maybe_sweep(self, store):
+        if time.monotonic() < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            removed = store.sweep(self.sweep_batch)
+            # A full batch means more are waiting: take the next one on the next request
+            self._next_sweep = time.monotonic() + (0 if removed == self.sweep_batch else self.sweep_interval)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep_all(self, store):
+        """Remove every expired session, one batch at a time."""
+        total = 0
+        while True:
+            removed = store.sweep(self.sweep_batch)
+            total += removed
+            if removed < self.sweep_batch:
+                return total
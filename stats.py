@@ -0,0 +1,112 @@
+"""
+Admin dashboard counters
+
+The dashboard figures live in a one-row-per-counter ``stats`` table that
+triggers keep current in the same transaction as the write that changes them
+(see migration 6), so reading them never scans users, listings or requests.
+A short TTL cache in front spares even that lookup, and ``reconcile``
+recomputes the counters from scratch to detect and repair drift.
+"""
+import threading
+import time
+
+# counter name -> query computing its true value
+COUNTERS = {
+    'total_users': "SELECT COUNT(*) FROM users WHERE is_admin = 0",
+    'active_listings': "SELECT COUNT(*) FROM listings WHERE status = 'Active'",
+    'total_requests': "SELECT COUNT(*) FROM requests",
+}
+
+
+def create_stats_table(conn):
+    """Migration step: create ``stats``, seed it from the data, add triggers."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    for name, query in COUNTERS.items():
+        conn.execute(f"INSERT OR REPLACE INTO stats (name, value) VALUES (?, ({query}))", (name,))
+    create_stats_triggers(conn)
+
+
+def _bump(name, delta):
+    return f"UPDATE stats SET value = value + ({delta}) WHERE name = '{name}';"
+
+
+def create_stats_triggers(conn):
+    """(Re)create the triggers that keep ``stats`` in step with the tables."""
+    is_user = "IFNULL({row}.is_admin = 0, 0)"
+    is_active = "IFNULL({row}.status = 'Active', 0)"
+    triggers = {
+        'stats_users_insert': ('AFTER INSERT ON users', 'new.is_admin = 0',
+                               _bump('total_users', 1)),
+        'stats_users_delete': ('AFTER DELETE ON users', 'old.is_admin = 0',
+                               _bump('total_users', -1)),
+        'stats_users_update': ('AFTER UPDATE OF is_admin ON users',
+                               f"{is_user.format(row='new')} != {is_user.format(row='old')}",
+                               _bump('total_users', f"{is_user.format(row='new')} - {is_user.format(row='old')}")),
+        'stats_listings_insert': ('AFTER INSERT ON listings', "new.status = 'Active'",
+                                  _bump('active_listings', 1)),
+        'stats_listings_delete': ('AFTER DELETE ON listings', "old.status = 'Active'",
+                                  _bump('active_listings', -1)),
+        'stats_listings_update': ('AFTER UPDATE OF status ON listings',
+                                  f"{is_active.format(row='new')} != {is_active.format(row='old')}",
+                                  _bump('active_listings',
+                                        f"{is_active.format(row='new')} - {is_active.format(row='old')}")),
+        'stats_requests_insert': ('AFTER INSERT ON requests', '1', _bump('total_requests', 1)),
+        'stats_requests_delete': ('AFTER DELETE ON requests', '1', _bump('total_requests', -1)),
+    }
+    for name, (event, condition, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} WHEN {condition} BEGIN {body} END")
+
+
+def read_stats(conn):
+    return {row[0]: row[1] for row in conn.execute("SELECT name, value FROM stats")}
+
+
+def reconcile(conn, repair=True):
+    """Compare every counter with a full recount.
+
+    Returns ``{name: (stored, actual)}`` for counters that had drifted; with
+    ``repair`` they are corrected in the same transaction.
+    """
+    conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        stored = read_stats(conn)
+        drift = {}
+        for name, query in COUNTERS.items():
+            actual = conn.execute(query).fetchone()[0]
+            if stored.get(name) != actual:
+                drift[name] = (stored.get(name), actual)
+                if repair:
+                    conn.execute("INSERT OR REPLACE INTO stats (name, value) VALUES (?, ?)", (name, actual))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return drift
+
+
+class TTLCache:
+    """Tiny thread-safe cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
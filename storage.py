@@ -0,0 +1,245 @@
+"""
+Content-addressed storage for uploaded listing images
+
+Uploads are streamed to disk in chunks while being hashed and stored under
+their SHA-256 digest (``ab/abcdef....jpg``), so the same photo uploaded twice
+is stored once and two uploads can never overwrite each other. The ``blobs``
+table counts how many listings reference each file; triggers on ``listings``
+keep the counts current (see migration 5) and ``collect_garbage`` removes
+files nobody references any more.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+CHUNK_SIZE = 64 * 1024
+
+# Image derivatives are named <stem>_<width>.<ext>, see images.make_derivatives
+# and derivative_stem
+_DERIVATIVE_RE = re.compile(r'^(?P<stem>.+)_\d+\.(?:jpg|webp)$')
+
+
+def derivative_stem(path):
+    """Stem of a blob's image derivatives: its path with the extension kept (``ab/abc...-jpg``).
+
+    The same bytes stored as ``.jpg`` and ``.jpeg`` are two blobs with their
+    own reference counts, so they must not share derivatives either.
+    """
+    root, ext = os.path.splitext(path)
+    return root + ext.replace('.', '-')
+
+
+class StoredBlob:
+    def __init__(self, path, sha256, size, created):
+        self.path = path  # relative to the store root
+        self.sha256 = sha256
+        self.size = size
+        self.created = created  # False when the content was already stored
+
+
+class BlobStore:
+    """Files addressed by content hash below ``root``."""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def path_for(self, digest, ext):
+        return f'{digest[:2]}/{digest}{ext}'
+
+    def save(self, stream, ext=''):
+        """Stream ``stream`` into the store and return a ``StoredBlob``."""
+        ext = ext.lower()
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            rel_path = self.path_for(sha.hexdigest(), ext)
+            full_path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.exists(full_path):
+                # Already stored; refresh the mtime so garbage collection
+                # treats the blob as recently used
+                os.utime(full_path)
+                os.unlink(tmp_path)
+                created = False
+            else:
+                os.replace(tmp_path, full_path)
+                created = True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return StoredBlob(rel_path, sha.hexdigest(), size, created)
+
+    def delete(self, rel_path):
+        """Delete a blob and its image derivatives; returns the files removed."""
+        full_path = os.path.join(self.root, rel_path)
+        directory = os.path.dirname(full_path)
+        name = os.path.basename(full_path)
+        digest = os.path.splitext(name)[0]
+        stems = {derivative_stem(name)}
+        removed = []
+        candidates = [full_path]
+        if os.path.isdir(directory):
+            names = os.listdir(directory)
+            # Derivatives made before derivative_stem() are named after the digest
+            # alone; they may only go with the last blob holding that content
+            if not any(other != name and os.path.splitext(other)[0] == digest for other in names):
+                stems.add(digest)
+            for other in names:
+                match = _DERIVATIVE_RE.match(other)
+                if match and match.group('stem') in stems:
+                    candidates.append(os.path.join(directory, other))
+        for path in candidates:
+            try:
+                os.unlink(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def walk(self):
+        """Yield (relative path, mtime) for every file in the store."""
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                full_path = os.path.join(directory, name)
+                yield os.path.relpath(full_path, self.root).replace(os.sep, '/'), os.path.getmtime(full_path)
+
+
+def create_blob_tables(conn):
+    """Migration step: create ``blobs``, count existing references, add triggers."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS blobs (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT,
+        size INTEGER,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.execute("""INSERT OR IGNORE INTO blobs (path, ref_count)
+                    SELECT image_path, COUNT(*) FROM listings
+                    WHERE image_path IS NOT NULL GROUP BY image_path""")
+    create_blob_triggers(conn)
+
+
+def create_blob_triggers(conn):
+    """(Re)create the triggers keeping ``blobs.ref_count`` in sync with listings."""
+    add_ref = """INSERT INTO blobs (path, ref_count) VALUES (new.image_path, 1)
+                 ON CONFLICT(path) DO UPDATE SET ref_count = ref_count + 1;"""
+    drop_ref = "UPDATE blobs SET ref_count = ref_count - 1 WHERE path = old.image_path;"
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_blob_insert AFTER INSERT ON listings
+        WHEN new.image_path IS NOT NULL BEGIN
+        {add_ref}
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_blob_delete AFTER DELETE ON listings
+        WHEN old.image_path IS NOT NULL BEGIN
+        {drop_ref}
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_blob_unref AFTER UPDATE OF image_path ON listings
+        WHEN old.image_path IS NOT new.image_path AND old.image_path IS NOT NULL BEGIN
+        {drop_ref}
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS listings_blob_ref AFTER UPDATE OF image_path ON listings
+        WHEN old.image_path IS NOT new.image_path AND new.image_path IS NOT NULL BEGIN
+        {add_ref}
+    END""")
+
+
+def register_blob(conn, path, blob):
+    """Record a stored blob before a listing starts referencing it."""
+    conn.execute("""INSERT INTO blobs (path, sha256, size, ref_count) VALUES (?, ?, ?, 0)
+                    ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size""",
+                 (path, blob.sha256, blob.size))
+
+
+def _older_than(store, rel_path, cutoff):
+    try:
+        return os.path.getmtime(os.path.join(store.root, rel_path)) < cutoff
+    except FileNotFoundError:
+        return True
+
+
+def release_blobs(conn, store, prefix, paths, grace_seconds=0):
+    """Delete the given blobs (database paths) if no listing references them.
+
+    Used right after listings are deleted, so their images do not have to
+    wait for the next ``collect_garbage`` run. Blobs touched within
+    ``grace_seconds`` are left to that run instead. Returns the relative
+    paths removed.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = []
+    for path in paths:
+        rel_path = path[len(prefix):] if path.startswith(prefix) else path
+        if not _older_than(store, rel_path, cutoff):
+            continue
+        # Check under the write lock: a listing may have picked the blob up
+        # again since it was released
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if _older_than(store, rel_path, cutoff) and conn.execute(
+                    "DELETE FROM blobs WHERE path = ? AND ref_count <= 0", (path,)).rowcount:
+                store.delete(rel_path)
+                removed.append(rel_path)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return removed
+
+
+def collect_garbage(conn, store, prefix, grace_seconds=3600, dry_run=False):
+    """Delete unreferenced blobs and stray files older than ``grace_seconds``.
+
+    ``prefix`` is how blob paths are stored in the database relative to the
+    store root (``'uploads/'``). The grace period protects uploads that are
+    on disk but whose listing has not been committed yet.
+
+    Returns the list of relative paths removed (or that would be removed).
+    """
+    cutoff = time.time() - grace_seconds
+    removed = []
+
+    def unprefixed(path):
+        return path[len(prefix):] if path.startswith(prefix) else path
+
+    # Blobs whose last listing is gone
+    paths = [row[0] for row in conn.execute("SELECT path FROM blobs WHERE ref_count <= 0").fetchall()]
+    if dry_run:
+        removed.extend(unprefixed(path) for path in paths
+                       if _older_than(store, unprefixed(path), cutoff))
+    else:
+        removed.extend(release_blobs(conn, store, prefix, paths, grace_seconds))
+
+    # Files on disk the database does not know about at all
+    known_stems = set()
+    for row in conn.execute("SELECT path FROM blobs").fetchall():
+        known_stems.add(os.path.splitext(unprefixed(row[0]))[0])
+        known_stems.add(derivative_stem(unprefixed(row[0])))
+    for rel_path, mtime in list(store.walk()):
+        if mtime >= cutoff:
+            continue
+        stem = os.path.splitext(rel_path)[0]
+        match = _DERIVATIVE_RE.match(rel_path)
+        if stem in known_stems or (match and match.group('stem') in known_stems):
+            continue
+        removed.append(rel_path)
+        if not dry_run:
+            try:
+                os.unlink(os.path.join(store.root, rel_path))
+            except FileNotFoundError:
+                pass
+    return removed
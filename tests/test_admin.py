@@ -143,3 +143,94 @@ class TestAdminListings:
         response = logged_in_user.get(f'/admin/delete-listing/{listing_id}', follow_redirects=False)
         assert response.status_code == 302
         assert '/login' in response.location
+
+
+class TestCascadingDeletes:
+    """Test that deletes take dependent rows with them."""
+
+    @pytest.fixture
+    def other_users(self, test_listing):
+        """Two users, each with a listing and a request on test_listing."""
+        from app import get_db
+
+        conn = get_db()
+        c = conn.cursor()
+        user_ids = []
+        for n in range(2):
+            c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, 'x', ?, 'City')",
+                      (f'member{n}@example.com', f'Member {n}'))
+            user_ids.append(c.lastrowid)
+            c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                         VALUES (?, ?, 'Description', 'Books', 'Good', 'Exchange')""", (c.lastrowid, f'Item {n}'))
+            c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)", (test_listing['id'], user_ids[-1]))
+        conn.commit()
+        conn.close()
+        return user_ids
+
+    def counts(self):
+        from app import get_db
+
+        conn = get_db()
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('users', 'listings', 'requests')}
+        conn.close()
+        return counts
+
+    def test_bulk_delete_users_cascades(self, logged_in_admin, test_user, other_users, monkeypatch):
+        """Test that deleting users removes their listings and requests, in batches."""
+        from app import app, get_db, reconcile
+        monkeypatch.setitem(app.config, 'DELETE_BATCH_SIZE', 1)
+
+        response = logged_in_admin.post('/admin/delete-users', data={'user_ids': [str(i) for i in other_users]},
+                                        follow_redirects=True)
+        assert b'2 user(s) deleted successfully!' in response.data
+        # test_user and the admin remain, with test_user's listing
+        assert self.counts() == {'users': 2, 'listings': 1, 'requests': 0}
+
+        conn = get_db()
+        assert reconcile(conn, repair=False) == {}
+        conn.close()
+
+    def test_deleted_user_session_logged_out(self, logged_in_user, test_user, other_users):
+        """Test that a deleted user's session is sent to login instead of failing the foreign key."""
+        from app import delete_users, get_db
+
+        conn = get_db()
+        delete_users(conn, [test_user['id']])
+        listing_id = conn.execute('SELECT id FROM listings WHERE user_id = ?', (other_users[0],)).fetchone()[0]
+        conn.close()
+
+        response = logged_in_user.post('/create-listing', data={
+            'title': 'Ghost', 'description': 'd', 'category': 'Books', 'condition': 'Good',
+            'listing_type': 'Donate'})
+        assert '/login' in response.location
+        response = logged_in_user.get(f'/request-item/{listing_id}')
+        assert '/login' in response.location
+
+    def test_bulk_delete_skips_admins(self, logged_in_admin, test_admin, other_users):
+        """Test that admins cannot be deleted in bulk."""
+        logged_in_admin.post('/admin/delete-users', data={'user_ids': [str(test_admin['id'])]})
+        assert self.counts()['users'] == 4
+
+    def test_delete_listing_removes_requests(self, logged_in_admin, test_listing, other_users):
+        """Test that deleting a listing removes the requests on it."""
+        logged_in_admin.get(f'/admin/delete-listing/{test_listing["id"]}')
+        assert self.counts() == {'users': 4, 'listings': 2, 'requests': 0}
+
+    def test_bulk_delete_listings(self, logged_in_admin, test_listing, other_users):
+        """Test deleting several listings at once."""
+        from app import get_db
+
+        conn = get_db()
+        ids = [row[0] for row in conn.execute('SELECT id FROM listings')]
+        conn.close()
+        response = logged_in_admin.post('/admin/delete-listings', data={'listing_ids': [str(i) for i in ids]},
+                                        follow_redirects=True)
+        assert b'3 listing(s) deleted successfully!' in response.data
+        assert self.counts() == {'users': 4, 'listings': 0, 'requests': 0}
+
+    def test_bulk_delete_requires_admin(self, logged_in_user, other_users):
+        """Test that bulk deletes require admin access."""
+        response = logged_in_user.post('/admin/delete-users', data={'user_ids': [str(i) for i in other_users]})
+        assert '/login' in response.location
+        assert self.counts()['users'] == 3
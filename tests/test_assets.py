@@ -0,0 +1,110 @@
+"""
+Tests for the static asset pipeline
+"""
+import gzip
+import os
+import subprocess
+import sys
+import pytest
+from assets import brotli, build_assets, load_manifest, minify_css
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestMinify:
+    """Test CSS minification."""
+
+    def test_strips_comments_and_whitespace(self):
+        css = '/* header */\n.a ,\n.b {\n    color : red;\n    margin: 0 auto;\n}\n'
+        assert minify_css(css) == '.a,.b{color :red;margin:0 auto}'
+
+    def test_keeps_significant_spaces(self):
+        css = 'nav :hover { width: calc(100% - 2px); }\n@media (max-width: 768px) { .x { top: 0 } }'
+        assert minify_css(css) == 'nav :hover{width:calc(100% - 2px)}@media (max-width:768px){.x{top:0}}'
+
+
+class TestBuild:
+    """Test building fingerprinted, precompressed assets."""
+
+    @pytest.fixture
+    def static_dir(self, tmp_path):
+        os.makedirs(tmp_path / 'css')
+        (tmp_path / 'css' / 'style.css').write_text('body {\n    color: green;\n}\n')
+        return str(tmp_path)
+
+    def test_writes_hashed_and_compressed_files(self, static_dir):
+        manifest = build_assets(static_dir)
+        built = manifest['css/style.css']
+        assert built.startswith('dist/css/style.') and built.endswith('.css')
+        path = os.path.join(static_dir, built)
+        with open(path, 'rb') as f:
+            assert f.read() == b'body{color:green}'
+        with gzip.open(path + '.gz') as f:
+            assert f.read() == b'body{color:green}'
+        if brotli is not None:
+            with open(path + '.br', 'rb') as f:
+                assert brotli.decompress(f.read()) == b'body{color:green}'
+        assert load_manifest(static_dir) == manifest
+
+    def test_rebuild_replaces_old_output(self, static_dir):
+        old = build_assets(static_dir)['css/style.css']
+        with open(os.path.join(static_dir, 'css', 'style.css'), 'a') as f:
+            f.write('a { color: blue; }\n')
+        new = build_assets(static_dir)['css/style.css']
+        assert new != old
+        assert not os.path.exists(os.path.join(static_dir, old))
+        assert not os.path.exists(os.path.join(static_dir, old + '.gz'))
+
+    def test_rebuild_keeps_other_builds_temporary_files(self, static_dir):
+        """Test that a build never deletes a file another process is still writing."""
+        build_assets(static_dir)
+        in_progress = os.path.join(static_dir, 'dist', 'css', '.style.abc123.css.tmp')
+        with open(in_progress, 'w') as f:
+            f.write('partial')
+        build_assets(static_dir)
+        assert os.path.exists(in_progress)
+
+    def test_import_does_not_build(self):
+        """Test that importing the app, as every worker does, only reads the manifest."""
+        code = ('import assets\n'
+                'def fail(*args, **kwargs):\n'
+                '    raise AssertionError("assets built on import")\n'
+                'assets.build_assets = fail\n'
+                'import app\n')
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+class TestServing:
+    """Test serving built assets."""
+
+    def stylesheet_url(self):
+        from flask import url_for
+        from app import app
+        with app.test_request_context():
+            return url_for('static', filename='css/style.css')
+
+    def test_pages_link_built_stylesheet(self, client):
+        url = self.stylesheet_url()
+        assert url.startswith('/static/dist/css/style.')
+        assert url.encode() in client.get('/login').data
+
+    @pytest.mark.parametrize('accept, encoding', [
+        ('gzip', 'gzip'),
+        ('gzip, br', 'br' if brotli is not None else 'gzip'),
+        ('identity', None),
+    ])
+    def test_precompressed_copy_by_accept_encoding(self, client, accept, encoding):
+        from app import app
+        response = client.get(self.stylesheet_url(), headers={'Accept-Encoding': accept})
+        assert response.status_code == 200
+        assert response.content_encoding == encoding
+        assert response.mimetype == 'text/css'
+        assert 'Accept-Encoding' in response.vary
+        assert response.cache_control.max_age == app.config['STATIC_MAX_AGE']
+        body = response.get_data()
+        response.close()
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'br':
+            body = brotli.decompress(body)
+        assert body.startswith(b'*{margin:0')
@@ -0,0 +1,245 @@
+"""
+Tests for bulk listing import and export: parsing, validation, batched
+inserts, streamed exports, the admin routes and the CLI commands
+"""
+import io
+import json
+
+import pytest
+
+CSV_HEADER = 'title,description,category,condition,listing_type\n'
+
+
+def count_listings():
+    from app import get_db
+
+    conn = get_db()
+    count = conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+    conn.close()
+    return count
+
+
+class TestParseAndClean:
+    """Test reading rows and validating them."""
+
+    def test_csv_rows_with_line_numbers(self):
+        from bulk import parse_rows
+
+        rows = list(parse_rows(io.StringIO(CSV_HEADER + 'Chair,Oak,Furniture,Good,Donate\n'
+                                           'Lamp,Brass,Furniture,Fair,Exchange\n'), 'csv'))
+        assert [line for line, _ in rows] == [2, 3]
+        assert rows[0][1]['title'] == 'Chair'
+
+    def test_jsonl_reports_bad_lines_and_continues(self):
+        from bulk import parse_rows
+
+        rows = list(parse_rows(io.StringIO('{"title": "A"}\n\nnot json\n[1]\n{"title": "B"}\n'), 'jsonl'))
+        assert [line for line, _ in rows] == [1, 3, 4, 5]
+        assert isinstance(rows[1][1], ValueError)
+        assert isinstance(rows[2][1], ValueError)
+        assert rows[3][1] == {'title': 'B'}
+
+    def test_vocabularies_matched_case_insensitively(self):
+        from bulk import clean_row
+
+        values = clean_row({'title': ' Desk ', 'description': 'Pine', 'category': 'home & garden',
+                            'condition': 'like new', 'listing_type': 'DONATE'})
+        assert values == {'title': 'Desk', 'description': 'Pine', 'category': 'Home & Garden',
+                          'condition': 'Like New', 'listing_type': 'Donate', 'status': 'Active'}
+
+    @pytest.mark.parametrize('change, message', [
+        ({'category': 'Toys'}, 'unknown category'),
+        ({'condition': 'Broken'}, 'unknown condition'),
+        ({'listing_type': 'Sell'}, 'unknown listing_type'),
+        ({'status': 'Sold'}, 'unknown status'),
+        ({'title': '  '}, 'missing title'),
+        ({'description': None}, 'missing description'),
+        ({'title': 42}, 'title must be text'),
+    ])
+    def test_invalid_rows_rejected(self, change, message):
+        from bulk import clean_row
+
+        row = {'title': 'Desk', 'description': 'Pine', 'category': 'Furniture', 'condition': 'Good',
+               'listing_type': 'Exchange', **change}
+        with pytest.raises(ValueError, match=message):
+            clean_row(row)
+
+
+class TestImportListings:
+    """Test batched imports into the database."""
+
+    def test_imports_in_batches_and_reports_errors(self, test_user):
+        from app import get_db
+        from bulk import import_listings
+
+        lines = [CSV_HEADER] + [f'Item {i},Donated,Books,Good,Donate\n' for i in range(7)]
+        lines.insert(3, 'Bad,Row,Toys,Good,Donate\n')
+        conn = get_db()
+        result = import_listings(conn, io.StringIO(''.join(lines)), 'csv', test_user['id'], batch_size=3)
+        titles = [row[0] for row in conn.execute('SELECT title FROM listings ORDER BY id')]
+        conn.close()
+
+        assert result.imported == 7
+        assert result.rejected == 1
+        assert result.errors[0][0] == 4
+        assert 'unknown category' in result.errors[0][1]
+        assert titles == [f'Item {i}' for i in range(7)]
+
+    def test_owner_email_column(self, test_user, test_admin):
+        from app import get_db
+        from bulk import import_listings
+
+        data = (json.dumps({'title': 'Mine', 'description': 'd', 'category': 'Books', 'condition': 'Good',
+                            'listing_type': 'Donate', 'owner_email': 'testuser@example.com'}) + '\n' +
+                json.dumps({'title': 'Nobody', 'description': 'd', 'category': 'Books', 'condition': 'Good',
+                            'listing_type': 'Donate', 'owner_email': 'nobody@example.com'}) + '\n')
+        conn = get_db()
+        result = import_listings(conn, io.StringIO(data), 'jsonl', test_admin['id'])
+        owner = conn.execute("SELECT user_id FROM listings WHERE title = 'Mine'").fetchone()[0]
+        conn.close()
+
+        assert owner == test_user['id']
+        assert result.imported == 1
+        assert result.errors == [(2, "no user with email 'nobody@example.com'")]
+
+    def test_errors_capped(self, test_user):
+        from app import get_db
+        from bulk import import_listings
+
+        data = CSV_HEADER + 'x,y,Toys,Good,Donate\n' * 5
+        conn = get_db()
+        result = import_listings(conn, io.StringIO(data), 'csv', test_user['id'], max_errors=2)
+        conn.close()
+        assert result.rejected == 5
+        assert len(result.errors) == 2
+
+    def test_imported_listings_counted(self, test_user):
+        from app import get_db, get_dashboard_stats, stats_cache
+        from bulk import import_listings
+
+        conn = get_db()
+        import_listings(conn, io.StringIO(CSV_HEADER + 'Vintage gramophone,Works,Other,Good,Donate\n'), 'csv',
+                        test_user['id'])
+        conn.close()
+        stats_cache.clear()
+        assert get_dashboard_stats()['active_listings'] == 1
+
+
+class TestExportListings:
+    """Test streamed exports."""
+
+    def test_export_round_trips_through_import(self, test_user, test_listing):
+        from app import get_db
+        from bulk import export_listings, import_listings
+
+        columns = 'user_id, title, description, category, condition, listing_type, status'
+        conn = get_db()
+        for fmt in ('csv', 'jsonl'):
+            dump = ''.join(export_listings(conn, fmt))
+            before = conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+            result = import_listings(conn, io.StringIO(dump), fmt, owner_id=None)
+            assert (result.imported, result.rejected) == (before, 0)
+        rows = {tuple(row) for row in conn.execute(f'SELECT {columns} FROM listings')}
+        conn.close()
+        assert len(rows) == 1
+
+    def test_one_chunk_per_batch(self, test_user):
+        from app import get_db
+        from bulk import export_listings
+
+        conn = get_db()
+        conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                            VALUES (?, ?, 'd', 'Books', 'Good', 'Donate')""",
+                         [(test_user['id'], f'Item {i}') for i in range(5)])
+        conn.commit()
+        chunks = list(export_listings(conn, 'jsonl', batch_size=2))
+        conn.close()
+        assert len(chunks) == 3
+        assert [json.loads(line)['title'] for chunk in chunks for line in chunk.splitlines()] == \
+            [f'Item {i}' for i in range(5)]
+
+
+class TestBulkRoutes:
+    """Test the admin import and export endpoints."""
+
+    def test_import_requires_admin(self, logged_in_user):
+        response = logged_in_user.post('/admin/import-listings', data={
+            'file': (io.BytesIO(CSV_HEADER.encode()), 'items.csv')})
+        assert '/login' in response.location
+        assert count_listings() == 0
+
+    def test_import_upload(self, logged_in_admin, test_admin):
+        data = (CSV_HEADER + 'Sofa,Blue,Furniture,Good,Donate\nBad,Row,Furniture,Mint,Donate\n').encode('utf-8-sig')
+        response = logged_in_admin.post('/admin/import-listings', data={'file': (io.BytesIO(data), 'items.csv')},
+                                        follow_redirects=True)
+        assert response.status_code == 200
+        assert b'1 listing(s) imported, 1 row(s) rejected.' in response.data
+        assert b'Line 3: unknown condition' in response.data
+        assert count_listings() == 1
+
+    def test_import_for_another_owner(self, logged_in_admin, test_user):
+        from app import get_db
+
+        logged_in_admin.post('/admin/import-listings', data={
+            'file': (io.BytesIO((CSV_HEADER + 'Sofa,Blue,Furniture,Good,Donate\n').encode()), 'items.csv'),
+            'owner_email': 'testuser@example.com'})
+        conn = get_db()
+        owner = conn.execute('SELECT user_id FROM listings').fetchone()[0]
+        conn.close()
+        assert owner == test_user['id']
+
+    def test_import_rejects_unknown_file_type(self, logged_in_admin):
+        response = logged_in_admin.post('/admin/import-listings', data={
+            'file': (io.BytesIO(b'x'), 'items.xlsx')}, follow_redirects=True)
+        assert b'Choose a .csv or .jsonl file' in response.data
+
+    def test_import_refreshes_marketplace(self, logged_in_admin):
+        logged_in_admin.get('/marketplace')
+        logged_in_admin.post('/admin/import-listings', data={
+            'file': (io.BytesIO((CSV_HEADER + 'Rocking horse,Wood,Other,Good,Donate\n').encode()), 'items.csv')})
+        assert b'Rocking horse' in logged_in_admin.get('/marketplace').data
+
+    def test_export_streams_csv(self, logged_in_admin, test_listing):
+        from app import get_pool
+
+        response = logged_in_admin.get('/admin/export-listings?format=csv', buffered=False)
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+        body = b''.join(response.response)
+        response.close()
+        assert body.startswith(b'id,owner_email,title')
+        assert test_listing['title'].encode() in body
+        assert get_pool().stats()['in_use'] == 0
+
+    def test_export_requires_admin(self, logged_in_user):
+        response = logged_in_user.get('/admin/export-listings')
+        assert '/login' in response.location
+
+
+class TestBulkCommands:
+    """Test the import-listings and export-listings CLI commands."""
+
+    def test_import_and_export(self, test_admin, tmp_path):
+        from app import app
+
+        source = tmp_path / 'items.jsonl'
+        source.write_text(json.dumps({'title': 'Kayak', 'description': 'Red', 'category': 'Sports',
+                                      'condition': 'Fair', 'listing_type': 'Exchange'}) + '\n{broken\n')
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['import-listings', str(source), '--owner', 'admin@test.com'])
+        assert 'Imported 1 listing(s), rejected 1 row(s)' in result.output
+        assert 'line 2: invalid JSON' in result.output
+
+        target = tmp_path / 'dump.csv'
+        result = runner.invoke(args=['export-listings', str(target)])
+        assert result.exit_code == 0
+        assert 'Kayak' in target.read_text()
+
+    def test_import_unknown_owner(self, tmp_path):
+        from app import app
+
+        source = tmp_path / 'items.csv'
+        source.write_text(CSV_HEADER)
+        result = app.test_cli_runner().invoke(args=['import-listings', str(source), '--owner', 'nobody@x.org'])
+        assert result.exit_code != 0
+        assert 'No user with email' in result.output
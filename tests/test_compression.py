@@ -0,0 +1,111 @@
+"""
+Tests for the response compression middleware
+"""
+import gzip
+import zlib
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from compression import CompressionMiddleware, brotli
+
+BIG = b'<p>' + b'Sustainable swapping. ' * 100 + b'</p>'
+
+
+def make_client(body=BIG, content_type='text/html; charset=utf-8', stream=False, **headers):
+    def app(environ, start_response):
+        if stream:
+            response = Response((chunk for chunk in body), content_type=content_type)
+        else:
+            response = Response(body, content_type=content_type)
+        for name, value in headers.items():
+            response.headers[name.replace('_', '-')] = value
+        return response(environ, start_response)
+    return Client(CompressionMiddleware(app, min_size=500))
+
+
+class TestMiddleware:
+    """Test the middleware against plain WSGI apps."""
+
+    def test_gzip_buffered(self):
+        response = make_client().get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert int(response.headers['Content-Length']) == len(response.data) < len(BIG)
+        assert gzip.decompress(response.data) == BIG
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+    @pytest.mark.skipif(brotli is None, reason='Brotli not installed')
+    def test_brotli_preferred(self):
+        response = make_client().get('/', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == BIG
+
+    @pytest.mark.parametrize('accept', ['', 'identity', 'gzip;q=0'])
+    def test_not_accepted(self, accept):
+        response = make_client().get('/', headers={'Accept-Encoding': accept})
+        assert 'Content-Encoding' not in response.headers
+        assert response.data == BIG
+
+    def test_small_body_skipped(self):
+        response = make_client(body=b'<p>tiny</p>').get('/', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_binary_and_encoded_bodies_skipped(self):
+        image = make_client(content_type='image/png').get('/', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in image.headers
+        encoded = make_client(Content_Encoding='br').get('/', headers={'Accept-Encoding': 'gzip'})
+        assert encoded.headers['Content-Encoding'] == 'br'
+        assert encoded.data == BIG
+
+    def test_streamed_body_flushed_per_chunk(self):
+        """Test that each streamed chunk can be decoded as soon as it arrives."""
+        chunks = [b'<header>' + b'x' * 600 + b'</header>', b'<main>second part</main>', b'<footer/>']
+        response = make_client(body=chunks, stream=True).get(
+            '/', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        decoder = zlib.decompressobj(31)
+        received = [decoder.decompress(part) for part in response.response]
+        response.close()
+        assert received[0] == chunks[0]
+        assert received[1] == chunks[1]
+        assert b''.join(received) == b''.join(chunks)
+
+    def test_small_stream_sent_plain(self):
+        response = make_client(body=[b'<p>a</p>', b'<p>b</p>'], stream=True).get(
+            '/', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.data == b'<p>a</p><p>b</p>'
+
+    def test_etag_suffixed(self):
+        response = make_client(ETag='"abc"').get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['ETag'] == '"abc-gzip"'
+
+
+class TestAppCompression:
+    """Test compression of the application's pages."""
+
+    def test_marketplace_compressed(self, logged_in_user, test_listing):
+        plain = logged_in_user.get('/marketplace')
+        compressed = logged_in_user.get('/marketplace', headers={'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(compressed.data) == plain.data
+        assert len(compressed.data) < len(plain.data) / 2
+
+    def test_conditional_request_with_compressed_etag(self, logged_in_user, test_listing):
+        """Test that the suffixed ETag still revalidates to 304."""
+        first = logged_in_user.get('/marketplace', headers={'Accept-Encoding': 'gzip'})
+        assert first.headers['ETag'].endswith('-gzip"')
+        second = logged_in_user.get('/marketplace', headers={'Accept-Encoding': 'gzip',
+                                                             'If-None-Match': first.headers['ETag']})
+        assert second.status_code == 304
+        assert second.headers['ETag'] == first.headers['ETag']
+
+    def test_precompressed_static_not_recompressed(self, client):
+        from flask import url_for
+        from app import app
+        with app.test_request_context():
+            url = url_for('static', filename='css/style.css')
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()).startswith(b'*{margin:0')
+        response.close()
@@ -0,0 +1,182 @@
+"""
+Tests for database connection pooling and pragma configuration
+"""
+import sqlite3
+import threading
+import pytest
+from db import ConnectionPool, PoolTimeout, apply_pragmas, pragma_mismatches, read_pragmas
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=2, timeout=0.2)
+    yield pool
+    pool.close()
+
+
+class TestConnectionPool:
+    """Test the bounded connection pool."""
+
+    def test_connection_is_reused(self, pool):
+        """Test that a released connection is handed out again."""
+        conn = pool.connect()
+        raw = conn.raw
+        conn.close()
+
+        conn = pool.connect()
+        assert conn.raw is raw
+        conn.close()
+
+        stats = pool.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['in_use'] == 0
+
+    def test_close_is_idempotent(self, pool):
+        """Test that closing a pooled connection twice releases it once."""
+        conn = pool.connect()
+        conn.close()
+        conn.close()
+        assert pool.stats()['idle'] == 1
+
+    def test_pool_is_bounded(self, pool):
+        """Test that checkout times out once every connection is in use."""
+        first = pool.connect()
+        second = pool.connect()
+
+        with pytest.raises(PoolTimeout):
+            pool.connect()
+
+        stats = pool.stats()
+        assert stats['open'] == 2
+        assert stats['waits'] == 1
+        assert stats['timeouts'] == 1
+        first.close()
+        second.close()
+
+    def test_waiter_gets_released_connection(self, pool):
+        """Test that a waiting thread receives a connection once one is released."""
+        first = pool.connect()
+        second = pool.connect()
+        acquired = []
+
+        def worker():
+            conn = pool.connect(timeout=5)
+            acquired.append(conn.raw)
+            conn.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        raw = first.raw
+        first.close()
+        thread.join()
+        second.close()
+
+        assert acquired == [raw]
+        assert pool.stats()['waits'] == 1
+
+    def test_release_rolls_back_open_transaction(self, pool):
+        """Test that uncommitted work does not leak to the next borrower."""
+        conn = pool.connect()
+        conn.execute('CREATE TABLE items (name TEXT)')
+        conn.commit()
+        conn.execute("INSERT INTO items VALUES ('x')")
+        conn.close()
+
+        conn = pool.connect()
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+        conn.close()
+
+    def test_broken_connection_is_replaced(self, tmp_path):
+        """Test that the health check discards a broken idle connection."""
+        pool = ConnectionPool(str(tmp_path / 'pool.db'), size=1, health_check_interval=0)
+        conn = pool.connect()
+        raw = conn.raw
+        conn.close()
+        raw.close()  # simulate a connection that went bad while idle
+
+        conn = pool.connect()
+        assert conn.raw is not raw
+        assert conn.execute('SELECT 1').fetchone()[0] == 1
+        conn.close()
+        assert pool.stats()['discarded'] == 1
+        pool.close()
+
+    def test_drain_waits_for_checked_out_connections(self, pool):
+        """Test that draining closes the pool and waits for borrowed connections to come back."""
+        idle = pool.connect()
+        busy = pool.connect()
+        idle.close()
+        timer = threading.Timer(0.1, busy.close)
+        timer.start()
+
+        assert pool.drain(timeout=5) == 0
+        timer.join()
+        assert pool.stats()['open'] == 0
+        with pytest.raises(PoolTimeout):
+            pool.connect()
+
+    def test_drain_gives_up_after_timeout(self, pool):
+        conn = pool.connect()
+        assert pool.drain(timeout=0.05) == 1
+        conn.close()
+        assert pool.stats()['open'] == 0
+
+
+class TestAppPool:
+    """Test the pool integration with the Flask app."""
+
+    def test_request_returns_connection_to_pool(self, logged_in_user, test_listing):
+        """Test that connections are back in the pool after a request."""
+        from app import get_pool
+
+        logged_in_user.get('/marketplace')
+        logged_in_user.get('/my-listings')
+
+        stats = get_pool().stats()
+        assert stats['in_use'] == 0
+        assert stats['hits'] > 0
+
+    def test_pool_follows_database_config(self):
+        """Test that the pool points at the configured database."""
+        from app import app, get_pool
+
+        assert get_pool().database == app.config['DATABASE']
+
+
+class TestPragmas:
+    """Test the SQLite pragma profile."""
+
+    def test_pool_applies_pragmas(self, tmp_path):
+        """Test that every pooled connection gets the pragma profile."""
+        pool = ConnectionPool(str(tmp_path / 'wal.db'), pragmas={
+            'journal_mode': 'WAL', 'busy_timeout': 2500, 'synchronous': 'NORMAL'})
+        conn = pool.connect()
+        settings = read_pragmas(conn, ['journal_mode', 'busy_timeout', 'synchronous'])
+        conn.close()
+        pool.close()
+
+        assert settings == {'journal_mode': 'wal', 'busy_timeout': 2500, 'synchronous': 1}
+
+    def test_unknown_pragma_rejected(self, tmp_path):
+        """Test that pragmas outside the supported profile are refused."""
+        conn = sqlite3.connect(str(tmp_path / 'x.db'))
+        with pytest.raises(ValueError):
+            apply_pragmas(conn, {'writable_schema': 1})
+        with pytest.raises(ValueError):
+            apply_pragmas(conn, {'journal_mode': 'WAL; DROP TABLE users'})
+        conn.close()
+
+    def test_mismatches_reported(self):
+        """Test that settings which did not take are reported."""
+        requested = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000}
+        effective = {'journal_mode': 'delete', 'synchronous': 1, 'busy_timeout': 5000}
+        assert pragma_mismatches(requested, effective) == {'journal_mode': ('WAL', 'delete')}
+
+    def test_app_settings_in_effect(self):
+        """Test that the app's startup check finds its profile applied."""
+        from app import app, check_db_settings
+
+        effective = check_db_settings()
+        assert pragma_mismatches(app.config['SQLITE_PRAGMAS'], effective) == {}
+        assert effective['journal_mode'] == 'wal'
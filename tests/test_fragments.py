@@ -0,0 +1,129 @@
+"""
+Tests for the marketplace listing card cache
+"""
+import pytest
+from fragments import FragmentCache
+
+
+class TestFragmentCache:
+    """Test the LRU fragment cache."""
+
+    def test_hit_and_miss_counted(self):
+        cache = FragmentCache(max_bytes=1024)
+        assert cache.get((1, 1, 'en')) is None
+        cache.set((1, 1, 'en'), '<div>card</div>')
+        assert cache.get((1, 1, 'en')) == '<div>card</div>'
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+    def test_evicts_least_recently_used_over_cap(self):
+        """Test that the size cap evicts the entry used longest ago."""
+        cache = FragmentCache(max_bytes=30)
+        cache.set((1, 1), 'a' * 10)
+        cache.set((2, 1), 'b' * 10)
+        cache.get((1, 1))
+        cache.set((3, 1), 'c' * 15)
+        assert cache.get((2, 1)) is None
+        assert cache.get((1, 1)) is not None
+        assert cache.stats()['bytes'] == 25
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalidate_drops_every_variant(self):
+        """Test that invalidation removes all languages and versions of a listing."""
+        cache = FragmentCache(max_bytes=1024)
+        for key in [(1, 1, 'en'), (1, 2, 'de'), (2, 1, 'en')]:
+            cache.set(key, 'html')
+        cache.invalidate(1)
+        assert cache.stats()['entries'] == 1
+        assert cache.get((2, 1, 'en')) == 'html'
+
+    def test_zero_size_disables(self):
+        cache = FragmentCache(max_bytes=0)
+        cache.set((1, 1), 'html')
+        assert cache.get((1, 1)) is None
+
+
+class TestListingCardCache:
+    """Test card caching on the marketplace."""
+
+    @pytest.fixture
+    def other_listing(self):
+        from app import get_db
+
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("INSERT INTO users (email, password, display_name, location) VALUES ('o@x.y', 'x', 'Owner', 'Town')")
+        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                     VALUES (?, 'Cached Chair', 'Description', 'Furniture', 'Good', 'Exchange')""", (c.lastrowid,))
+        conn.commit()
+        listing_id = c.lastrowid
+        conn.close()
+        return listing_id
+
+    def test_second_view_hits_cache(self, logged_in_user, other_listing):
+        from app import card_cache
+
+        logged_in_user.get('/marketplace')
+        hits = card_cache.stats()['hits']
+        response = logged_in_user.get('/marketplace')
+        assert b'Cached Chair' in response.data
+        assert card_cache.stats()['hits'] == hits + 1
+
+    def test_update_bumps_version(self, other_listing):
+        """Test that any update to a listing gives it a new version."""
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("UPDATE listings SET image_variants = '{}' WHERE id = ?", (other_listing,))
+        conn.commit()
+        version = conn.execute("SELECT version FROM listings WHERE id = ?", (other_listing,)).fetchone()[0]
+        conn.close()
+        assert version == 2
+
+    def test_edit_shows_new_title(self, logged_in_user, test_listing):
+        """Test that an edited listing is re-rendered."""
+        from app import card_cache
+
+        logged_in_user.get('/marketplace')
+        logged_in_user.post(f'/edit-listing/{test_listing["id"]}', data={
+            'title': 'Renamed Item', 'description': 'Test Description', 'category': 'Electronics',
+            'condition': 'New', 'listing_type': 'Exchange'})
+        assert card_cache.stats()['entries'] == 0
+        response = logged_in_user.get('/marketplace')
+        assert b'Renamed Item' in response.data
+        assert b'Test Item' not in response.data
+
+    def test_owner_profile_edit_shows(self, logged_in_user, other_listing):
+        """Test that a change to the owner's profile, which leaves the listing's version alone, is re-rendered."""
+        from app import get_db
+
+        logged_in_user.get('/marketplace')
+        conn = get_db()
+        conn.execute("UPDATE users SET display_name = 'Renamed Owner', location = 'Village' WHERE email = 'o@x.y'")
+        conn.commit()
+        conn.close()
+        response = logged_in_user.get('/marketplace')
+        assert b'Renamed Owner' in response.data
+        assert b'Village' in response.data
+
+    def test_cards_cached_per_language(self, logged_in_user, other_listing):
+        from app import card_cache
+
+        logged_in_user.get('/marketplace')
+        logged_in_user.get('/set_language/de')
+        response = logged_in_user.get('/marketplace')
+        assert 'Möbel'.encode() in response.data
+        assert card_cache.stats()['entries'] == 2
+
+    def test_own_listing_has_no_request_button(self, logged_in_user, test_listing, other_listing):
+        response = logged_in_user.get('/marketplace')
+        assert f'/request-item/{other_listing}'.encode() in response.data
+        assert f'/request-item/{test_listing["id"]}'.encode() not in response.data
+
+    def test_stats_endpoint(self, logged_in_admin):
+        response = logged_in_admin.get('/admin/cache-stats')
+        assert response.get_json()['listing_cards']['entries'] == 0
+
+    def test_stats_endpoint_requires_admin(self, logged_in_user):
+        response = logged_in_user.get('/admin/cache-stats')
+        assert '/login' in response.location
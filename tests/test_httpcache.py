@@ -0,0 +1,160 @@
+"""
+Tests for conditional page responses and static file caching
+"""
+import os
+import pytest
+from httpcache import compute_etag, is_hashed_upload
+
+
+class TestConditionalPages:
+    """Test ETag / 304 handling on listing pages."""
+
+    def revalidate(self, client, url, response):
+        return client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+    def test_unchanged_page_is_304(self, logged_in_user, test_listing):
+        first = logged_in_user.get('/marketplace')
+        assert first.status_code == 200
+        assert first.headers['ETag']
+        assert 'no-cache' in first.headers['Cache-Control']
+
+        second = self.revalidate(logged_in_user, '/marketplace', first)
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == first.headers['ETag']
+
+    def test_write_changes_etag(self, logged_in_user, test_listing):
+        """Test that any listing write makes the page render again."""
+        first = logged_in_user.get('/my-listings')
+        logged_in_user.post(f'/edit-listing/{test_listing["id"]}', data={
+            'title': 'Changed', 'description': 'Test Description', 'category': 'Electronics',
+            'condition': 'New', 'listing_type': 'Exchange'})
+        # Consume the flash message first; pages with pending flashes are never 304
+        logged_in_user.get('/my-listings')
+        second = self.revalidate(logged_in_user, '/my-listings', first)
+        assert second.status_code == 200
+        assert b'Changed' in second.data
+
+    def test_outside_write_changes_body_and_etag(self, logged_in_user, test_listing):
+        """Test that a write the cached marketplace query did not see changes both the ETag and the body."""
+        from app import get_db
+
+        first = logged_in_user.get('/marketplace')
+        conn = get_db()
+        conn.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (?, 'Written Elsewhere', 'd', 'Books', 'Good', 'Donate')""", (test_listing['user_id'],))
+        conn.commit()
+        conn.close()
+        second = self.revalidate(logged_in_user, '/marketplace', first)
+        assert second.status_code == 200
+        assert second.headers['ETag'] != first.headers['ETag']
+        assert b'Written Elsewhere' in second.data
+
+    def test_filters_and_language_vary_etag(self, logged_in_user, test_listing):
+        plain = logged_in_user.get('/marketplace')
+        filtered = logged_in_user.get('/marketplace?category=Books')
+        assert plain.headers['ETag'] != filtered.headers['ETag']
+
+        logged_in_user.get('/set_language/de')
+        response = self.revalidate(logged_in_user, '/marketplace', plain)
+        assert response.status_code == 200
+
+    def test_etag_differs_per_user(self, client, test_user, test_admin, test_listing):
+        with client.session_transaction() as sess:
+            sess['user_id'] = test_user['id']
+        first = client.get('/marketplace')
+        with client.session_transaction() as sess:
+            sess['user_id'] = test_admin['id']
+        assert self.revalidate(client, '/marketplace', first).status_code == 200
+
+    def test_pending_flash_renders(self, logged_in_user, test_listing):
+        first = logged_in_user.get('/my-listings')
+        with logged_in_user.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Saved!')]
+        response = self.revalidate(logged_in_user, '/my-listings', first)
+        assert response.status_code == 200
+        assert b'Saved!' in response.data
+
+    def test_redirects_have_no_etag(self, client):
+        response = client.get('/marketplace')
+        assert response.status_code == 302
+        assert 'ETag' not in response.headers
+
+    def test_asset_rebuild_changes_etag(self, logged_in_user, test_listing, tmp_path, monkeypatch):
+        """Test that pages linking a stylesheet a rebuild deleted are rendered again."""
+        import shutil
+        import app as app_module
+
+        shutil.copytree(os.path.join(app_module.app.static_folder, 'css'), tmp_path / 'css')
+        monkeypatch.setattr(app_module.app, 'static_folder', str(tmp_path))
+        monkeypatch.setattr(app_module, 'asset_manifest', app_module.asset_manifest)
+        app_module.load_assets()
+        first = logged_in_user.get('/marketplace')
+
+        with open(tmp_path / 'css' / 'style.css', 'a') as f:
+            f.write('.new-rule { color: red; }\n')
+        app_module.load_assets()
+        second = self.revalidate(logged_in_user, '/marketplace', first)
+        assert second.status_code == 200
+        assert app_module.asset_manifest['css/style.css'].encode() in second.data
+
+    def test_admin_dashboard_follows_counters(self, logged_in_admin, test_user):
+        from app import stats_cache
+
+        first = logged_in_admin.get('/admin')
+        assert self.revalidate(logged_in_admin, '/admin', first).status_code == 304
+        logged_in_admin.get('/admin/delete-user/%d' % test_user['id'])
+        logged_in_admin.get('/admin/users')
+        stats_cache.clear()
+        assert self.revalidate(logged_in_admin, '/admin', first).status_code == 200
+
+    def test_admin_dashboard_skips_stats_for_non_admins(self, logged_in_user, monkeypatch):
+        import app as app_module
+
+        def fail():
+            raise AssertionError('dashboard stats read for a non-admin')
+        monkeypatch.setattr(app_module, 'get_dashboard_stats', fail)
+        response = logged_in_user.get('/admin')
+        assert '/login' in response.location
+
+
+class TestStaticCaching:
+    """Test fingerprinted static URLs and their cache headers."""
+
+    def test_unbuilt_file_url_fingerprinted(self, monkeypatch):
+        """Test that static files outside the asset pipeline get a ?v= fingerprint."""
+        import app as app_module
+        from flask import url_for
+        monkeypatch.setattr(app_module, 'asset_manifest', {})
+        with app_module.app.test_request_context():
+            assert '/static/css/style.css?v=' in url_for('static', filename='css/style.css')
+
+    def test_fingerprinted_file_cached_for_a_year(self, client):
+        from app import app
+        with app.test_request_context():
+            from flask import url_for
+            url = url_for('static', filename='css/style.css')
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.cache_control.max_age == app.config['STATIC_MAX_AGE']
+        assert response.cache_control.immutable
+        response.close()
+
+    def test_plain_url_not_cached_long(self, client):
+        from app import app
+        response = client.get('/static/css/style.css')
+        assert response.cache_control.max_age != app.config['STATIC_MAX_AGE']
+        response.close()
+
+    @pytest.mark.parametrize('filename, hashed', [
+        ('uploads/ab/' + 'ab' * 32 + '.jpg', True),
+        ('uploads/ab/' + 'ab' * 32 + '_400.webp', True),
+        ('uploads/photo.jpg', False),
+        ('css/style.css', False),
+    ])
+    def test_hashed_uploads_recognised(self, filename, hashed):
+        assert is_hashed_upload(filename) is hashed
+
+    def test_compute_etag_stable(self):
+        assert compute_etag('/x', [1, 2], 'en') == compute_etag('/x', [1, 2], 'en')
+        assert compute_etag('/x', [1, 2], 'en') != compute_etag('/x', [1, 3], 'en')
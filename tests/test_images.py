@@ -0,0 +1,123 @@
+"""
+Tests for the background image derivative pipeline
+"""
+import io
+import os
+import pytest
+from PIL import Image
+from images import make_derivatives, parse_variants
+
+
+def jpeg_bytes(size=(1600, 1200), exif=None):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG', exif=exif or Image.Exif())
+    return buffer.getvalue()
+
+
+class TestMakeDerivatives:
+    """Test resizing and re-encoding of uploads."""
+
+    def test_creates_jpeg_and_webp_per_width(self, tmp_path):
+        """Test that each width gets a JPEG and a WebP copy."""
+        source = tmp_path / 'photo.jpg'
+        source.write_bytes(jpeg_bytes())
+
+        variants = make_derivatives(str(source), str(tmp_path), 'photo', (400, 800))
+
+        assert variants == {'jpeg': [[400, 'photo_400.jpg'], [800, 'photo_800.jpg']],
+                            'webp': [[400, 'photo_400.webp'], [800, 'photo_800.webp']]}
+        with Image.open(tmp_path / 'photo_400.webp') as image:
+            assert image.format == 'WEBP'
+            assert image.size == (400, 300)
+        assert os.path.getsize(tmp_path / 'photo_800.jpg') < source.stat().st_size
+
+    def test_no_upscaling(self, tmp_path):
+        """Test that small images are not enlarged."""
+        source = tmp_path / 'small.jpg'
+        source.write_bytes(jpeg_bytes(size=(300, 200)))
+
+        variants = make_derivatives(str(source), str(tmp_path), 'small', (400, 800))
+
+        assert [width for width, _ in variants['jpeg']] == [300]
+
+    def test_exif_is_stripped_and_orientation_applied(self, tmp_path):
+        """Test that metadata is removed after honouring the orientation tag."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'CameraMaker'
+        source = tmp_path / 'rotated.jpg'
+        source.write_bytes(jpeg_bytes(size=(800, 400), exif=exif))
+
+        make_derivatives(str(source), str(tmp_path), 'rotated', (400,))
+
+        with Image.open(tmp_path / 'rotated_400.jpg') as image:
+            assert image.size == (400, 800)
+            assert len(image.getexif()) == 0
+
+    def test_transparent_png(self, tmp_path):
+        """Test that images with alpha are flattened for JPEG but kept for WebP."""
+        source = tmp_path / 'logo.png'
+        Image.new('RGBA', (500, 500), (0, 0, 0, 0)).save(source)
+
+        make_derivatives(str(source), str(tmp_path), 'logo', (400,))
+
+        with Image.open(tmp_path / 'logo_400.jpg') as image:
+            assert image.mode == 'RGB'
+        with Image.open(tmp_path / 'logo_400.webp') as image:
+            assert image.mode == 'RGBA'
+
+
+class TestParseVariants:
+    """Test decoding of the image_variants column."""
+
+    @pytest.mark.parametrize('value', [None, '', 'not json', '[]', '{"jpeg": []}'])
+    def test_invalid_values(self, value):
+        assert parse_variants(value) is None
+
+
+class TestUploadPipeline:
+    """Test that uploads get derivatives in the background."""
+
+    def upload(self, client, data, filename):
+        return client.post('/create-listing', data={
+            'title': 'Photo Listing',
+            'description': 'Has a picture',
+            'category': 'Books',
+            'condition': 'Good',
+            'listing_type': 'Exchange',
+            'image': (io.BytesIO(data), filename),
+        }, content_type='multipart/form-data', follow_redirects=True)
+
+    def test_upload_records_derivatives(self, logged_in_user, test_user):
+        """Test that processed derivatives are recorded and used in srcset."""
+        from app import get_db, image_pipeline
+
+        response = self.upload(logged_in_user, jpeg_bytes(), 'photo.jpg')
+        assert response.status_code == 200
+        image_pipeline.join(timeout=30)
+
+        conn = get_db()
+        listing = conn.execute("SELECT * FROM listings WHERE title = 'Photo Listing'").fetchone()
+        conn.close()
+        variants = parse_variants(listing['image_variants'])
+        assert variants is not None
+        assert all(path.startswith('uploads/') for _, path in variants['webp'])
+
+        body = logged_in_user.get('/my-listings').get_data(as_text=True)
+        assert 'type="image/webp"' in body
+        assert '_800.webp 800w' in body
+        assert listing['image_path'] not in body
+
+    def test_non_image_upload_falls_back_to_original(self, logged_in_user, test_user):
+        """Test that a file Pillow cannot read keeps the original image."""
+        from app import get_db, image_pipeline
+
+        self.upload(logged_in_user, b'definitely not an image', 'notes.jpg')
+        image_pipeline.join(timeout=30)
+
+        conn = get_db()
+        listing = conn.execute("SELECT * FROM listings WHERE title = 'Photo Listing'").fetchone()
+        conn.close()
+        assert listing['image_variants'] is None
+        body = logged_in_user.get('/my-listings').get_data(as_text=True)
+        assert listing['image_path'] in body
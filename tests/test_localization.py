@@ -65,3 +65,62 @@ class TestLanguageSwitching:
         # Without referrer, should redirect to index
         response = client.get('/set_language/en', follow_redirects=False)
         assert response.status_code == 302
+
+
+class TestTranslationCatalog:
+    """Test the flattened translation tables."""
+
+    def test_flatten(self):
+        """Test that nested keys become dotted keys and only strings are kept."""
+        from i18n import flatten
+
+        assert flatten({'a': {'b': 'x', 'c': {'d': 'y'}}, 'n': 1}) == {'a.b': 'x', 'a.c.d': 'y'}
+
+    def test_translator_lookup(self):
+        """Test lookups for leaf, intermediate and unknown keys."""
+        from i18n import Catalog
+
+        catalog = Catalog({'en': {'common.appName': 'EcoSwap'}})
+        t = catalog.translator('en')
+        assert t('common.appName') == 'EcoSwap'
+        assert t('common') == 'common'
+        assert t('common.missing') == 'common.missing'
+        assert catalog.missing[('en', 'common.missing')] == 1
+
+    def test_unknown_language_uses_default(self):
+        """Test that an unsupported language falls back to the default table."""
+        from i18n import Catalog
+
+        catalog = Catalog({'en': {'k': 'English'}})
+        t = catalog.translator('fr')
+        assert t.lang == 'en'
+        assert t('k') == 'English'
+
+    def test_unsupported_session_language_bound_once(self):
+        """Test that a session language without a table reuses the request's fallback translator."""
+        from flask import session
+        from app import app, get_translator
+
+        with app.test_request_context():
+            session['lang'] = 'fr'
+            t = get_translator()
+            assert t.lang == 'en'
+            assert get_translator() is t
+
+    def test_loaded_catalog_matches_locale_files(self):
+        """Test that every string in the locale files is reachable by dotted key."""
+        from app import catalog
+
+        assert catalog.translator('de')('marketplace.categories.Books') != 'marketplace.categories.Books'
+        assert set(catalog.tables['en']) == set(catalog.tables['de'])
+
+    def test_pages_have_no_missing_keys(self, logged_in_user, test_listing):
+        """Test that rendering pages does not hit missing translations."""
+        from app import catalog
+
+        catalog.missing.clear()
+        for lang in ['en', 'de']:
+            logged_in_user.get(f'/set_language/{lang}')
+            for url in ['/', '/marketplace', '/my-listings', '/my-requests', '/create-listing']:
+                assert logged_in_user.get(url).status_code == 200
+        assert dict(catalog.missing) == {}
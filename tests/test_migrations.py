@@ -0,0 +1,196 @@
+"""
+Tests for schema migrations and the query plans they enable
+"""
+import re
+import sqlite3
+import pytest
+from migrations import MIGRATIONS, current_version, migrate
+
+
+class TestMigrationRunner:
+    """Test the versioned migration runner."""
+
+    def test_fresh_database_reaches_latest_version(self, tmp_path):
+        """Test that all migrations apply to an empty database."""
+        conn = sqlite3.connect(str(tmp_path / 'fresh.db'))
+        applied = migrate(conn)
+        assert applied == [version for version, _, _ in MIGRATIONS]
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        conn.close()
+
+    def test_migrate_is_idempotent(self, tmp_path):
+        """Test that a second run applies nothing."""
+        conn = sqlite3.connect(str(tmp_path / 'again.db'))
+        migrate(conn)
+        assert migrate(conn) == []
+        conn.close()
+
+    def test_legacy_database_is_adopted(self, tmp_path):
+        """Test that a pre-migration database (user_version 0) is upgraded in place."""
+        conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, "
+                     "password TEXT NOT NULL, display_name TEXT NOT NULL, location TEXT NOT NULL, "
+                     "is_admin INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        conn.execute("INSERT INTO users (email, password, display_name, location) VALUES ('a@b.c', 'x', 'A', 'B')")
+        conn.commit()
+
+        migrate(conn)
+        assert conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 1
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        conn.close()
+
+    def test_failed_migration_rolls_back(self, tmp_path):
+        """Test that a failing migration leaves the previous version in place."""
+        conn = sqlite3.connect(str(tmp_path / 'broken.db'))
+        migrations = [
+            (1, 'ok', ['CREATE TABLE a (id INTEGER)']),
+            (2, 'broken', ['CREATE TABLE b (id INTEGER)', 'NOT VALID SQL']),
+        ]
+        with pytest.raises(sqlite3.OperationalError):
+            migrate(conn, migrations)
+
+        assert current_version(conn) == 1
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'a' in tables and 'b' not in tables
+        conn.close()
+
+    def test_target_version(self, tmp_path):
+        """Test migrating only up to a given version."""
+        conn = sqlite3.connect(str(tmp_path / 'target.db'))
+        assert migrate(conn, target=1) == [1]
+        assert current_version(conn) == 1
+        conn.close()
+
+
+@pytest.fixture
+def traced_statements():
+    """Capture every SQL statement the app runs during a test."""
+    from app import close_pool, get_pool
+
+    statements = []
+    close_pool()
+    get_pool().on_connect = lambda conn: conn.set_trace_callback(statements.append)
+    return statements
+
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def full_scans(statements):
+    """Return (statement, table) pairs for SELECTs whose plan scans a whole table."""
+    from app import get_db
+
+    conn = get_db()
+    scans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        for row in conn.execute('EXPLAIN QUERY PLAN ' + sql):
+            match = FULL_SCAN.match(row['detail'])
+            if match:
+                scans.append((sql, match.group(1)))
+    conn.close()
+    return scans
+
+
+class TestQueryPlans:
+    """Test that the hot routes are served by indexes rather than full scans."""
+
+    @pytest.mark.parametrize('url', [
+        '/marketplace',
+        '/marketplace?category=Electronics',
+        '/marketplace?type=Exchange',
+        '/marketplace?category=Books&type=Donate',
+        '/my-listings',
+        '/my-requests',
+        '/my-requests?tab=received',
+    ])
+    def test_listing_pages_use_indexes(self, logged_in_user, test_request, traced_statements, url):
+        """Test that listing pages do not scan whole tables."""
+        response = logged_in_user.get(url)
+        assert response.status_code == 200
+        assert traced_statements
+        assert full_scans(traced_statements) == []
+
+    def test_request_item_uses_indexes(self, logged_in_user, test_listing, traced_statements):
+        """Test that the request-item checks do not scan whole tables."""
+        logged_in_user.get(f'/request-item/{test_listing["id"]}')
+        assert traced_statements
+        assert full_scans(traced_statements) == []
+
+
+class TestRequestUniqueness:
+    """Test the migration enforcing one request per user and listing."""
+
+    def test_duplicates_are_collapsed(self, tmp_path):
+        """Test that existing duplicates are removed, keeping an accepted one."""
+        conn = sqlite3.connect(str(tmp_path / 'dupes.db'))
+        migrate(conn, target=6)
+        conn.execute("INSERT INTO users (email, password, display_name, location) VALUES ('a@b.c', 'x', 'A', 'B')")
+        conn.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (1, 'T', 'D', 'Books', 'Good', 'Exchange')""")
+        conn.executemany("INSERT INTO requests (listing_id, requester_id, status) VALUES (1, 1, ?)",
+                         [('Pending',), ('Accepted',), ('Declined',)])
+        conn.commit()
+
+        migrate(conn)
+        assert conn.execute("SELECT status FROM requests").fetchall() == [('Accepted',)]
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO requests (listing_id, requester_id) VALUES (1, 1)")
+        conn.close()
+
+
+class TestCascadingForeignKeys:
+    """Test the table rebuild adding ON DELETE CASCADE."""
+
+    @pytest.fixture
+    def legacy_db(self, tmp_path):
+        """A version 7 database holding a listing, a request and orphans of deleted users."""
+        conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+        migrate(conn, target=7)
+        conn.execute("INSERT INTO users (email, password, display_name, location) VALUES ('a@b.c', 'x', 'A', 'B')")
+        conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                            VALUES (?, ?, 'Description', 'Books', 'Good', 'Exchange')""",
+                         [(1, 'Kept bicycle'), (99, 'Orphaned lamp')])
+        conn.executemany("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)", [(1, 1), (1, 99), (2, 1)])
+        conn.commit()
+        yield conn
+        conn.close()
+
+    def test_orphans_removed_and_data_kept(self, legacy_db):
+        """Test that orphaned rows go and everything else survives the rebuild."""
+        migrate(legacy_db)
+        assert legacy_db.execute('SELECT id, title FROM listings').fetchall() == [(1, 'Kept bicycle')]
+        assert legacy_db.execute('SELECT listing_id, requester_id FROM requests').fetchall() == [(1, 1)]
+        assert legacy_db.execute('SELECT name, value FROM stats ORDER BY name').fetchall() == [
+            ('active_listings', 1), ('total_requests', 1), ('total_users', 1)]
+
+    def test_deletes_cascade(self, legacy_db):
+        """Test that deleting a user removes their listings and requests."""
+        migrate(legacy_db)
+        legacy_db.execute('PRAGMA foreign_keys = ON')
+        legacy_db.execute('DELETE FROM users WHERE id = 1')
+        assert legacy_db.execute('SELECT COUNT(*) FROM listings').fetchone()[0] == 0
+        assert legacy_db.execute('SELECT COUNT(*) FROM requests').fetchone()[0] == 0
+        assert legacy_db.execute("SELECT value FROM stats WHERE name = 'active_listings'").fetchone()[0] == 0
+
+    def test_triggers_and_indexes_recreated(self, legacy_db):
+        """Test that the rebuilt tables keep their indexes and triggers."""
+        before = set(legacy_db.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+        migrate(legacy_db, target=8)
+        after = set(legacy_db.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+        assert after == before
+
+        legacy_db.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                             VALUES (1, 'Green kettle', 'Description', 'Books', 'Good', 'Exchange')""")
+        if any(name == 'listings_fts_insert' for _, name in after):
+            assert legacy_db.execute(
+                "SELECT COUNT(*) FROM listings_fts_en WHERE listings_fts_en MATCH 'kettle'").fetchone()[0] == 1
+
+    def test_foreign_keys_setting_restored(self, tmp_path):
+        """Test that migrate switches enforcement back on afterwards."""
+        conn = sqlite3.connect(str(tmp_path / 'fk.db'))
+        conn.execute('PRAGMA foreign_keys = ON')
+        migrate(conn)
+        assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        conn.close()
@@ -0,0 +1,203 @@
+"""
+Tests for keyset pagination on listing and admin pages
+"""
+import re
+import pytest
+import sqlite3
+from pagination import LazyPage, decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    from app import app
+    monkeypatch.setitem(app.config, 'PAGE_SIZE', 3)
+
+
+@pytest.fixture
+def many_listings(test_user):
+    """Create seven listings from another user, all with the same timestamp."""
+    from werkzeug.security import generate_password_hash
+    from app import get_db
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
+              ('pager@example.com', generate_password_hash('pager123'), 'Pager', 'Page City'))
+    owner_id = c.lastrowid
+    c.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?, '2025-01-01 10:00:00')""",
+                  [(owner_id, f'Paged Item {i}', 'Description', 'Books' if i % 2 else 'Sports', 'Good', 'Exchange')
+                   for i in range(7)])
+    conn.commit()
+    conn.close()
+    return [f'Paged Item {i}' for i in range(7)]
+
+
+def page_titles(response):
+    return re.findall(r'Paged Item \d', response.get_data(as_text=True))
+
+
+def cursor(response, name):
+    match = re.search(rf'[?&]{name}=([\w-]+)', response.get_data(as_text=True))
+    return match.group(1) if match else None
+
+
+class TestCursors:
+    """Test cursor encoding."""
+
+    def test_round_trip(self):
+        assert decode_cursor(encode_cursor(['2025-01-01 10:00:00', 42])) == ['2025-01-01 10:00:00', 42]
+
+    @pytest.mark.parametrize('token', ['', 'not-base64!', encode_cursor([1]), encode_cursor([[1], 2])])
+    def test_malformed_cursor_rejected(self, token):
+        assert decode_cursor(token) is None
+
+
+class TestLazyPage:
+    """Test pages read from the cursor while they are iterated."""
+
+    @pytest.fixture
+    def conn(self):
+        conn = sqlite3.connect(':memory:')
+        conn.row_factory = sqlite3.Row
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, created_at TEXT)")
+        conn.executemany("INSERT INTO items (id, created_at) VALUES (?, '2025-01-01')", [(i,) for i in range(1, 8)])
+        conn.commit()
+        yield conn
+        conn.close()
+
+    def fetch(self, conn, lazy, **cursors):
+        return paginate(conn, "SELECT * FROM items", [], [('created_at', 'created_at', 'DESC'), ('id', 'id', 'DESC')],
+                        3, lazy=lazy, **cursors)
+
+    def test_matches_eager_pages(self, conn):
+        """Test that lazy pages hold the same rows and cursors as eager ones."""
+        eager = self.fetch(conn, False)
+        lazy = self.fetch(conn, True)
+        assert isinstance(lazy, LazyPage)
+        assert lazy.next_cursor is None  # unknown until iterated
+        assert [row['id'] for row in lazy] == [row['id'] for row in eager] == [7, 6, 5]
+        assert lazy.next_cursor == eager.next_cursor
+        assert lazy.prev_cursor is None
+
+        eager = self.fetch(conn, False, after=eager.next_cursor)
+        lazy = self.fetch(conn, True, after=lazy.next_cursor)
+        assert lazy.prev_cursor == eager.prev_cursor
+        assert [row['id'] for row in lazy] == [4, 3, 2]
+        assert lazy.next_cursor == eager.next_cursor
+
+        last = self.fetch(conn, True, after=lazy.next_cursor)
+        assert [row['id'] for row in last] == [1]
+        assert last.next_cursor is None
+
+    def test_empty_page_is_falsy(self, conn):
+        conn.execute("DELETE FROM items")
+        page = self.fetch(conn, True)
+        assert not page
+        assert list(page) == []
+
+    def test_backward_pages_are_eager(self, conn):
+        first = self.fetch(conn, False)
+        second = self.fetch(conn, False, after=first.next_cursor)
+        page = self.fetch(conn, True, before=second.prev_cursor)
+        assert not isinstance(page, LazyPage)
+        assert [row['id'] for row in page] == [7, 6, 5]
+
+    def test_close_finishes_statement(self, conn):
+        """Test that a page abandoned part way leaves no read transaction open."""
+        page = self.fetch(conn, True)
+        next(iter(page))
+        page.close()
+        assert not conn.in_transaction
+        conn.execute("DROP TABLE items")  # fails while a statement is still active
+
+
+class TestKeysetPagination:
+    """Test paging through listings with cursors."""
+
+    def test_first_page_is_limited(self, logged_in_user, many_listings, small_pages):
+        """Test that a page holds at most PAGE_SIZE rows and links to the next."""
+        response = logged_in_user.get('/marketplace')
+        assert len(page_titles(response)) == 3
+        assert cursor(response, 'after') is not None
+        assert cursor(response, 'before') is None
+
+    @pytest.mark.parametrize('cache_backend', ['memory', None])
+    def test_walk_forward_and_back(self, logged_in_user, many_listings, small_pages, cache_backend, monkeypatch):
+        """Test that following cursors visits every row once, newest first, and back.
+
+        Without the query cache the rows are read lazily while the page streams.
+        """
+        from app import app
+        monkeypatch.setitem(app.config, 'QUERY_CACHE_BACKEND', cache_backend)
+        pages = []
+        response = logged_in_user.get('/marketplace')
+        pages.append(page_titles(response))
+        while cursor(response, 'after'):
+            response = logged_in_user.get(f'/marketplace?after={cursor(response, "after")}')
+            pages.append(page_titles(response))
+
+        seen = [title for page in pages for title in page]
+        assert seen == sorted(many_listings, reverse=True)
+        assert [len(page) for page in pages] == [3, 3, 1]
+
+        response = logged_in_user.get(f'/marketplace?before={cursor(response, "before")}')
+        assert page_titles(response) == pages[1]
+        assert cursor(response, 'after') is not None
+
+    def test_filters_carried_into_cursor_links(self, logged_in_user, many_listings, small_pages):
+        """Test that page links keep the active filters."""
+        response = logged_in_user.get('/marketplace?category=Sports')
+        assert page_titles(response) == ['Paged Item 6', 'Paged Item 4', 'Paged Item 2']
+        next_url = re.search(r'href="(/marketplace\?[^"]*after=[^"]*)"', response.get_data(as_text=True)).group(1)
+        assert 'category=Sports' in next_url
+
+        response = logged_in_user.get(next_url.replace('&amp;', '&'))
+        assert page_titles(response) == ['Paged Item 0']
+
+    def test_invalid_cursor_shows_first_page(self, logged_in_user, many_listings, small_pages):
+        """Test that a garbage cursor falls back to the first page."""
+        response = logged_in_user.get('/marketplace?after=garbage')
+        assert response.status_code == 200
+        assert page_titles(response) == ['Paged Item 6', 'Paged Item 5', 'Paged Item 4']
+
+    def test_search_results_paginate(self, logged_in_user, many_listings, small_pages):
+        """Test that ranked search results can be paged too."""
+        first = logged_in_user.get('/marketplace?search=Paged')
+        second = logged_in_user.get(f'/marketplace?search=Paged&after={cursor(first, "after")}')
+        titles = page_titles(first) + page_titles(second)
+        assert len(titles) == 6
+        assert len(set(titles)) == 6
+
+    def test_my_listings_paginate(self, logged_in_user, test_user, small_pages):
+        """Test that my-listings is paginated."""
+        from app import get_db
+
+        conn = get_db()
+        conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                            VALUES (?, ?, 'Description', 'Books', 'Good', 'Exchange')""",
+                         [(test_user['id'], f'Paged Item {i}') for i in range(5)])
+        conn.commit()
+        conn.close()
+
+        first = logged_in_user.get('/my-listings')
+        second = logged_in_user.get(f'/my-listings?after={cursor(first, "after")}')
+        assert len(page_titles(first)) == 3
+        assert len(page_titles(second)) == 2
+
+    def test_admin_listings_paginate(self, logged_in_admin, many_listings, small_pages):
+        """Test that admin listings are paginated."""
+        first = logged_in_admin.get('/admin/listings')
+        assert len(page_titles(first)) == 3
+        second = logged_in_admin.get(f'/admin/listings?after={cursor(first, "after")}')
+        assert set(page_titles(first)).isdisjoint(page_titles(second))
+
+    def test_admin_users_paginate(self, logged_in_admin, many_listings, test_request, monkeypatch):
+        """Test that admin users are paginated."""
+        from app import app
+        monkeypatch.setitem(app.config, 'PAGE_SIZE', 2)
+
+        response = logged_in_admin.get('/admin/users')
+        body = response.get_data(as_text=True)
+        assert body.count('name="user_ids"') == 2
+        assert cursor(response, 'after') is not None
@@ -0,0 +1,139 @@
+"""
+Tests for the password hashing policy and rehash on login
+"""
+import pytest
+from werkzeug.security import generate_password_hash
+from passwords import HasherBusy, PasswordHasher, method_prefix, needs_rehash
+
+CHEAP = 'pbkdf2:sha256:1000'
+CHEAPER = 'pbkdf2:sha256:500'
+
+
+def stored_hash(user_id):
+    from app import get_db
+
+    conn = get_db()
+    value = conn.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    conn.close()
+    return value
+
+
+def login(client, email, password):
+    return client.post('/login', data={'email': email, 'password': password})
+
+
+class TestPolicy:
+    """Test detection of hashes made under another policy."""
+
+    def test_defaults_filled_in(self):
+        assert method_prefix('pbkdf2') == method_prefix('pbkdf2:sha256')
+        assert method_prefix('scrypt') == 'scrypt:32768:8:1'
+
+    def test_needs_rehash(self):
+        current = generate_password_hash('secret', CHEAP)
+        assert not needs_rehash(current, CHEAP)
+        assert needs_rehash(current, CHEAPER)
+        assert needs_rehash(current, 'scrypt')
+
+
+class TestPasswordHasher:
+    """Test the bounded hashing pool."""
+
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(workers=1, max_pending=0)
+        try:
+            hashed = hasher.hash('secret', CHEAP)
+            assert hasher.verify(hashed, 'secret')
+            assert not hasher.verify(hashed, 'wrong')
+        finally:
+            hasher.shutdown()
+
+    def test_full_queue_turns_callers_away(self):
+        """Test that callers beyond the workers and the queue are refused, not queued."""
+        hasher = PasswordHasher(workers=1, max_pending=1)
+        try:
+            # Stand in for one hash running and one waiting
+            hasher._slots.acquire()
+            hasher._slots.acquire()
+            with pytest.raises(HasherBusy):
+                hasher.hash('secret', CHEAP)
+            hasher._slots.release()
+            hasher._slots.release()
+            assert hasher.verify(hasher.hash('secret', CHEAP), 'secret')
+        finally:
+            hasher.shutdown()
+
+    def test_restarts_after_shutdown(self):
+        """Test that the worker threads start again on first use after a shutdown, e.g. in a forked worker."""
+        hasher = PasswordHasher(workers=1, max_pending=0)
+        hasher.shutdown()
+        try:
+            assert hasher.verify(hasher.hash('secret', CHEAP), 'secret')
+            hasher.shutdown()
+            assert hasher.verify(hasher.hash('secret', CHEAP), 'secret')
+        finally:
+            hasher.shutdown()
+
+
+class TestRehashOnLogin:
+    """Test that logins bring stored hashes up to the configured policy."""
+
+    @pytest.fixture
+    def policy(self, monkeypatch):
+        from app import app
+
+        def set_policy(method):
+            monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', method)
+        return set_policy
+
+    def test_signup_uses_policy(self, client, policy):
+        from app import get_db
+
+        policy(CHEAP)
+        client.post('/signup', data={'email': 'policy@example.com', 'password': 'secret123',
+                                     'display_name': 'Policy', 'location': 'City'})
+        conn = get_db()
+        value = conn.execute("SELECT password FROM users WHERE email = 'policy@example.com'").fetchone()[0]
+        conn.close()
+        assert value.startswith(CHEAP + '$')
+
+    @pytest.mark.parametrize('old, new', [(CHEAPER, CHEAP), (CHEAP, CHEAPER)])
+    def test_login_rehashes(self, client, test_user, policy, old, new):
+        """Test upgrading and downgrading the hash cost on a successful login."""
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("UPDATE users SET password = ? WHERE id = ?",
+                     (generate_password_hash(test_user['password'], old), test_user['id']))
+        conn.commit()
+        conn.close()
+
+        policy(new)
+        response = login(client, test_user['email'], test_user['password'])
+        assert response.status_code == 302
+        assert stored_hash(test_user['id']).startswith(new + '$')
+        client.get('/logout')
+        assert login(client, test_user['email'], test_user['password']).status_code == 302
+
+    def test_current_hash_left_alone(self, client, test_user, policy):
+        policy('scrypt')
+        before = stored_hash(test_user['id'])
+        login(client, test_user['email'], test_user['password'])
+        assert stored_hash(test_user['id']) == before
+
+    def test_wrong_password_does_not_rehash(self, client, test_user, policy):
+        policy(CHEAP)
+        before = stored_hash(test_user['id'])
+        response = login(client, test_user['email'], 'wrongpassword')
+        assert b'Invalid email or password' in response.data
+        assert stored_hash(test_user['id']) == before
+
+    def test_busy_hasher_answers_503(self, client, test_user, monkeypatch):
+        import app as app_module
+
+        def busy(*args):
+            raise HasherBusy()
+        monkeypatch.setattr(app_module.password_hasher, 'verify', busy)
+        response = login(client, test_user['email'], test_user['password'])
+        assert response.status_code == 503
+        assert b'busy' in response.data
@@ -0,0 +1,132 @@
+"""
+Tests for request profiling and the admin metrics endpoint
+"""
+import logging
+import re
+import sqlite3
+import pytest
+from profiling import Profiler, ProfiledConnection, RequestProfile, current_profile, format_labels
+
+
+@pytest.fixture
+def profiling(monkeypatch):
+    from app import app, profiler
+    monkeypatch.setitem(app.config, 'PROFILING', True)
+    profiler.clear()
+    yield profiler
+    profiler.clear()
+
+
+def metric(body, name, **labels):
+    match = re.search(rf'^{name}{re.escape(format_labels(labels))} (\S+)$', body, re.M)
+    return float(match.group(1)) if match else None
+
+
+class TestProfiledConnection:
+    """Test statement timing on the profiled connection class."""
+
+    @pytest.fixture
+    def conn(self):
+        conn = sqlite3.connect(':memory:', factory=ProfiledConnection)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, title TEXT)")
+        conn.executemany("INSERT INTO items (title) VALUES (?)", [('a',), ('b',)])
+        yield conn
+        conn.close()
+
+    def test_counts_only_while_active(self, conn):
+        conn.execute("SELECT * FROM items").fetchall()
+        profile = RequestProfile('test', slow_query_seconds=60).start()
+        try:
+            assert current_profile() is profile
+            conn.execute("SELECT * FROM items").fetchall()
+            conn.cursor().execute("SELECT COUNT(*) FROM items").fetchone()
+            conn.executemany("INSERT INTO items (title) VALUES (?)", [('c',)])
+        finally:
+            profile.finish()
+        assert current_profile() is None
+        assert profile.sql_statements == 3
+        assert profile.sql_seconds > 0
+
+    def test_slow_query_reported_with_plan(self, conn):
+        reported = []
+        profile = RequestProfile('test', slow_query_seconds=0,
+                                 on_slow_query=lambda *args: reported.append(args)).start()
+        try:
+            conn.execute("SELECT * FROM items WHERE title LIKE ?", ('%a%',)).fetchall()
+        finally:
+            profile.finish()
+        route, sql, seconds, plan = reported[0]
+        assert route == 'test'
+        assert 'LIKE' in sql
+        assert plan == ['SCAN items']
+        assert profile.slow_queries == 1
+
+
+class TestProfiler:
+    """Test aggregation and the Prometheus text format."""
+
+    def test_render(self):
+        profiler = Profiler()
+        for seconds in (0.003, 0.02, 7.0):
+            profile = RequestProfile('marketplace', 60)
+            profile.sql_statements = 2
+            profile.translations = 10
+            profiler.record(profile, seconds)
+        body = profiler.render()
+        assert metric(body, 'ecoswap_request_duration_seconds_bucket', route='marketplace', le='0.005') == 1
+        assert metric(body, 'ecoswap_request_duration_seconds_bucket', route='marketplace', le='0.025') == 2
+        assert metric(body, 'ecoswap_request_duration_seconds_bucket', route='marketplace', le='+Inf') == 3
+        assert metric(body, 'ecoswap_request_duration_seconds_count', route='marketplace') == 3
+        assert metric(body, 'ecoswap_request_duration_seconds_sum', route='marketplace') == pytest.approx(7.023)
+        assert metric(body, 'ecoswap_sql_statements_total', route='marketplace') == 6
+        assert metric(body, 'ecoswap_translation_lookups_total', route='marketplace') == 30
+        assert '# TYPE ecoswap_request_duration_seconds histogram' in body
+
+    def test_label_values_escaped(self):
+        assert format_labels({'route': 'a"b\\c'}) == '{route="a\\"b\\\\c"}'
+
+
+class TestMetricsEndpoint:
+    """Test profiling of real requests."""
+
+    def test_marketplace_profiled(self, logged_in_user, test_listing, profiling):
+        from app import app
+
+        logged_in_user.get('/marketplace').get_data()
+        snapshot = profiling.snapshot()['marketplace']
+        assert snapshot['requests'] == 1
+        assert snapshot['sql_statements'] > 0
+        assert snapshot['template_seconds'] > 0
+        assert snapshot['translations'] > 0
+        assert snapshot['template_seconds'] < snapshot['seconds']
+
+        app.config['PROFILING'] = False
+        logged_in_user.get('/marketplace')
+        assert profiling.snapshot()['marketplace']['requests'] == 1
+
+    def test_endpoint_reports_routes_and_pool(self, logged_in_admin, profiling):
+        logged_in_admin.get('/admin/listings').get_data()
+        response = logged_in_admin.get('/admin/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        body = response.get_data(as_text=True)
+        assert metric(body, 'ecoswap_request_duration_seconds_count', route='admin_listings') == 1
+        assert metric(body, 'ecoswap_sql_statements_total', route='admin_listings') > 0
+        assert metric(body, 'ecoswap_db_pool_connections', state='in_use') is not None
+        assert metric(body, 'ecoswap_cache_lookups_total', cache='listing_cards', result='hit') is not None
+
+    def test_slow_queries_logged_with_plan(self, logged_in_user, test_listing, profiling, monkeypatch, caplog):
+        from app import app
+        monkeypatch.setitem(app.config, 'PROFILE_SLOW_QUERY_MS', 0)
+        monkeypatch.setitem(app.config, 'QUERY_CACHE_BACKEND', None)
+        monkeypatch.setitem(app.config, 'FULL_TEXT_SEARCH', False)
+
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            logged_in_user.get('/marketplace?search=Test').get_data()
+        messages = [record.getMessage() for record in caplog.records]
+        assert any('Slow query on marketplace' in m and 'LIKE' in m and 'plan: ' in m for m in messages)
+        assert profiling.snapshot()['marketplace']['slow_queries'] > 0
+
+    def test_admin_only(self, logged_in_user):
+        response = logged_in_user.get('/admin/metrics')
+        assert response.status_code == 302
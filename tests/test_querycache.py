@@ -0,0 +1,193 @@
+"""
+Tests for the marketplace query-result cache
+"""
+import sqlite3
+import threading
+import time
+import pytest
+from querycache import MemoryBackend, QueryCache, SQLiteBackend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'cache.db'))
+
+
+class TestBackends:
+    """Test both backends against the same contract."""
+
+    def test_set_get_expire(self, backend):
+        backend.set('k', {'a': [1, 2]}, ttl=0.05)
+        assert backend.get('k') == {'a': [1, 2]}
+        time.sleep(0.06)
+        assert backend.get('k') is None
+
+    def test_add_only_when_absent(self, backend):
+        assert backend.add('lease', 1, ttl=10)
+        assert not backend.add('lease', 1, ttl=10)
+        backend.delete('lease')
+        assert backend.add('lease', 1, ttl=10)
+
+    def test_purge_expired(self, backend):
+        backend.set('old', 1, ttl=0.01)
+        backend.set('fresh', 2, ttl=10)
+        time.sleep(0.02)
+        assert backend.purge_expired() == 1
+        assert backend.get('fresh') == 2
+
+    def test_sqlite_backend_closes_every_thread_connection(self, tmp_path):
+        backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+        thread = threading.Thread(target=backend.set, args=('k', 'v', 10))
+        thread.start()
+        thread.join()
+        conns = list(backend._conns)
+        assert len(conns) == 2
+        backend.close()
+        for conn in conns:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute('SELECT 1')
+        assert backend.get('k') == 'v'  # reconnects
+
+    def test_sqlite_backend_shared_between_instances(self, tmp_path):
+        """Test that two handles on one file (as in two processes) see each other's writes."""
+        first = SQLiteBackend(str(tmp_path / 'shared.db'))
+        second = SQLiteBackend(str(tmp_path / 'shared.db'))
+        first.set('k', 'v', ttl=10)
+        assert second.get('k') == 'v'
+        second.delete('k')
+        assert first.get('k') is None
+
+    def test_memory_eviction(self):
+        backend = MemoryBackend(max_entries=2)
+        for n in range(5):
+            backend.set(f'k{n}', n, ttl=10)
+        assert backend.get('k0') is None
+        assert backend.get('k4') == 4
+
+
+class TestQueryCache:
+    """Test keys, invalidation and stampede protection."""
+
+    def test_new_data_version_changes_keys(self, backend):
+        cache = QueryCache(backend)
+        key = cache.key('marketplace', {'listings': 1, 'users': 1}, '', 'Books')
+        assert cache.get_or_compute(key, lambda: 'old') == 'old'
+        assert cache.key('marketplace', {'users': 1, 'listings': 1}, '', 'Books') == key
+        new_key = cache.key('marketplace', {'listings': 2, 'users': 1}, '', 'Books')
+        assert new_key != key
+        assert cache.get_or_compute(new_key, lambda: 'new') == 'new'
+
+    def test_expired_rows_purged_periodically(self, tmp_path):
+        """Test that superseded results are deleted from the cache file, not just ignored."""
+        backend = SQLiteBackend(str(tmp_path / 'cache.db'))
+        cache = QueryCache(backend, ttl=0.01, purge_interval=0.05)
+        for n in range(3):
+            cache.get_or_compute(f'k{n}', lambda: 'rows')
+        time.sleep(0.06)
+        cache.get_or_compute('k3', lambda: 'rows')
+        assert [row[0] for row in backend._conn().execute('SELECT key FROM cache')] == ['k3']
+
+    def test_concurrent_misses_compute_once(self, backend):
+        """Test that a burst of misses on one key runs the query once."""
+        cache = QueryCache(backend)
+        calls = []
+        barrier = threading.Barrier(8)
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'rows'
+
+        def worker():
+            barrier.wait()
+            results.append(cache.get_or_compute('hot', compute))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ['rows'] * 8
+        assert len(calls) == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_waits_for_other_process_lease(self, tmp_path):
+        """Test that a lease held through another handle makes this one wait for its result."""
+        path = str(tmp_path / 'shared.db')
+        other = SQLiteBackend(path)
+        cache = QueryCache(SQLiteBackend(path), poll_interval=0.01)
+        other.add('lease:hot', 1, ttl=5)
+        threading.Timer(0.05, other.set, ('hot', 'from other process', 10)).start()
+        assert cache.get_or_compute('hot', lambda: 'computed here') == 'from other process'
+        assert cache.stats()['coalesced'] == 1
+
+    def test_failed_compute_releases_lease(self, backend):
+        cache = QueryCache(backend)
+        with pytest.raises(RuntimeError):
+            cache.get_or_compute('k', lambda: (_ for _ in ()).throw(RuntimeError('db down')))
+        assert cache.get_or_compute('k', lambda: 'ok') == 'ok'
+
+
+class TestMarketplaceCache:
+    """Test the cache in front of the marketplace query."""
+
+    def add_listing(self, title, category='Books'):
+        from app import get_db
+
+        conn = get_db()
+        user_id = conn.execute('SELECT id FROM users LIMIT 1').fetchone()[0]
+        conn.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (?, ?, 'Description', ?, 'Good', 'Exchange')""", (user_id, title, category))
+        conn.commit()
+        conn.close()
+
+    def test_repeat_view_served_from_cache(self, logged_in_user, test_listing):
+        from app import get_query_cache
+
+        logged_in_user.get('/marketplace')
+        logged_in_user.get('/marketplace')
+        assert get_query_cache().stats()['hits'] == 1
+
+    def test_write_by_another_process_seen(self, logged_in_user, test_listing):
+        """Test that a write outside this process's cache, e.g. by another worker, changes the key."""
+        logged_in_user.get('/marketplace')
+        self.add_listing('Other Worker Insert')
+        assert b'Other Worker Insert' in logged_in_user.get('/marketplace').data
+
+    def test_create_listing_invalidates(self, logged_in_user, test_listing):
+        logged_in_user.get('/marketplace')
+        logged_in_user.post('/create-listing', data={
+            'title': 'Fresh Lamp', 'description': 'Bright', 'category': 'Home & Garden',
+            'condition': 'Good', 'listing_type': 'Donate'})
+        response = logged_in_user.get('/marketplace')
+        assert b'Fresh Lamp' in response.data
+
+    def test_filters_cached_separately(self, logged_in_user, test_listing):
+        self.add_listing('Only Book')
+        books = logged_in_user.get('/marketplace?category=Books')
+        everything = logged_in_user.get('/marketplace')
+        assert b'Test Item' not in books.data
+        assert b'Test Item' in everything.data
+
+    def test_shutdown_closes_cache(self, logged_in_user, test_listing, monkeypatch, tmp_path):
+        import app as app_module
+        monkeypatch.setitem(app_module.app.config, 'QUERY_CACHE_BACKEND', 'sqlite')
+        monkeypatch.setitem(app_module.app.config, 'QUERY_CACHE_PATH', str(tmp_path / 'cache.db'))
+
+        logged_in_user.get('/marketplace')
+        backend = app_module.get_query_cache().backend
+        assert backend._conns
+        app_module.shutdown()
+        assert backend._conns == []
+        assert 'query_cache' not in app_module.app.extensions
+
+    def test_disabled_backend(self, logged_in_user, test_listing, monkeypatch):
+        from app import app
+        monkeypatch.setitem(app.config, 'QUERY_CACHE_BACKEND', None)
+
+        logged_in_user.get('/marketplace')
+        self.add_listing('Visible At Once')
+        assert b'Visible At Once' in logged_in_user.get('/marketplace').data
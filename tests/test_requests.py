@@ -270,3 +270,233 @@ class TestHandleRequest:
         
         assert request is not None
         assert request['status'] == 'Pending'  # Should still be pending
+
+
+class TestMyRequestsTabs:
+    """Test the paginated, per-tab my-requests view."""
+
+    def test_sent_tab_is_default(self, logged_in_user, test_request):
+        """Test that only sent requests render by default."""
+        response = logged_in_user.get('/my-requests')
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        assert 'id="sent-requests"' in body
+        assert 'id="received-requests"' not in body
+        assert 'Test Item' not in body  # the test user's own listing was requested by someone else
+
+    def test_received_tab(self, logged_in_user, test_request):
+        """Test that the received tab lists requests on the user's listings."""
+        body = logged_in_user.get('/my-requests?tab=received').get_data(as_text=True)
+        assert 'id="received-requests"' in body
+        assert 'Test Item' in body
+        assert 'Requester' in body
+
+    def test_status_counts(self, logged_in_user, test_request):
+        """Test that per-status counts are computed for both tabs."""
+        logged_in_user.get(f'/handle-request/{test_request["id"]}/decline')
+        response = logged_in_user.get('/my-requests?tab=received')
+        body = response.get_data(as_text=True)
+        assert 'Declined: 1' in body
+        assert 'Pending: 0' in body
+
+    def test_received_tab_paginates(self, logged_in_user, test_listing, monkeypatch):
+        """Test that a busy listing's requests are split into pages."""
+        from werkzeug.security import generate_password_hash
+        from app import app, get_db
+
+        monkeypatch.setitem(app.config, 'PAGE_SIZE', 2)
+        conn = get_db()
+        c = conn.cursor()
+        for i in range(5):
+            c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
+                      (f'fan{i}@example.com', 'x', f'Fan {i}', 'City'))
+            c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)", (test_listing['id'], c.lastrowid))
+        conn.commit()
+        conn.close()
+
+        body = logged_in_user.get('/my-requests?tab=received').get_data(as_text=True)
+        assert body.count('class="request-card"') == 2
+        assert 'Pending: 5' in body
+        assert 'tab=received' in body[body.index('class="pagination"'):]
+
+    def test_invalid_tab_falls_back(self, logged_in_user):
+        """Test that an unknown tab shows the sent tab."""
+        body = logged_in_user.get('/my-requests?tab=bogus').get_data(as_text=True)
+        assert 'id="sent-requests"' in body
+
+
+class TestAtomicRequestCreation:
+    """Test the single-statement request creation."""
+
+    def other_listing(self, email='lister@example.com'):
+        from app import get_db
+
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
+                  (email, 'x', 'Lister', 'City'))
+        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                     VALUES (?, 'Wanted Item', 'Description', 'Books', 'Good', 'Exchange')""",
+                  (c.lastrowid,))
+        conn.commit()
+        listing_id = c.lastrowid
+        conn.close()
+        return listing_id
+
+    def test_outcomes(self, test_user, test_listing):
+        """Test every outcome code."""
+        from app import (REQUEST_CREATED, REQUEST_DUPLICATE, REQUEST_NOT_FOUND, REQUEST_OWN_LISTING,
+                         REQUEST_UNAVAILABLE, create_request, get_db)
+
+        listing_id = self.other_listing()
+        conn = get_db()
+        conn.execute("UPDATE listings SET status = 'Inactive' WHERE id = ?", (listing_id,))
+        conn.commit()
+        inactive_id = listing_id
+        listing_id = self.other_listing(email='lister2@example.com')
+
+        assert create_request(conn, listing_id, test_user['id']) == REQUEST_CREATED
+        assert create_request(conn, listing_id, test_user['id']) == REQUEST_DUPLICATE
+        assert create_request(conn, test_listing['id'], test_user['id']) == REQUEST_OWN_LISTING
+        assert create_request(conn, inactive_id, test_user['id']) == REQUEST_UNAVAILABLE
+        assert create_request(conn, 999999, test_user['id']) == REQUEST_NOT_FOUND
+        assert conn.execute("SELECT COUNT(*) FROM requests").fetchone()[0] == 1
+        conn.close()
+
+    def test_request_unknown_listing(self, logged_in_user):
+        """Test that requesting a missing listing does not create a request."""
+        from app import get_db
+
+        response = logged_in_user.get('/request-item/999999', follow_redirects=True)
+        assert b'Listing not found!' in response.data
+
+        conn = get_db()
+        assert conn.execute("SELECT COUNT(*) FROM requests").fetchone()[0] == 0
+        conn.close()
+
+    def test_concurrent_requests_create_one_row(self, test_user):
+        """Test that parallel double-clicks land exactly one request."""
+        import threading
+        from app import app, get_db
+
+        listing_id = self.other_listing()
+        barrier = threading.Barrier(8)
+        statuses = []
+
+        def click():
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = test_user['id']
+            barrier.wait()
+            statuses.append(client.get(f'/request-item/{listing_id}').status_code)
+
+        threads = [threading.Thread(target=click) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert statuses == [302] * 8
+        conn = get_db()
+        count = conn.execute("SELECT COUNT(*) FROM requests WHERE listing_id = ? AND requester_id = ?",
+                             (listing_id, test_user['id'])).fetchone()[0]
+        conn.close()
+        assert count == 1
+
+
+class TestRespondToRequests:
+    """Test the transactional accept/decline workflow."""
+
+    @pytest.fixture
+    def competing_requests(self, test_user, test_listing):
+        """Three requesters on test_listing plus one on a second listing."""
+        from app import get_db
+
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                     VALUES (?, 'Second Item', 'Description', 'Books', 'Good', 'Exchange')""", (test_user['id'],))
+        second_listing = c.lastrowid
+        request_ids = []
+        for n in range(3):
+            c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, 'x', ?, 'City')",
+                      (f'requester{n}@example.com', f'Requester {n}'))
+            requester_id = c.lastrowid
+            c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)",
+                      (test_listing['id'], requester_id))
+            request_ids.append(c.lastrowid)
+        c.execute("INSERT INTO requests (listing_id, requester_id) VALUES (?, ?)", (second_listing, requester_id))
+        request_ids.append(c.lastrowid)
+        conn.commit()
+        conn.close()
+        return request_ids
+
+    def statuses(self):
+        from app import get_db
+
+        conn = get_db()
+        rows = conn.execute("SELECT id, status FROM requests ORDER BY id").fetchall()
+        conn.close()
+        return [row['status'] for row in rows]
+
+    def test_accept_declines_siblings(self, logged_in_user, test_listing, competing_requests):
+        """Test that accepting one request declines the other pending ones on that listing."""
+        response = logged_in_user.get(f'/handle-request/{competing_requests[1]}/accept', follow_redirects=True)
+        assert b'2 other pending request(s)' in response.data
+        assert self.statuses() == ['Declined', 'Accepted', 'Declined', 'Pending']
+
+    def test_handled_request_cannot_be_accepted(self, logged_in_user, competing_requests):
+        """Test that a declined sibling cannot be accepted afterwards."""
+        logged_in_user.get(f'/handle-request/{competing_requests[0]}/accept')
+        response = logged_in_user.get(f'/handle-request/{competing_requests[1]}/accept', follow_redirects=True)
+        assert b'Request not found!' in response.data
+        assert self.statuses()[:3] == ['Accepted', 'Declined', 'Declined']
+
+    def test_bulk_accept_one_winner_per_listing(self, logged_in_user, competing_requests):
+        """Test that bulk accept picks the oldest request per listing."""
+        from app import get_db
+
+        response = logged_in_user.post('/handle-requests', data={
+            'action': 'accept',
+            'request_ids': [str(competing_requests[2]), str(competing_requests[1]), str(competing_requests[3])],
+        }, follow_redirects=True)
+        assert b'2 request(s) accepted successfully!' in response.data
+        assert self.statuses() == ['Declined', 'Accepted', 'Declined', 'Accepted']
+
+        conn = get_db()
+        active = conn.execute("SELECT COUNT(*) FROM listings WHERE status = 'Active'").fetchone()[0]
+        conn.close()
+        assert active == 0
+
+    def test_bulk_decline(self, logged_in_user, competing_requests):
+        """Test declining several requests at once."""
+        response = logged_in_user.post('/handle-requests', data={
+            'action': 'decline', 'request_ids': [str(i) for i in competing_requests[:2]],
+        }, follow_redirects=True)
+        assert b'2 request(s) declined successfully!' in response.data
+        assert self.statuses() == ['Declined', 'Declined', 'Pending', 'Pending']
+
+    def test_bulk_ignores_other_owners(self, client, competing_requests):
+        """Test that requests on someone else's listings are left alone."""
+        from app import get_db
+
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("INSERT INTO users (email, password, display_name, location) VALUES ('x@y.z', 'x', 'X', 'Y')")
+        conn.commit()
+        other_id = c.lastrowid
+        conn.close()
+        with client.session_transaction() as sess:
+            sess['user_id'] = other_id
+
+        response = client.post('/handle-requests', data={
+            'action': 'accept', 'request_ids': [str(i) for i in competing_requests],
+        }, follow_redirects=True)
+        assert b'No pending requests to update!' in response.data
+        assert self.statuses() == ['Pending'] * 4
+
+    def test_bulk_requires_login(self, client):
+        """Test that the bulk endpoint requires authentication."""
+        response = client.post('/handle-requests', data={'action': 'accept', 'request_ids': ['1']})
+        assert response.status_code == 302
+        assert '/login' in response.location
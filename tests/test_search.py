@@ -0,0 +1,112 @@
+"""
+Tests for marketplace full-text search
+"""
+import pytest
+from search import build_match_query
+
+
+@pytest.fixture
+def search_listings(test_user):
+    """Create listings from another user to search through."""
+    from werkzeug.security import generate_password_hash
+    from app import get_db
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("INSERT INTO users (email, password, display_name, location) VALUES (?, ?, ?, ?)",
+              ('seller@example.com', generate_password_hash('seller123'), 'Seller', 'Seller City'))
+    seller_id = c.lastrowid
+
+    listings = {}
+    for title, description in [
+        ('Oak Dining Chair', 'Solid wood, seats one'),
+        ('Kitchen Table', 'Comes with four matching chairs'),
+        ('Alte Bücher', 'Romane und Sachbücher'),
+        ('Mountain Bike', 'Front suspension, 21 gears'),
+    ]:
+        c.execute("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                     VALUES (?, ?, ?, ?, ?, ?)""",
+                  (seller_id, title, description, 'Furniture', 'Good', 'Exchange'))
+        listings[title] = c.lastrowid
+    conn.commit()
+    conn.close()
+    return listings
+
+
+def titles_in(response, listings):
+    body = response.get_data(as_text=True)
+    return {title for title in listings if title in body}
+
+
+class TestMatchQuery:
+    """Test conversion of search box input to FTS5 syntax."""
+
+    def test_words_become_prefix_terms(self):
+        assert build_match_query('oak chair') == '"oak"* "chair"*'
+
+    def test_fts_syntax_is_neutralised(self):
+        assert build_match_query('chair OR "x" NEAR(') == '"chair"* "OR"* "x"* "NEAR"*'
+
+    def test_no_words(self):
+        assert build_match_query('!!! ---') is None
+
+
+class TestFullTextSearch:
+    """Test FTS5-backed marketplace search."""
+
+    def test_prefix_match(self, logged_in_user, search_listings):
+        """Test that partial words match."""
+        response = logged_in_user.get('/marketplace?search=Moun')
+        assert titles_in(response, search_listings) == {'Mountain Bike'}
+
+    def test_english_stemming(self, logged_in_user, search_listings):
+        """Test that the English index matches word forms."""
+        response = logged_in_user.get('/marketplace?search=chairs')
+        assert titles_in(response, search_listings) == {'Oak Dining Chair', 'Kitchen Table'}
+
+    def test_title_matches_rank_first(self, logged_in_user, search_listings):
+        """Test that bm25 ranks title matches above description matches."""
+        body = logged_in_user.get('/marketplace?search=chair').get_data(as_text=True)
+        assert body.index('Oak Dining Chair') < body.index('Kitchen Table')
+
+    def test_german_diacritics(self, logged_in_user, search_listings):
+        """Test that the German index folds umlauts."""
+        logged_in_user.get('/set_language/de')
+        response = logged_in_user.get('/marketplace?search=Bucher')
+        assert titles_in(response, search_listings) == {'Alte Bücher'}
+
+    def test_index_follows_updates(self, logged_in_user, test_listing):
+        """Test that edits and deletes are reflected in search results."""
+        logged_in_user.post(f'/edit-listing/{test_listing["id"]}', data={
+            'title': 'Renamed Lamp',
+            'description': 'Bright',
+            'category': 'Other',
+            'condition': 'Good',
+            'listing_type': 'Donate'
+        })
+        assert b'Renamed Lamp' in logged_in_user.get('/marketplace?search=lamp').data
+        assert b'Renamed Lamp' not in logged_in_user.get('/marketplace?search=Test').data
+
+        logged_in_user.get(f'/delete-listing/{test_listing["id"]}')
+        assert b'Renamed Lamp' not in logged_in_user.get('/marketplace?search=lamp').data
+
+    def test_search_respects_filters(self, logged_in_user, search_listings):
+        """Test that search combines with category and type filters."""
+        response = logged_in_user.get('/marketplace?search=chair&type=Donate')
+        assert titles_in(response, search_listings) == set()
+
+    def test_punctuation_only_search(self, logged_in_user, search_listings):
+        """Test that a search without words does not error."""
+        response = logged_in_user.get('/marketplace?search=%22%28')
+        assert response.status_code == 200
+
+    def test_like_fallback(self, logged_in_user, search_listings):
+        """Test that search still works with full-text search disabled."""
+        from app import app
+
+        app.config['FULL_TEXT_SEARCH'] = False
+        try:
+            response = logged_in_user.get('/marketplace?search=Bike')
+        finally:
+            app.config['FULL_TEXT_SEARCH'] = True
+        assert titles_in(response, search_listings) == {'Mountain Bike'}
@@ -0,0 +1,196 @@
+"""
+Tests for server-side sessions and the per-request user record
+"""
+import time
+import pytest
+from sessions import MemorySessionStore, SQLiteSessionStore, ServerSessionInterface, _store_key
+
+
+def session_id(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie is not None else None
+
+
+def stored(sid):
+    from app import get_session_store
+    return get_session_store().get(_store_key(sid))
+
+
+def login(client, user):
+    return client.post('/login', data={'email': user['email'], 'password': user['password']})
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+class TestStores:
+    """Test both session stores."""
+
+    def test_set_get_delete(self, store):
+        store.set('key', '{"a": 1}', time.time() + 60)
+        assert store.get('key')[0] == '{"a": 1}'
+        store.delete('key')
+        assert store.get('key') is None
+
+    def test_expired_sessions_not_returned(self, store):
+        store.set('old', '{}', time.time() - 1)
+        assert store.get('old') is None
+
+    def test_sweep_in_batches(self, store):
+        for i in range(5):
+            store.set(f'old{i}', '{}', time.time() - 1)
+        store.set('live', '{}', time.time() + 60)
+        assert store.sweep(2) == 2
+        assert store.sweep(2) == 2
+        assert store.sweep(2) == 1
+        assert store.sweep(2) == 0
+        assert len(store) == 1
+
+    def test_memory_store_evicts_least_recently_used(self):
+        store = MemorySessionStore(max_entries=2)
+        for key in ('a', 'b'):
+            store.set(key, '{}', time.time() + 60)
+        store.get('a')
+        store.set('c', '{}', time.time() + 60)
+        assert store.get('b') is None
+        assert store.get('a') is not None
+
+    def test_sqlite_store_shared_between_processes(self, tmp_path):
+        """Test that two stores on one file (as in two worker processes) see each other's sessions."""
+        path = str(tmp_path / 'shared.db')
+        SQLiteSessionStore(path).set('key', '{}', time.time() + 60)
+        assert SQLiteSessionStore(path).get('key') is not None
+
+
+class TestSweeping:
+    """Test that expired sessions are swept a batch at a time."""
+
+    def test_full_batch_sweeps_again_on_next_request(self):
+        store = MemorySessionStore()
+        for i in range(5):
+            store.set(f'old{i}', '{}', time.time() - 1)
+        interface = ServerSessionInterface(lambda: store, sweep_interval=3600, sweep_batch=2)
+        interface._maybe_sweep(store)
+        interface._maybe_sweep(store)
+        assert len(store) == 1
+        interface._maybe_sweep(store)
+        assert len(store) == 0
+        store.set('old', '{}', time.time() - 1)
+        interface._maybe_sweep(store)  # partial batch last time: waits for the interval
+        assert len(store) == 1
+
+    def test_sweep_all(self):
+        store = MemorySessionStore()
+        for i in range(5):
+            store.set(f'old{i}', '{}', time.time() - 1)
+        assert ServerSessionInterface(lambda: store, sweep_batch=2).sweep_all(store) == 5
+
+
+class TestServerSessions:
+    """Test that the cookie carries only an id and the data stays on the server."""
+
+    def test_cookie_holds_only_an_id(self, client, test_user):
+        login(client, test_user)
+        sid = session_id(client)
+        assert len(sid) == 43
+        assert '.' not in sid  # not a signed payload
+        assert stored(sid) is not None
+
+    def test_anonymous_visit_stores_nothing(self, client):
+        client.get('/')
+        assert session_id(client) is None
+
+    def test_login_rotates_session_id(self, client, test_user):
+        """Test that a session id from before login is not kept (session fixation)."""
+        client.get('/set_language/de')
+        before = session_id(client)
+        login(client, test_user)
+        after = session_id(client)
+        assert after != before
+        assert stored(before) is None
+        with client.session_transaction() as sess:
+            assert sess['lang'] == 'de'
+
+    def test_logout_deletes_stored_session(self, client, test_user):
+        login(client, test_user)
+        sid = session_id(client)
+        client.get('/logout')
+        assert stored(sid) is None
+        assert session_id(client) != sid
+
+    def test_unknown_session_id_starts_fresh(self, client):
+        client.set_cookie('session', 'x' * 43)
+        response = client.get('/marketplace')
+        assert response.status_code == 302
+
+    def test_expired_session_logged_out(self, client, test_user):
+        from app import get_session_store
+
+        login(client, test_user)
+        key = _store_key(session_id(client))
+        data, _ = get_session_store().get(key)
+        get_session_store().set(key, data, time.time() - 1)
+        assert client.get('/marketplace').status_code == 302
+
+    def test_session_extended_past_half_life(self, client, test_user):
+        from app import app, get_session_store
+
+        login(client, test_user)
+        key = _store_key(session_id(client))
+        data, _ = get_session_store().get(key)
+        soon = time.time() + 60
+        get_session_store().set(key, data, soon)
+        assert client.get('/marketplace').status_code == 200
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        assert get_session_store().get(key)[1] > soon + lifetime / 2
+
+
+class TestCurrentUser:
+    """Test that the user record is loaded fresh, once per request."""
+
+    def test_profile_change_reaches_existing_session(self, logged_in_user, test_user):
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("UPDATE users SET display_name = 'Renamed User' WHERE id = ?", (test_user['id'],))
+        conn.commit()
+        conn.close()
+        assert b'Renamed User' in logged_in_user.get('/marketplace').data
+
+    def test_revoked_admin_loses_access(self, logged_in_admin, test_admin):
+        from app import get_db
+
+        assert logged_in_admin.get('/admin').status_code == 200
+        conn = get_db()
+        conn.execute("UPDATE users SET is_admin = 0 WHERE id = ?", (test_admin['id'],))
+        conn.commit()
+        conn.close()
+        assert logged_in_admin.get('/admin').status_code == 302
+
+    def test_deleted_user_logged_out(self, logged_in_user, test_user):
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("DELETE FROM users WHERE id = ?", (test_user['id'],))
+        conn.commit()
+        conn.close()
+        logged_in_user.get('/')
+        with logged_in_user.session_transaction() as sess:
+            assert 'user_id' not in sess
+
+    def test_loaded_once_per_request(self, test_user, monkeypatch):
+        import app as app_module
+
+        calls = []
+        get_db = app_module.get_db
+        monkeypatch.setattr(app_module, 'get_db', lambda: calls.append(1) or get_db())
+        with app_module.app.test_request_context('/'):
+            app_module.session['user_id'] = test_user['id']
+            assert app_module.current_user()['display_name'] == test_user['display_name']
+            assert not app_module.is_admin()
+            app_module.current_user()
+        assert len(calls) == 1
@@ -0,0 +1,118 @@
+"""
+Tests for the trigger-maintained admin dashboard counters
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats_cache():
+    from app import stats_cache
+    stats_cache.clear()
+    yield
+    stats_cache.clear()
+
+
+def counters():
+    from app import get_db
+    from stats import read_stats
+
+    conn = get_db()
+    stats = read_stats(conn)
+    conn.close()
+    return stats
+
+
+class TestCounterTriggers:
+    """Test that writes keep the counters current."""
+
+    def test_counters_follow_writes(self, logged_in_user, test_admin, test_request):
+        """Test user, listing and request counts through the write routes."""
+        assert counters() == {'total_users': 2, 'active_listings': 1, 'total_requests': 1}
+
+        logged_in_user.post('/create-listing', data={
+            'title': 'Another', 'description': 'Item', 'category': 'Books',
+            'condition': 'Good', 'listing_type': 'Donate'})
+        assert counters()['active_listings'] == 2
+
+        logged_in_user.get(f'/handle-request/{test_request["id"]}/accept')
+        assert counters()['active_listings'] == 1
+
+        logged_in_user.get(f'/delete-listing/{test_request["listing_id"]}')
+        assert counters()['active_listings'] == 1
+
+    def test_admin_flag_changes(self, test_user):
+        """Test that promoting a user moves them out of the user count."""
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("UPDATE users SET is_admin = 1 WHERE id = ?", (test_user['id'],))
+        conn.commit()
+        conn.close()
+        assert counters()['total_users'] == 0
+
+    def test_counters_match_recount(self, test_request):
+        """Test that the maintained counters agree with COUNT(*)."""
+        from app import get_db
+        from stats import reconcile
+
+        conn = get_db()
+        assert reconcile(conn, repair=False) == {}
+        conn.close()
+
+
+class TestDashboard:
+    """Test the cached dashboard figures."""
+
+    def test_dashboard_shows_counters(self, logged_in_admin, test_request):
+        """Test that the dashboard renders the stored counters."""
+        body = logged_in_admin.get('/admin').get_data(as_text=True)
+        assert '<h3>2</h3>' in body  # test user and requester
+        assert '<h3>1</h3>' in body  # listing, request
+
+    def test_dashboard_is_cached(self, logged_in_admin, test_listing):
+        """Test that the dashboard does not query within the TTL."""
+        from app import get_dashboard_stats, stats_cache
+
+        first = get_dashboard_stats()
+        assert first['active_listings'] == 1
+        logged_in_admin.get(f'/admin/delete-listing/{test_listing["id"]}')
+        assert get_dashboard_stats() == first
+
+        stats_cache.clear()
+        assert get_dashboard_stats()['active_listings'] == 0
+
+
+class TestReconcile:
+    """Test drift detection and repair."""
+
+    def corrupt(self):
+        from app import get_db
+
+        conn = get_db()
+        conn.execute("UPDATE stats SET value = 99 WHERE name = 'total_requests'")
+        conn.commit()
+        conn.close()
+
+    def test_reconcile_repairs_drift(self, test_request):
+        from app import get_db
+        from stats import reconcile
+
+        self.corrupt()
+        conn = get_db()
+        assert reconcile(conn) == {'total_requests': (99, 1)}
+        assert reconcile(conn) == {}
+        conn.close()
+        assert counters()['total_requests'] == 1
+
+    def test_cli(self, test_request):
+        from app import app
+
+        self.corrupt()
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['reconcile-stats', '--check'])
+        assert 'total_requests: stored 99, actual 1' in result.output
+        assert counters()['total_requests'] == 99
+
+        result = runner.invoke(args=['reconcile-stats'])
+        assert 'Repaired 1 counter(s)' in result.output
+        assert counters()['total_requests'] == 1
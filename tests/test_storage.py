@@ -0,0 +1,228 @@
+"""
+Tests for content-addressed upload storage and garbage collection
+"""
+import hashlib
+import io
+import os
+import time
+from storage import BlobStore, collect_garbage, derivative_stem
+
+
+class ChunkedStream(io.BytesIO):
+    """BytesIO that records the size of each read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class TestBlobStore:
+    """Test streaming, hashing and deduplication."""
+
+    def test_save_streams_in_chunks(self, tmp_path):
+        """Test that the upload is read in chunks and stored under its hash."""
+        data = os.urandom(10000)
+        stream = ChunkedStream(data)
+        blob = BlobStore(str(tmp_path), chunk_size=4096).save(stream, '.JPG')
+
+        digest = hashlib.sha256(data).hexdigest()
+        assert blob.path == f'{digest[:2]}/{digest}.jpg'
+        assert blob.size == 10000
+        assert blob.created
+        assert set(stream.reads) == {4096}
+        assert (tmp_path / blob.path).read_bytes() == data
+
+    def test_same_content_is_stored_once(self, tmp_path):
+        """Test that identical uploads dedupe to one file."""
+        store = BlobStore(str(tmp_path))
+        first = store.save(io.BytesIO(b'same bytes'), '.png')
+        second = store.save(io.BytesIO(b'same bytes'), '.png')
+
+        assert first.path == second.path
+        assert not second.created
+        files = [path for path, _ in store.walk()]
+        assert files == [first.path]
+
+    def test_delete_removes_derivatives(self, tmp_path):
+        """Test that deleting a blob removes its image derivatives too."""
+        store = BlobStore(str(tmp_path))
+        blob = store.save(io.BytesIO(b'image'), '.jpg')
+        stem = derivative_stem(blob.path)
+        for name in [f'{stem}_400.jpg', f'{stem}_400.webp']:
+            (tmp_path / name).write_bytes(b'derivative')
+
+        assert len(store.delete(blob.path)) == 3
+        assert list(store.walk()) == []
+
+    def test_same_bytes_under_two_extensions_keep_their_derivatives(self, tmp_path):
+        """Test that deleting the .jpeg copy of a photo leaves the .jpg copy's derivatives alone."""
+        store = BlobStore(str(tmp_path))
+        jpg = store.save(io.BytesIO(b'photo'), '.jpg')
+        jpeg = store.save(io.BytesIO(b'photo'), '.jpeg')
+        assert derivative_stem(jpg.path) != derivative_stem(jpeg.path)
+        for blob in (jpg, jpeg):
+            (tmp_path / f'{derivative_stem(blob.path)}_400.jpg').write_bytes(b'derivative')
+        # Named after the digest alone, before derivative_stem()
+        legacy = f'{os.path.splitext(jpg.path)[0]}_400.webp'
+        (tmp_path / legacy).write_bytes(b'derivative')
+
+        assert len(store.delete(jpeg.path)) == 2
+        assert sorted(path for path, _ in store.walk()) == sorted(
+            [jpg.path, f'{derivative_stem(jpg.path)}_400.jpg', legacy])
+        assert len(store.delete(jpg.path)) == 3
+        assert list(store.walk()) == []
+
+
+def make_old(root, rel_path):
+    old = time.time() - 7200
+    os.utime(os.path.join(root, rel_path), (old, old))
+
+
+def upload(client, data, title):
+    return client.post('/create-listing', data={
+        'title': title,
+        'description': 'Has a picture',
+        'category': 'Books',
+        'condition': 'Good',
+        'listing_type': 'Exchange',
+        'image': (io.BytesIO(data), 'photo.png'),
+    }, content_type='multipart/form-data', follow_redirects=True)
+
+
+def blob_refs():
+    from app import get_db
+    conn = get_db()
+    refs = {row['path']: row['ref_count'] for row in conn.execute('SELECT path, ref_count FROM blobs')}
+    conn.close()
+    return refs
+
+
+class TestUploadReferences:
+    """Test reference counting of uploads across listings."""
+
+    def test_duplicate_upload_shares_blob(self, logged_in_user, test_user):
+        """Test that two listings with the same photo share one file."""
+        from app import app, get_db
+
+        upload(logged_in_user, b'shared photo bytes', 'First')
+        upload(logged_in_user, b'shared photo bytes', 'Second')
+
+        conn = get_db()
+        paths = {row['image_path'] for row in conn.execute('SELECT image_path FROM listings')}
+        conn.close()
+        assert len(paths) == 1
+        assert blob_refs() == {paths.pop(): 2}
+        assert len(list(BlobStore(app.config['UPLOAD_FOLDER']).walk())) == 1
+
+    def test_delete_listing_drops_reference(self, logged_in_user, test_user):
+        """Test that deleting listings decrements the blob's count."""
+        from app import get_db
+
+        upload(logged_in_user, b'photo to delete', 'Doomed')
+        conn = get_db()
+        listing = conn.execute("SELECT * FROM listings WHERE title = 'Doomed'").fetchone()
+        conn.close()
+
+        logged_in_user.get(f'/delete-listing/{listing["id"]}')
+        assert blob_refs() == {listing['image_path']: 0}
+
+
+class TestGarbageCollection:
+    """Test removal of unreferenced uploads."""
+
+    def test_collects_unreferenced_blobs_only(self, logged_in_user, test_user):
+        """Test that orphaned blobs go and referenced ones stay."""
+        from app import UPLOAD_PREFIX, app, get_db, get_blob_store
+
+        upload(logged_in_user, b'keep me', 'Kept')
+        upload(logged_in_user, b'drop me', 'Dropped')
+        conn = get_db()
+        listings = {row['title']: row for row in conn.execute('SELECT * FROM listings')}
+        conn.close()
+        logged_in_user.get(f'/delete-listing/{listings["Dropped"]["id"]}')
+
+        store = get_blob_store()
+        for path, _ in list(store.walk()):
+            make_old(store.root, path)
+
+        conn = get_db()
+        removed = collect_garbage(conn, store, UPLOAD_PREFIX, grace_seconds=60)
+        conn.close()
+
+        dropped = listings['Dropped']['image_path'][len(UPLOAD_PREFIX):]
+        kept = listings['Kept']['image_path'][len(UPLOAD_PREFIX):]
+        assert removed == [dropped]
+        assert [path for path, _ in store.walk()] == [kept]
+        assert list(blob_refs()) == [listings['Kept']['image_path']]
+
+    def test_recent_files_survive(self, logged_in_user, test_user):
+        """Test that the grace period protects fresh uploads."""
+        from app import UPLOAD_PREFIX, get_db, get_blob_store
+
+        store = get_blob_store()
+        store.save(io.BytesIO(b'uploaded, listing not yet committed'), '.jpg')
+
+        conn = get_db()
+        assert collect_garbage(conn, store, UPLOAD_PREFIX, grace_seconds=60) == []
+        conn.close()
+
+    def test_cli_removes_stray_files(self, test_user):
+        """Test the gc-uploads command on files the database never knew about."""
+        from app import app, get_blob_store
+
+        store = get_blob_store()
+        stray = store.save(io.BytesIO(b'stray'), '.jpg')
+        make_old(store.root, stray.path)
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['gc-uploads', '--dry-run'])
+        assert stray.path in result.output
+        assert len(list(store.walk())) == 1
+
+        result = runner.invoke(args=['gc-uploads'])
+        assert 'Removed 1 file(s)' in result.output
+        assert list(store.walk()) == []
+
+
+class TestReleaseOnDelete:
+    """Test that deleting listings removes their images in the background."""
+
+    def drain(self):
+        from app import upload_cleanup
+        upload_cleanup.submit(lambda: None).result(timeout=10)
+
+    def test_deleted_listing_image_is_removed(self, logged_in_user, test_user, monkeypatch):
+        """Test that the last listing using an image takes the file with it."""
+        from app import UPLOAD_PREFIX, app, get_db, get_blob_store
+        monkeypatch.setitem(app.config, 'UPLOAD_RELEASE_GRACE', 0)
+
+        upload(logged_in_user, b'short-lived photo', 'Gone Soon')
+        conn = get_db()
+        listing = conn.execute("SELECT * FROM listings WHERE title = 'Gone Soon'").fetchone()
+        conn.close()
+        make_old(get_blob_store().root, listing['image_path'][len(UPLOAD_PREFIX):])
+
+        logged_in_user.get(f'/delete-listing/{listing["id"]}')
+        self.drain()
+        assert blob_refs() == {}
+        assert list(get_blob_store().walk()) == []
+
+    def test_shared_image_is_kept(self, logged_in_user, test_user, monkeypatch):
+        """Test that an image still used by another listing survives."""
+        from app import app, get_db, get_blob_store
+        monkeypatch.setitem(app.config, 'UPLOAD_RELEASE_GRACE', 0)
+
+        upload(logged_in_user, b'shared photo', 'One')
+        upload(logged_in_user, b'shared photo', 'Two')
+        conn = get_db()
+        listing = conn.execute("SELECT * FROM listings WHERE title = 'One'").fetchone()
+        conn.close()
+
+        logged_in_user.get(f'/delete-listing/{listing["id"]}')
+        self.drain()
+        assert blob_refs() == {listing['image_path']: 1}
+        assert len(list(get_blob_store().walk())) == 1
@@ -0,0 +1,85 @@
+"""
+Tests for streamed rendering of the marketplace and admin listings
+"""
+import pytest
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    """Turn off the query cache so marketplace rows are read while streaming."""
+    from app import app
+    monkeypatch.setitem(app.config, 'QUERY_CACHE_BACKEND', None)
+
+
+@pytest.fixture
+def many_listings(test_user):
+    from app import get_db
+
+    conn = get_db()
+    conn.executemany("""INSERT INTO listings (user_id, title, description, category, condition, listing_type)
+                        VALUES (?, ?, 'Streamed description', 'Books', 'Good', 'Exchange')""",
+                     [(test_user['id'], f'Streamed Item {i}') for i in range(40)])
+    conn.commit()
+    conn.close()
+
+
+class TestStreamedPages:
+    """Test that long listing pages are streamed as they render."""
+
+    def test_marketplace_streamed_in_chunks(self, logged_in_user, many_listings, uncached, monkeypatch):
+        from app import app
+        monkeypatch.setitem(app.config, 'STREAM_BUFFER_SIZE', 1024)
+
+        response = logged_in_user.get('/marketplace', buffered=False)
+        assert 'Content-Length' not in response.headers
+        chunks = list(response.response)
+        response.close()
+        assert len(chunks) > 2
+        assert chunks[0].startswith(b'<!DOCTYPE html>')
+        body = b''.join(chunks)
+        assert body.count(b'Streamed Item') == app.config['PAGE_SIZE']
+        assert b'rel="next"' in body
+
+    def test_large_marketplace_page_streamed_past_the_cache(self, logged_in_user, many_listings, monkeypatch):
+        """Test that with the default query cache, pages too large to cache are still read lazily."""
+        from app import app, get_query_cache
+        monkeypatch.setitem(app.config, 'QUERY_CACHE_MAX_ROWS', 10)
+        monkeypatch.setitem(app.config, 'PAGE_SIZE', 30)
+
+        response = logged_in_user.get('/marketplace', buffered=False)
+        body = b''.join(response.response)
+        response.close()
+        assert body.count(b'Streamed Item') == 30
+        assert get_query_cache().stats()['misses'] == 0
+
+    def test_same_html_as_buffered_rendering(self, logged_in_admin, many_listings, monkeypatch):
+        from app import app
+
+        streamed = logged_in_admin.get('/admin/listings').get_data()
+        monkeypatch.setitem(app.config, 'STREAM_PAGES', False)
+        rendered = logged_in_admin.get('/admin/listings')
+        assert 'Content-Length' in rendered.headers
+        assert streamed == rendered.get_data()
+
+    def test_connection_released_after_stream(self, logged_in_admin, many_listings):
+        """Test that the connection goes back to the pool once the body has been sent."""
+        from app import get_pool
+
+        response = logged_in_admin.get('/admin/listings', buffered=False)
+        next(iter(response.response))
+        assert get_pool().stats()['in_use'] == 1
+        response.close()
+        assert get_pool().stats()['in_use'] == 0
+
+    def test_flash_messages_not_streamed(self, logged_in_user, test_listing, uncached):
+        """Test that a page showing flashes is rendered whole, so the session can drop them."""
+        logged_in_user.get(f'/request-item/{test_listing["id"]}')
+        response = logged_in_user.get('/marketplace')
+        assert 'Content-Length' in response.headers
+        assert 'Content-Length' not in logged_in_user.get('/marketplace').headers
+
+    def test_conditional_request_still_answers_304(self, logged_in_admin, many_listings):
+        first = logged_in_admin.get('/admin/listings')
+        assert 'Content-Length' not in first.headers
+        second = logged_in_admin.get('/admin/listings', headers={'If-None-Match': first.headers['ETag']})
+        assert second.status_code == 304
@@ -0,0 +1,134 @@
+"""
+Tests for the production entry point: app preparation, graceful shutdown
+and the pre-fork server
+"""
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def restore_config():
+    """Put the config, and everything built from it, back after create_app()."""
+    import app as app_module
+
+    saved = dict(app_module.app.config)
+    yield
+    app_module.app.config.clear()
+    app_module.app.config.update(saved)
+    app_module.apply_config()
+
+
+class TestCreateApp:
+    """Test preparing the app before workers are forked."""
+
+    def test_configures_migrates_and_compiles(self, tmp_path, monkeypatch, restore_config):
+        from app import app
+        from wsgi import create_app
+
+        database = str(tmp_path / 'fresh.db')
+        monkeypatch.setenv('ECOSWAP_PAGE_SIZE', '7')
+        monkeypatch.setenv('ECOSWAP_STATS_CACHE_TTL', '1.5')
+
+        assert create_app({'DATABASE': database, 'STATS_CACHE_TTL': 2.5}) is app
+        assert app.config['PAGE_SIZE'] == 7  # parsed as JSON
+        assert app.config['STATS_CACHE_TTL'] == 2.5  # explicit settings win
+        assert any(name == 'marketplace.html' for _, name in app.jinja_env.cache)
+        # Nothing left open to be copied into forked workers
+        assert 'db_pool' not in app.extensions
+
+        conn = sqlite3.connect(database)
+        admins = conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 1').fetchone()[0]
+        conn.close()
+        assert admins == 1
+
+    def test_environment_reaches_running_objects(self, tmp_path, monkeypatch, restore_config):
+        """Test that settings read at import time are applied again from the environment."""
+        import app as app_module
+        from wsgi import create_app
+
+        monkeypatch.setenv('ECOSWAP_COMPRESS_MIN_SIZE', '99999')
+        monkeypatch.setenv('ECOSWAP_PASSWORD_HASH_WORKERS', '7')
+        monkeypatch.setenv('ECOSWAP_CARD_CACHE_BYTES', '0')
+        monkeypatch.setenv('ECOSWAP_STATS_CACHE_TTL', '0')
+        monkeypatch.setenv('ECOSWAP_SESSION_SWEEP_BATCH', '3')
+        create_app({'DATABASE': str(tmp_path / 'env.db')})
+
+        assert app_module.compression.min_size == 99999
+        assert app_module.password_hasher.workers == 7
+        assert app_module.card_cache.max_bytes == 0
+        assert app_module.stats_cache.ttl == 0
+        assert app_module.app.session_interface.sweep_batch == 3
+        client = app_module.app.test_client()
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+
+class TestShutdown:
+    """Test draining the app's resources."""
+
+    def test_waits_for_checked_out_connections(self):
+        import app as app_module
+
+        conn = app_module.get_pool().connect()
+        timer = threading.Timer(0.1, conn.close)
+        timer.start()
+        app_module.shutdown(timeout=5)
+        timer.join()
+        assert 'db_pool' not in app_module.app.extensions
+
+    def test_background_work_restarts_on_next_use(self):
+        import app as app_module
+
+        app_module.shutdown()
+        assert app_module.upload_cleanup.submit(lambda: 'done').result(timeout=10) == 'done'
+        assert app_module.password_hasher.verify(app_module.hash_password('secret'), 'secret')
+        conn = app_module.get_db()
+        assert conn.execute('SELECT 1').fetchone()[0] == 1
+        conn.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='the pre-fork server needs os.fork')
+class TestPreforkServer:
+    """Test the built-in pre-fork server end to end."""
+
+    def test_serves_and_stops_gracefully(self, tmp_path):
+        env = dict(os.environ, ECOSWAP_DATABASE=str(tmp_path / 'server.db'),
+                   ECOSWAP_SESSION_PATH=str(tmp_path / 'sessions.db'))
+        server = subprocess.Popen([sys.executable, 'wsgi.py', '--host', '127.0.0.1', '--port', '0',
+                                   '--workers', '2', '--threads', '2'],
+                                  cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True)
+        try:
+            port = None
+            output = []
+            deadline = time.monotonic() + 30
+            while port is None and time.monotonic() < deadline:
+                output.append(server.stderr.readline())
+                match = re.search(r'Listening on http://[^:]+:(\d+)', output[-1])
+                if match:
+                    port = int(match.group(1))
+            assert port, 'server did not start'
+            # The default query cache is not shared between the two workers
+            assert any("QUERY_CACHE_BACKEND 'memory'" in line for line in output)
+
+            for _ in range(4):
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=10) as response:
+                    assert response.status == 200
+
+            server.send_signal(signal.SIGTERM)
+            assert server.wait(timeout=30) == 0
+        finally:
+            if server.poll() is None:
+                server.kill()
+                server.wait()
+            server.stderr.close()
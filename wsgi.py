@@ -0,0 +1,189 @@
+"""
+Production WSGI entry point
+
+``create_app()`` configures the app from ECOSWAP_* environment variables,
+migrates the database and compiles every template. Call it once in the
+parent of a pre-fork server, so the migrations run exactly once and every
+worker starts with templates, translations and static assets already
+loaded, e.g. ``gunicorn --preload --workers 4 --threads 5 'wsgi:create_app()'``.
+
+Run directly, this module is such a server itself: the parent prepares the
+app and binds the socket, then forks ``--workers`` processes, each serving
+it on a fixed pool of ``--threads`` threads, and replaces workers that die.
+On SIGTERM or SIGINT the workers stop accepting connections, finish the
+requests in flight and drain their connection pools; workers still busy
+after ``--graceful-timeout`` seconds are killed.
+
+Usage: python wsgi.py [--host 0.0.0.0] [--port 8000] [--workers N] [--threads N]
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import app as app_module
+
+logger = logging.getLogger('ecoswap.wsgi')
+
+
+def create_app(config=None):
+    """Configure and warm up app.py's module-level app for serving, and return it.
+
+    This is a one-shot configuration step, not an app factory: every call
+    reconfigures and returns the same ``app_module.app``, so call it once
+    per process tree, before forking workers.
+
+    Settings come from ECOSWAP_* environment variables (``ECOSWAP_SECRET_KEY``,
+    ``ECOSWAP_DATABASE``, ...; values are parsed as JSON where possible), then
+    from ``config``, and are applied to the objects app.py built at import.
+    """
+    app = app_module.app
+    app.config.from_prefixed_env('ECOSWAP')
+    if config:
+        app.config.update(config)
+    app.debug = False
+    app_module.apply_config()
+    app_module.init_db()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    # Leave no threads or open connections behind to be copied into forked workers
+    app_module.shutdown()
+    return app
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server on an already listening socket, handling connections on ``threads`` threads."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, app, sock, threads, keepalive):
+        # Idle keep-alive connections give their thread back after ``keepalive`` seconds
+        handler = type('RequestHandler', (WSGIRequestHandler,),
+                       {'protocol_version': 'HTTP/1.1', 'timeout': keepalive})
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=sock.fileno())
+        # Every worker accepts on the shared socket: one that loses the race must not block
+        self.socket.setblocking(False)
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval)  # closes the listening socket on the way out
+        finally:
+            self._threads.shutdown(wait=True)  # let the requests in flight finish
+
+    def process_request(self, request, client_address):
+        self._threads.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_worker(app, sock, threads, keepalive, graceful_timeout):
+    server = PooledWSGIServer(app, sock, threads, keepalive)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, which runs on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        app_module.shutdown(timeout=graceful_timeout)
+
+
+def serve(app, host='0.0.0.0', port=8000, workers=2, threads=5, keepalive=5.0, graceful_timeout=30.0):
+    """Pre-fork server: bind, fork ``workers`` processes and supervise them until SIGTERM/SIGINT."""
+    if workers > 1:
+        if app.config['SESSION_BACKEND'] == 'memory':
+            logger.warning("SESSION_BACKEND 'memory' is per process: sessions will not be shared between workers")
+        if app.config['QUERY_CACHE_BACKEND'] == 'memory':
+            logger.warning("QUERY_CACHE_BACKEND 'memory' is per process: each worker computes and caches "
+                           "marketplace results separately; use 'sqlite' to share them")
+    sock = socket.create_server((host, port), backlog=BaseWSGIServer.request_queue_size)
+    logger.info('Listening on http://%s:%d with %d worker(s) of %d thread(s)',
+                *sock.getsockname()[:2], workers, threads)
+    children = set()
+    deadline = None
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                run_worker(app, sock, threads, keepalive, graceful_timeout)
+                code = 0
+            except BaseException:
+                logger.exception('Worker %d failed', os.getpid())
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal deadline
+        if deadline is None:
+            logger.info('Stopping workers')
+            deadline = time.monotonic() + graceful_timeout
+            for pid in list(children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                logger.warning('Killing %d worker(s) still busy after %.0f s', len(children), graceful_timeout)
+                for pid in list(children):
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float('inf')
+            time.sleep(0.1)
+            continue
+        children.discard(pid)
+        if deadline is None:
+            logger.warning('Worker %d exited with status %d; starting another',
+                           pid, os.waitstatus_to_exitcode(status))
+            time.sleep(1)  # don't spin if workers die on startup
+            spawn()
+    sock.close()
+    logger.info('Stopped')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, help='threads per worker; defaults to DB_POOL_SIZE, '
+                                                    'so every thread can hold a connection')
+    parser.add_argument('--keepalive', type=float, default=5.0, help='seconds an idle connection is kept open')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(message)s')
+    app = create_app()
+    serve(app, args.host, args.port, args.workers, args.threads or app.config['DB_POOL_SIZE'],
+          args.keepalive, args.graceful_timeout)
+
+
+if __name__ == '__main__':
+    main()